@@ -1,4 +1,4 @@
 from .bybit_client import BybitClient
+from .bybit_client.async_rest import AsyncBybitClient
 
-__all__ = ["BybitClient"]
-
+__all__ = ["BybitClient", "AsyncBybitClient"]
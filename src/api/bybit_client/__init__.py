@@ -1,17 +1,33 @@
 import inspect
-from typing import Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, List
+from pybit.exceptions import FailedRequestError, InvalidRequestError
 from pybit.unified_trading import HTTP
 from pydantic import ValidationError
 from core.log import logger
+from core.metrics import registry
+from core.recorder import FrameRecorder
+from core.tracing import tracer
 
 from domain_models import CoinType
-from schemas.account_coin import Coin, Account
+from schemas.account_coin import Coin, Account, CoinBalance
 from schemas.webcallbacks import APIResponse
-from .websockets import BybitWebsocketClient
+from .scheduler import RequestScheduler, RequestPriority
+from .websockets import BybitWebsocketClient, ACCOUNT_TYPE
 from data import InstrumentInfo
 from schemas import Book, Orderbook
 from schemas.order import Order, OrderEntity
 
+# Максимальное количество ордеров в одном batch-запросе для spot
+BATCH_ORDER_LIMIT = 10
+# Количество batch-запросов, отправляемых одновременно
+BATCH_WORKERS = 4
+ORDER_NEEDED_KEYS = ["side", "price", "qty", "symbol"]
+
+REST_CALLS = registry.counter("bybit_rest_calls_total", "REST-запросы по методам", ("method",))
+# code: retCode Bybit, HTTP-статус неудачного запроса или other - ошибки до отправки (очередь планировщика)
+REST_ERRORS = registry.counter("bybit_rest_errors_total", "Ошибки REST-запросов по методам", ("method", "code"))
+
 
 class BybitHandler:
     @staticmethod
@@ -24,6 +40,49 @@ class BybitHandler:
 
         return response.result
 
+    @staticmethod
+    def batch_chunks(requests: List[dict]) -> List[List[dict]]:
+        return [[{key: str(value) for key, value in request.items()}
+                 for request in requests[start:start + BATCH_ORDER_LIMIT]]
+                for start in range(0, len(requests), BATCH_ORDER_LIMIT)]
+
+    # Результат выровнен по запросам batch: None на месте отклоненных биржей ордеров
+    @staticmethod
+    def batch_handler(message: dict) -> List[Optional[dict]]:
+        items = BybitHandler.rest_handler(message)["list"]
+        statuses = (message.get("retExtInfo") or {}).get("list") or [{}] * len(items)
+        result = []
+
+        for item, status in zip(items, statuses):
+            if status.get("code", 0) != 0 or not item.get("orderId"):
+                logger.warning(f"(batch) Ордер отклонен. "
+                               f"Код: {status.get('code')}. Сообщение: {status.get('msg')}")
+                result.append(None)
+                continue
+
+            result.append(item)
+
+        return result
+
+    @staticmethod
+    def batch_order_handler(chunk: List[dict], message: dict) -> List[Optional[Order]]:
+        result = []
+
+        for request, item in zip(chunk, BybitHandler.batch_handler(message)):
+            if item is None:
+                result.append(None)
+                continue
+
+            item.update({key: request[key] for key in ORDER_NEEDED_KEYS})
+            item["orderStatus"] = "New"
+            result.append(Order(**item))
+
+        return result
+
+    @staticmethod
+    def batch_entity_handler(message: dict) -> List[Optional[OrderEntity]]:
+        return [OrderEntity(**item) if item else None for item in BybitHandler.batch_handler(message)]
+
 
 # TODO валидация ошибок
 # TODO разделить на WebsocketClient и RESTClient
@@ -34,14 +93,23 @@ class BybitClient:
     __secret_key: str
     __session: HTTP
     __is_testnet: bool
+    __batch_executor: ThreadPoolExecutor
+    __scheduler: RequestScheduler
 
     def __init__(
             self,
             key: str,
             secret_key: str,
-            is_testnet: bool = False
+            is_testnet: bool = False,
+            fast_decode: bool = False,
+            recorder: Optional[FrameRecorder] = None,
+            scheduler: Optional[RequestScheduler] = None,
+            endpoint: Optional[str] = None,
+            ws_endpoint: Optional[str] = None
     ):
-        self.websocket = BybitWebsocketClient(key, secret_key)
+        self.websocket = BybitWebsocketClient(
+            key, secret_key, fast_decode=fast_decode, recorder=recorder, endpoint=ws_endpoint
+        )
 
         self.__is_testnet = is_testnet
         self.__key = key
@@ -50,29 +118,70 @@ class BybitClient:
         self.__session = HTTP(
             testnet=is_testnet,
             api_key=key,
-            api_secret=secret_key
+            api_secret=secret_key,
+            return_response_headers=True
         )
+        # Адрес REST вместо api.bybit.com, например локальный симулятор: pybit добавляет к нему путь запроса
+        if endpoint:
+            self.__session.endpoint = endpoint.rstrip("/")
+        self.__scheduler = scheduler or RequestScheduler()
+        self.__batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="BybitBatch")
+
+    @property
+    def scheduler(self) -> RequestScheduler:
+        return self.__scheduler
 
     def place_order(self, **kwargs) -> Order:
         needed_keys = ["side", "price", "qty", "symbol"]
         if not all(key in kwargs for key in needed_keys):
             raise ValueError("Не все обязательные ключи предоставлены")
 
-        response = self.__session.place_order(**kwargs)
+        response = self.__send("order/create", RequestPriority.PLACE, self.__session.place_order, **kwargs)
         result = BybitHandler.rest_handler(response)
         result.update({key: str(kwargs[key]) for key in needed_keys})
         result["orderStatus"] = "New"
 
-        logger.info(f"(place order) {result}")
+        logger.info("(place order) %s", result)
 
         return Order(**result)
 
+    # Результат выровнен по requests: None на месте отклоненных биржей ордеров и ордеров пачек,
+    # запрос которых завершился ошибкой
+    def place_batch_order(self, category: str, requests: List[dict]) -> List[Optional[Order]]:
+        if not all(key in request for request in requests for key in ORDER_NEEDED_KEYS):
+            raise ValueError("Не все обязательные ключи предоставлены")
+
+        chunks = BybitHandler.batch_chunks(requests)
+        result = []
+
+        # Пачки уходят волнами по BATCH_WORKERS. Пачка, отклоненная целиком (нет средств, лимит ордеров, ошибка),
+        # значит, что остальные биржа отклонит так же: они не отправляются и в результате остаются None
+        for start in range(0, len(chunks), BATCH_WORKERS):
+            wave = chunks[start:start + BATCH_WORKERS]
+            placed = list(self.__batch_executor.map(
+                lambda chunk: self.__send_chunk("order/create-batch", RequestPriority.PLACE,
+                                                self.__session.place_batch_order, category, chunk,
+                                                BybitHandler.batch_order_handler), wave))
+
+            for orders in placed:
+                result.extend(orders)
+
+            if not all(any(orders) for orders in placed):
+                break
+
+        result.extend([None] * (len(requests) - len(result)))
+
+        logger.info(f"(place batch order) placed: {sum(1 for order in result if order)}/{len(requests)}")
+
+        return result
+
     def get_open_orders(self, symbol: str, category: str) -> [Order]:
         cursor = None
         result = []
 
         while True:
-            response = self.__session.get_open_orders(
+            response = self.__send(
+                "order/realtime", RequestPriority.QUERY, self.__session.get_open_orders,
                 symbol=symbol,
                 category=category,
                 cursor=cursor,
@@ -89,24 +198,26 @@ class BybitClient:
 
             cursor = order_book.next_page_cursor
 
-        logger.info(f"(get open orders) {result}")
+        logger.info("(get open orders) %s", result)
 
         return result
 
-    def get_order_history(self, symbol: str):
+    # start_time, мс: только ордера, измененные после этого момента
+    def get_order_history(self, symbol: str, category: str = "spot", start_time: Optional[int] = None) -> List[Order]:
         cursor = None
         result = []
 
         while True:
-            result = BybitHandler.rest_handler(self.__session.get_order_history(
-                category="spot",
+            book = Book(**BybitHandler.rest_handler(self.__send(
+                "order/history", RequestPriority.QUERY, self.__session.get_order_history,
+                category=category,
                 symbol=symbol,
+                startTime=start_time,
                 limit=50,
                 cursor=cursor
-            ))
-            book = Book.parse_obj(result)
+            )))
 
-            result += book.list
+            result.extend(Order(**item) for item in book.list)
 
             if not book.next_page_cursor:
                 break
@@ -116,15 +227,15 @@ class BybitClient:
         return result
 
     def wallet_balance(self, coin_name: CoinType) -> Optional[Coin]:
-        response = self.__session.get_wallet_balance(
-            accountType="SPOT",  # TODO хардкод
+        response = self.__send(
+            "account/wallet-balance", RequestPriority.QUERY, self.__session.get_wallet_balance,
+            accountType=ACCOUNT_TYPE,
         )
 
-        logger.info(f"(wallet_balance){response}")
+        logger.debug("(wallet_balance) %s", response)
 
         result = BybitHandler.rest_handler(response)
         account = result["list"][0]
-        logger.info(account)
 
         # TODO вынести валидацию
         try:
@@ -135,12 +246,25 @@ class BybitClient:
 
         coin = next((item for item in account.coins if item.coin == coin_name), None)
 
-        logger.info(f"(current coin) {coin}")
+        logger.info("(current coin) %s", coin)
 
         return coin
 
+    # Снимок балансов всех монет аккаунта без валидации через Account/Coin
+    def wallet_balances(self) -> List[CoinBalance]:
+        response = self.__send(
+            "account/wallet-balance", RequestPriority.QUERY, self.__session.get_wallet_balance,
+            accountType=ACCOUNT_TYPE,
+        )
+
+        result = BybitHandler.rest_handler(response)
+        accounts = result["list"]
+
+        return [CoinBalance.from_raw(item) for item in (accounts[0].get("coin") or ())] if accounts else []
+
     def get_instrument_info(self, symbol: str, category: str) -> InstrumentInfo:
-        response = self.__session.get_instruments_info(
+        response = self.__send(
+            "market", RequestPriority.QUERY, self.__session.get_instruments_info,
             category=category,
             symbol=symbol
         )
@@ -149,21 +273,101 @@ class BybitClient:
         return InstrumentInfo.from_dict(result)
 
     def cancel_order(self, **kwargs) -> OrderEntity:
-        response = self.__session.cancel_order(**kwargs)
+        response = self.__send("order/cancel", RequestPriority.CANCEL, self.__session.cancel_order, **kwargs)
         result = BybitHandler.rest_handler(response)
         return OrderEntity(**result)
 
     def amend_order(self, **kwargs):
-        response = self.__session.amend_order(**kwargs)
+        response = self.__send("order/amend", RequestPriority.AMEND, self.__session.amend_order, **kwargs)
         result = BybitHandler.rest_handler(response)
-        logger.info(f"(amend order) {result}")
+        logger.info("(amend order) %s", result)
+
+    # Результат выровнен по requests: None на месте ордеров, которые не удалось изменить
+    def amend_batch_order(self, category: str, requests: List[dict]) -> List[Optional[OrderEntity]]:
+        if not all("orderId" in request and "symbol" in request for request in requests):
+            raise ValueError("Не все обязательные ключи предоставлены")
+
+        responses = self.__batch_executor.map(
+            lambda chunk: self.__send_chunk("order/amend-batch", RequestPriority.AMEND,
+                                            self.__session.amend_batch_order, category, chunk,
+                                            lambda _, response: BybitHandler.batch_entity_handler(response)),
+            BybitHandler.batch_chunks(requests))
+
+        result = []
+        for entities in responses:
+            result.extend(entities)
+
+        logger.info(f"(amend batch order) amended: {sum(1 for order in result if order)}/{len(requests)}")
+
+        return result
 
-    def cancel_all_orders(self, category: str):
-        response = self.__session.cancel_all_orders(category=category)
+    # Результат выровнен по requests: None на месте ордеров, которые не удалось отменить
+    def cancel_batch_order(self, category: str, requests: List[dict]) -> List[Optional[OrderEntity]]:
+        if not all("orderId" in request and "symbol" in request for request in requests):
+            raise ValueError("Не все обязательные ключи предоставлены")
+
+        responses = self.__batch_executor.map(
+            lambda chunk: self.__send_chunk("order/cancel-batch", RequestPriority.CANCEL,
+                                            self.__session.cancel_batch_order, category, chunk,
+                                            lambda _, response: BybitHandler.batch_entity_handler(response)),
+            BybitHandler.batch_chunks(requests))
+
+        result = []
+        for entities in responses:
+            result.extend(entities)
+
+        logger.info(f"(cancel batch order) cancelled: {sum(1 for order in result if order)}/{len(requests)}")
+
+        return result
+
+    # Без symbol отменяются ордера всех пар категории
+    def cancel_all_orders(self, category: str, symbol: Optional[str] = None):
+        response = self.__send("order/cancel-all", RequestPriority.CANCEL, self.__session.cancel_all_orders,
+                               category=category, symbol=symbol)
         result = BybitHandler.rest_handler(response)
         # return [OrderEntity(**item) for item in result["list"]]
 
     def get_orderbook(self, **kwargs) -> Orderbook:
-        response = self.__session.get_orderbook(**kwargs)
+        response = self.__send("market", RequestPriority.QUERY, self.__session.get_orderbook, **kwargs)
         result = BybitHandler.rest_handler(response)
         return Orderbook(**result)
+
+    # Пачка, запрос которой завершился ошибкой (отклонен планировщиком, HTTP, retCode), дает None на местах
+    # своих ордеров: результаты уже отправленных пачек сохраняются
+    def __send_chunk(
+            self,
+            group: str,
+            priority: RequestPriority,
+            method: Callable[..., tuple],
+            category: str,
+            chunk: List[dict],
+            handler: Callable[[List[dict], dict], List[Any]]
+    ) -> List[Any]:
+        try:
+            return handler(chunk, self.__send(group, priority, method, category=category, request=chunk))
+        except Exception as ex:
+            logger.error(f"({group}) Пачка из {len(chunk)} не обработана. {ex}")
+            return [None] * len(chunk)
+
+    # Все REST-запросы проходят через планировщик лимитов; pybit возвращает (json, elapsed, headers)
+    def __send(self, group: str, priority: RequestPriority, method: Callable[..., tuple], **kwargs) -> dict:
+        def request():
+            response, _, headers = method(**kwargs)
+            return response, headers
+
+        REST_CALLS.labels(method.__name__).inc()
+
+        # Время запроса вместе с ожиданием в планировщике. Ответ с retCode != 0 pybit превращает
+        # в InvalidRequestError (10002 и 10006 - после собственных повторов), до ответа он не доходит
+        try:
+            with tracer.span(f"rest.{group}"):
+                result = self.__scheduler.execute(group, priority, request)
+        except (InvalidRequestError, FailedRequestError) as ex:
+            REST_ERRORS.labels(method.__name__, str(ex.status_code)).inc()
+            raise
+        except Exception:
+            REST_ERRORS.labels(method.__name__, "other").inc()
+            raise
+
+        tracer.record_tick_to_trade()
+        return result
@@ -0,0 +1,305 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+from decimal import Decimal
+from typing import Any, Callable, Optional, List
+
+from core.log import logger
+from data import InstrumentInfo
+from domain_models import CoinType
+from schemas import Book, Orderbook
+from schemas.account_coin import Coin, Account
+from schemas.order import Order, OrderEntity
+from schemas.webcallbacks import APIResponse
+from . import BybitHandler, ORDER_NEEDED_KEYS
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+MAINNET_URL = "https://api.bybit.com"
+TESTNET_URL = "https://api-testnet.bybit.com"
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_KEEPALIVE_TIMEOUT = 30
+DEFAULT_TIMEOUT = 10
+RECV_WINDOW = 5000
+# Поля, которые Bybit v5 принимает только строками; pybit приводит их так же (cast_values)
+STRING_PARAMS = ("qty", "price", "triggerPrice", "takeProfit", "stopLoss")
+
+
+class AsyncBybitClient:
+    __key: str
+    __secret_key: str
+    __endpoint: str
+    __pool_size: int
+    __session: Optional['aiohttp.ClientSession']
+
+    # Методы повторяют BybitClient; независимые вызовы можно выполнять параллельно через asyncio.gather
+    def __init__(
+            self,
+            key: str,
+            secret_key: str,
+            is_testnet: bool = False,
+            pool_size: int = DEFAULT_POOL_SIZE,
+            endpoint: Optional[str] = None
+    ):
+        if aiohttp is None:
+            raise ImportError("Для AsyncBybitClient требуется пакет aiohttp")
+
+        self.__key = key
+        self.__secret_key = secret_key
+        self.__endpoint = endpoint or (TESTNET_URL if is_testnet else MAINNET_URL)
+        self.__pool_size = pool_size
+        self.__session = None
+
+    async def __aenter__(self) -> 'AsyncBybitClient':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        if self.__session:
+            await self.__session.close()
+            self.__session = None
+
+    async def place_order(self, **kwargs) -> Order:
+        if not all(key in kwargs for key in ORDER_NEEDED_KEYS):
+            raise ValueError("Не все обязательные ключи предоставлены")
+
+        result = await self.__request("POST", "/v5/order/create", kwargs)
+        result.update({key: str(kwargs[key]) for key in ORDER_NEEDED_KEYS})
+        result["orderStatus"] = "New"
+
+        logger.info("(place order) %s", result)
+
+        return Order(**result)
+
+    # Результат выровнен по requests: None на месте отклоненных биржей ордеров
+    async def place_batch_order(self, category: str, requests: List[dict]) -> List[Optional[Order]]:
+        if not all(key in request for request in requests for key in ORDER_NEEDED_KEYS):
+            raise ValueError("Не все обязательные ключи предоставлены")
+
+        responses = await asyncio.gather(*(
+            self.__send_chunk("/v5/order/create-batch", category, chunk, BybitHandler.batch_order_handler)
+            for chunk in BybitHandler.batch_chunks(requests)
+        ))
+
+        result = []
+        for orders in responses:
+            result.extend(orders)
+
+        logger.info(f"(place batch order) placed: {sum(1 for order in result if order)}/{len(requests)}")
+
+        return result
+
+    async def get_open_orders(self, symbol: str, category: str) -> [Order]:
+        cursor = None
+        result = []
+
+        while True:
+            book = Book(**await self.__request("GET", "/v5/order/realtime", {
+                "symbol": symbol,
+                "category": category,
+                "cursor": cursor,
+                "limit": 50
+            }))
+
+            result.extend(Order(**item) for item in book.list)
+
+            if not book.next_page_cursor:
+                break
+
+            cursor = book.next_page_cursor
+
+        logger.info("(get open orders) %s", result)
+
+        return result
+
+    async def get_order_history(
+            self,
+            symbol: str,
+            category: str = "spot",
+            start_time: Optional[int] = None
+    ) -> [Order]:
+        cursor = None
+        result = []
+
+        while True:
+            book = Book(**await self.__request("GET", "/v5/order/history", {
+                "category": category,
+                "symbol": symbol,
+                "startTime": start_time,
+                "limit": 50,
+                "cursor": cursor
+            }))
+
+            result.extend(Order(**item) for item in book.list)
+
+            if not book.next_page_cursor:
+                break
+
+            cursor = book.next_page_cursor
+
+        return result
+
+    async def wallet_balance(self, coin_name: CoinType) -> Optional[Coin]:
+        result = await self.__request("GET", "/v5/account/wallet-balance", {"accountType": "SPOT"})
+        account = Account(**result["list"][0])
+        coin = next((item for item in account.coins if item.coin == coin_name), None)
+
+        logger.info("(current coin) %s", coin)
+
+        return coin
+
+    async def get_instrument_info(self, symbol: str, category: str) -> InstrumentInfo:
+        result = await self.__request("GET", "/v5/market/instruments-info", {
+            "category": category,
+            "symbol": symbol
+        }, auth=False)
+
+        return InstrumentInfo.from_dict(result)
+
+    async def cancel_order(self, **kwargs) -> OrderEntity:
+        result = await self.__request("POST", "/v5/order/cancel", kwargs)
+        return OrderEntity(**result)
+
+    async def amend_order(self, **kwargs):
+        result = await self.__request("POST", "/v5/order/amend", kwargs)
+        logger.info("(amend order) %s", result)
+
+    # Результат выровнен по requests: None на месте ордеров, которые не удалось изменить
+    async def amend_batch_order(self, category: str, requests: List[dict]) -> List[Optional[OrderEntity]]:
+        if not all("orderId" in request and "symbol" in request for request in requests):
+            raise ValueError("Не все обязательные ключи предоставлены")
+
+        responses = await asyncio.gather(*(
+            self.__send_chunk("/v5/order/amend-batch", category, chunk,
+                              lambda _, response: BybitHandler.batch_entity_handler(response))
+            for chunk in BybitHandler.batch_chunks(requests)
+        ))
+
+        result = []
+        for entities in responses:
+            result.extend(entities)
+
+        logger.info(f"(amend batch order) amended: {sum(1 for order in result if order)}/{len(requests)}")
+
+        return result
+
+    # Результат выровнен по requests: None на месте ордеров, которые не удалось отменить
+    async def cancel_batch_order(self, category: str, requests: List[dict]) -> List[Optional[OrderEntity]]:
+        if not all("orderId" in request and "symbol" in request for request in requests):
+            raise ValueError("Не все обязательные ключи предоставлены")
+
+        responses = await asyncio.gather(*(
+            self.__send_chunk("/v5/order/cancel-batch", category, chunk,
+                              lambda _, response: BybitHandler.batch_entity_handler(response))
+            for chunk in BybitHandler.batch_chunks(requests)
+        ))
+
+        result = []
+        for entities in responses:
+            result.extend(entities)
+
+        logger.info(f"(cancel batch order) cancelled: {sum(1 for order in result if order)}/{len(requests)}")
+
+        return result
+
+    async def cancel_all_orders(self, category: str, symbol: Optional[str] = None):
+        await self.__request("POST", "/v5/order/cancel-all", {"category": category, "symbol": symbol})
+
+    async def get_orderbook(self, **kwargs) -> Orderbook:
+        result = await self.__request("GET", "/v5/market/orderbook", kwargs, auth=False)
+        return Orderbook(**result)
+
+    async def __request(self, method: str, path: str, params: dict, auth: bool = True) -> Any:
+        message = await self.__send(method, path, params, auth)
+        response = APIResponse(**message)
+
+        if response.ret_code != 0:
+            raise Exception(f"[{path}] Ошибка запроса. Код: {response.ret_code}. "
+                            f"\nСообщение: {response.ret_msg}")
+
+        return response.result
+
+    # Пачка с ошибкой запроса дает None на местах своих ордеров, результаты остальных пачек сохраняются
+    async def __send_chunk(
+            self,
+            path: str,
+            category: str,
+            chunk: List[dict],
+            handler: Callable[[List[dict], dict], List[Any]]
+    ) -> List[Any]:
+        try:
+            return handler(chunk, await self.__send("POST", path, {"category": category, "request": chunk}))
+        except Exception as ex:
+            logger.error(f"({path}) Пачка из {len(chunk)} не обработана. {ex}")
+            return [None] * len(chunk)
+
+    async def __send(self, method: str, path: str, params: dict, auth: bool = True) -> dict:
+        params = {key: self.__cast(value, key) for key, value in params.items() if value is not None}
+        session = self.__get_session()
+
+        if method == "GET":
+            payload = "&".join(f"{key}={value}" for key, value in sorted(params.items()))
+            url = f"{self.__endpoint}{path}?{payload}" if payload else f"{self.__endpoint}{path}"
+            body = None
+        else:
+            payload = json.dumps(params)
+            url = f"{self.__endpoint}{path}"
+            body = payload
+
+        headers = self.__auth_headers(payload) if auth else {}
+
+        async with session.request(method, url, data=body, headers=headers) as response:
+            if response.status != 200:
+                raise Exception(f"[{path}] HTTP {response.status}: {await response.text()}")
+
+            return await response.json(content_type=None)
+
+    def __get_session(self) -> 'aiohttp.ClientSession':
+        # Сессия создается внутри работающего event loop; пул keep-alive соединений ограничен pool_size
+        if self.__session is None or self.__session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.__pool_size,
+                keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT
+            )
+            self.__session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT),
+                headers={"Content-Type": "application/json", "Accept": "application/json"}
+            )
+
+        return self.__session
+
+    def __auth_headers(self, payload: str) -> dict:
+        timestamp = str(int(time.time() * 1000))
+        param_str = f"{timestamp}{self.__key}{RECV_WINDOW}{payload}"
+        signature = hmac.new(self.__secret_key.encode("utf-8"), param_str.encode("utf-8"), hashlib.sha256).hexdigest()
+
+        return {
+            "X-BAPI-API-KEY": self.__key,
+            "X-BAPI-SIGN": signature,
+            "X-BAPI-SIGN-TYPE": "2",
+            "X-BAPI-TIMESTAMP": timestamp,
+            "X-BAPI-RECV-WINDOW": str(RECV_WINDOW)
+        }
+
+    # Decimal и числа в строковых полях (qty из целого tradeAmount) уходят в теле строками, как у pybit
+    @staticmethod
+    def __cast(value, key: Optional[str] = None):
+        if isinstance(value, Decimal) or (key in STRING_PARAMS and isinstance(value, (int, float))):
+            return str(value)
+        if isinstance(value, list):
+            return [AsyncBybitClient.__cast(item) for item in value]
+        if isinstance(value, dict):
+            return {item_key: AsyncBybitClient.__cast(item, item_key) for item_key, item in value.items()}
+        return value
+
+
+__all__ = ["AsyncBybitClient"]
@@ -0,0 +1,279 @@
+import itertools
+import time
+from dataclasses import dataclass
+from enum import IntEnum
+from threading import Condition
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from core.log import logger
+
+# Заголовки ответа Bybit с остатком лимита по эндпоинту
+LIMIT_STATUS_HEADER = "X-Bapi-Limit-Status"
+LIMIT_RESET_HEADER = "X-Bapi-Limit-Reset-Timestamp"
+
+DEFAULT_MAX_QUEUE_SIZE = 100
+DEFAULT_MAX_WAIT = 5.0
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+class RequestPriority(IntEnum):
+    CANCEL = 0
+    AMEND = 1
+    PLACE = 2
+    QUERY = 3
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    rate: float  # запросов в секунду
+    burst: int  # емкость корзины
+
+
+# Лимиты spot по документации Bybit v5; группа - путь эндпоинта без /v5/
+DEFAULT_RATE_LIMITS: Dict[str, RateLimit] = {
+    "order/create": RateLimit(20, 20),
+    "order/amend": RateLimit(20, 20),
+    "order/cancel": RateLimit(20, 20),
+    "order/cancel-all": RateLimit(20, 20),
+    "order/create-batch": RateLimit(20, 20),
+    "order/amend-batch": RateLimit(20, 20),
+    "order/cancel-batch": RateLimit(20, 20),
+    "order/realtime": RateLimit(50, 50),
+    "order/history": RateLimit(50, 50),
+    "account/wallet-balance": RateLimit(50, 50),
+    # Публичные эндпоинты ограничены по IP: 600 запросов за 5 секунд
+    "market": RateLimit(120, 600)
+}
+DEFAULT_RATE_LIMIT = RateLimit(10, 10)
+
+
+class RequestShedException(Exception):
+    pass
+
+
+class TokenBucket:
+    __slots__ = ("__rate", "__burst", "__tokens", "__updated", "__blocked_until")
+
+    def __init__(self, limit: RateLimit, now: float):
+        self.__rate = limit.rate
+        self.__burst = limit.burst
+        self.__tokens = float(limit.burst)
+        self.__updated = now
+        self.__blocked_until = 0.0
+
+    @property
+    def tokens(self) -> float:
+        return self.__tokens
+
+    def wait_time(self, now: float) -> float:
+        if now < self.__blocked_until:
+            return self.__blocked_until - now
+
+        self.__refill(now)
+        return 0.0 if self.__tokens >= 1 else (1 - self.__tokens) / self.__rate
+
+    def take(self, now: float):
+        self.__refill(now)
+        self.__tokens -= 1
+
+    # Остаток от биржи учитывает запросы, о которых корзина не знает (другие процессы, тот же UID)
+    def update(self, remaining: int, reset_time: Optional[float], now: float):
+        self.__refill(now)
+        self.__tokens = min(self.__tokens, float(remaining))
+
+        if remaining <= 0 and reset_time:
+            self.__blocked_until = max(self.__blocked_until, reset_time)
+
+    def __refill(self, now: float):
+        if now > self.__updated:
+            self.__tokens = min(float(self.__burst), self.__tokens + (now - self.__updated) * self.__rate)
+            self.__updated = now
+
+
+@dataclass
+class GroupStats:
+    executed: int = 0
+    shed: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    @property
+    def avg_wait(self) -> float:
+        return self.total_wait / self.executed if self.executed else 0.0
+
+
+@dataclass
+class SchedulerStats:
+    queue_depth: int
+    max_queue_depth: int
+    in_flight: int
+    groups: Dict[str, GroupStats]
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "group", "enqueued")
+
+    def __init__(self, priority: RequestPriority, seq: int, group: str, enqueued: float):
+        self.priority = priority
+        self.seq = seq
+        self.group = group
+        self.enqueued = enqueued
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        return self.priority, self.seq
+
+
+class RequestScheduler:
+    __limits: Dict[str, RateLimit]
+    __buckets: Dict[str, TokenBucket]
+    __stats: Dict[str, GroupStats]
+    __waiting: List[_Ticket]
+    __condition: Condition
+
+    # Запрос выполняется в потоке вызывающего; планировщик только решает, когда его можно отправить
+    def __init__(
+            self,
+            limits: Optional[Dict[str, RateLimit]] = None,
+            max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+            max_wait: float = DEFAULT_MAX_WAIT,
+            max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+    ):
+        self.__limits = {**DEFAULT_RATE_LIMITS, **(limits or {})}
+        self.__max_queue_size = max_queue_size
+        self.__max_wait = max_wait
+        self.__max_concurrency = max_concurrency
+
+        self.__buckets = {}
+        self.__stats = {}
+        self.__waiting = []
+        self.__in_flight = 0
+        self.__max_queue_depth = 0
+        self.__counter = itertools.count()
+        self.__condition = Condition()
+
+    @property
+    def stats(self) -> SchedulerStats:
+        with self.__condition:
+            return SchedulerStats(
+                queue_depth=len(self.__waiting),
+                max_queue_depth=self.__max_queue_depth,
+                in_flight=self.__in_flight,
+                groups={group: GroupStats(**vars(stats)) for group, stats in self.__stats.items()}
+            )
+
+    # request возвращает (ответ, заголовки); заголовки могут быть None
+    def execute(
+            self,
+            group: str,
+            priority: RequestPriority,
+            request: Callable[[], Tuple[Any, Optional[Mapping]]]
+    ) -> Any:
+        self.__acquire(group, priority)
+
+        try:
+            response, headers = request()
+        except Exception as ex:
+            self.__release(group, getattr(ex, "resp_headers", None))
+            raise
+
+        self.__release(group, headers)
+        return response
+
+    def __acquire(self, group: str, priority: RequestPriority):
+        with self.__condition:
+            stats = self.__group_stats(group)
+
+            # Отмены не отбрасываются никогда: они только освобождают лимиты и риск
+            if priority != RequestPriority.CANCEL and len(self.__waiting) >= self.__max_queue_size:
+                stats.shed += 1
+                raise RequestShedException(f"[{group}] Очередь запросов переполнена ({len(self.__waiting)})")
+
+            now = time.time()
+            ticket = _Ticket(priority, next(self.__counter), group, now)
+            deadline = None if priority == RequestPriority.CANCEL else now + self.__max_wait
+
+            self.__waiting.append(ticket)
+            self.__max_queue_depth = max(self.__max_queue_depth, len(self.__waiting))
+
+            while True:
+                now = time.time()
+                delay = self.__dispatch_delay(ticket, now)
+
+                if delay == 0:
+                    break
+
+                if deadline is not None and now >= deadline:
+                    self.__waiting.remove(ticket)
+                    self.__condition.notify_all()
+                    stats.shed += 1
+                    raise RequestShedException(f"[{group}] Превышено время ожидания лимита {self.__max_wait} сек")
+
+                timeout = delay
+                if deadline is not None:
+                    timeout = deadline - now if timeout is None else min(timeout, deadline - now)
+
+                self.__condition.wait(timeout)
+
+            self.__waiting.remove(ticket)
+            self.__bucket(group).take(now)
+            self.__in_flight += 1
+
+            wait = now - ticket.enqueued
+            stats.executed += 1
+            stats.total_wait += wait
+            stats.max_wait = max(stats.max_wait, wait)
+
+            if wait > 1:
+                logger.debug(f"(scheduler) [{group}] запрос ждал лимита {wait:.3f} сек")
+
+            self.__condition.notify_all()
+
+    def __release(self, group: str, headers: Optional[Mapping]):
+        with self.__condition:
+            self.__in_flight -= 1
+
+            if headers and LIMIT_STATUS_HEADER in headers:
+                reset = headers.get(LIMIT_RESET_HEADER)
+                self.__bucket(group).update(
+                    remaining=int(headers[LIMIT_STATUS_HEADER]),
+                    reset_time=int(reset) / 1000 if reset else None,
+                    now=time.time()
+                )
+
+            self.__condition.notify_all()
+
+    # 0 - можно отправлять; None - ждать освобождения слота или более приоритетного запроса
+    def __dispatch_delay(self, ticket: _Ticket, now: float) -> Optional[float]:
+        delay = self.__bucket(ticket.group).wait_time(now)
+        if delay > 0:
+            return delay
+
+        if self.__in_flight >= self.__max_concurrency:
+            return None
+
+        for other in self.__waiting:
+            if other.key < ticket.key and self.__bucket(other.group).wait_time(now) == 0:
+                return None
+
+        return 0
+
+    def __bucket(self, group: str) -> TokenBucket:
+        bucket = self.__buckets.get(group)
+        if bucket is None:
+            bucket = TokenBucket(self.__limits.get(group, DEFAULT_RATE_LIMIT), time.time())
+            self.__buckets[group] = bucket
+
+        return bucket
+
+    def __group_stats(self, group: str) -> GroupStats:
+        stats = self.__stats.get(group)
+        if stats is None:
+            stats = GroupStats()
+            self.__stats[group] = stats
+
+        return stats
+
+
+__all__ = ["RequestScheduler", "RequestPriority", "RateLimit", "RequestShedException", "GroupStats",
+           "SchedulerStats", "DEFAULT_RATE_LIMITS"]
@@ -1,22 +1,85 @@
+import json
 from abc import ABC, abstractmethod
-from typing import Callable, Optional
+from decimal import InvalidOperation
+from typing import Any, Callable, Dict, List, Optional
+from uuid import uuid4
 
 from core.log import logger
+from core.metrics import registry
+from core.recorder import FrameRecorder
+from core.tracing import tracer
+from domain_models import PriceScale
 from pybit.unified_trading import WebSocket
 from pydantic import ValidationError
 
-from schemas import Orderbook, Ticker, EventMessage
+from schemas import Orderbook, OrderbookUpdate, Ticker, TickerRecord, EventMessage
+from schemas.account_coin import CoinBalance
 from schemas.order import Order
 from schemas.webcallbacks import SocketOperation
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Глубина стакана, поддерживаемая spot: 1, 50, 200
+ORDERBOOK_DEPTH = 50
+
+json_loads = orjson.loads if orjson else json.loads
+
+# Служебные сообщения, которые обрабатывает сам pybit
+PYBIT_OPERATIONS = ("auth", "subscribe")
+
+# Тип аккаунта, балансы которого использует бот
+ACCOUNT_TYPE = "SPOT"
+
+WS_DECODE_ERRORS = registry.counter("bybit_ws_decode_errors_total", "Ошибки разбора сообщений сокета", ("stream",))
+
+
+class EndpointWebSocket(WebSocket):
+    # pybit собирает адрес из шаблона wss://{SUBDOMAIN}.{DOMAIN}.com/v5/...: хост заменяется, путь сохраняется.
+    # Переподключение pybit проходит через тот же _connect
+    def __init__(self, endpoint: str, **kwargs):
+        self.__endpoint = endpoint.rstrip("/")
+        super().__init__(**kwargs)
+
+    def _connect(self, url):
+        super()._connect(self.__endpoint + url[url.index("/v5/"):])
+
 
 class WebsocketBase(ABC):
-    __socket: WebSocket
     __is_testnet: bool
-
-    def __init__(self, is_testnet: bool):
+    __is_fast_decode: bool
+    __recorder: Optional[FrameRecorder]
+    __endpoint: Optional[str]
+    _price_scales: Dict[str, PriceScale]
+
+    # fast_decode: публичные топики разбираются без pydantic, для отладки оставлять False.
+    # endpoint: ws://host:port вместо серверов Bybit, например локальный симулятор
+    def __init__(
+            self,
+            is_testnet: bool,
+            fast_decode: bool = False,
+            recorder: Optional[FrameRecorder] = None,
+            endpoint: Optional[str] = None
+    ):
         self.__is_testnet = is_testnet
-
+        self.__is_fast_decode = fast_decode
+        self.__recorder = recorder
+        self.__endpoint = endpoint
+        self._price_scales = {}
+        self.__decode_stage = f"ws.decode.{type(self).__name__}"
+        self.__decode_errors = WS_DECODE_ERRORS.labels(type(self).__name__)
+
+    @property
+    def is_fast_decode(self) -> bool:
+        return self.__is_fast_decode
+
+    # Цены пары декодируются в тики шкалы; задается до подписки. Без шкалы цены остаются Decimal
+    def set_price_scale(self, symbol: str, scale: PriceScale):
+        self._price_scales[symbol] = scale
+
+    # Отдельное соединение на поток; общие соединения на несколько пар - services.socket_hub
     def stream(
             self,
             symbol: str,
@@ -24,17 +87,55 @@ class WebsocketBase(ABC):
             callback: Callable,
             operation_callback: Optional[Callable[[SocketOperation], None]] = None
     ) -> WebSocket:
+        socket = self.connect(channel_type)
+        self.attach(socket, lambda data: self.forward(data, callback, operation_callback))
+        self.subscribe(socket, symbol, callback)
+        return socket
+
+    def connect(self, channel_type: str) -> WebSocket:
+        return self._create_socket(channel_type, self.__is_testnet)
+
+    # Получаем сырые сообщения сокета в обход локальной копии стакана и deepcopy внутри pybit
+    def attach(self, socket: WebSocket, on_message: Callable[[dict], None]):
         def wrapped_callback(data):
-            logger.trace(f"{data}")
-            self.__validate_and_forward(data, callback, operation_callback)
+            started = tracer.begin_frame()
+            try:
+                logger.trace("%s", data)
+                # Служебные сообщения (auth, subscribe) оставляем на обработку pybit
+                if data.get('op') in PYBIT_OPERATIONS:
+                    socket._handle_incoming_message(data)
+                on_message(data)
+            finally:
+                tracer.end_frame(started)
+
+        loads = json_loads if self.__is_fast_decode else json.loads
+        recorder = self.__recorder
+
+        def raw_message_callback(message):
+            data = loads(message)
+            if socket._is_custom_pong(data):
+                return
+
+            if recorder:
+                recorder.write(message)
+            wrapped_callback(data)
+
+        socket.callback = wrapped_callback
+        if self.__is_fast_decode or recorder:
+            socket._on_message = raw_message_callback
+
+    def subscribe(self, socket: WebSocket, symbol: str, callback: Callable):
+        self._stream_impl(socket, symbol, callback)
 
-        self.__socket = self._create_socket(channel_type, self.__is_testnet)
-        if operation_callback:
-            self.__socket.callback = wrapped_callback  # Подписка на сообщения сокета (auth, subscribe)
-        self._stream_impl(self.__socket, symbol, wrapped_callback)
-        return self.__socket
+    def unsubscribe(self, socket: WebSocket, symbol: str):
+        self._unsubscribe_impl(socket, self.topic(symbol))
 
-    def __validate_and_forward(self, data, callback, operation_callback):
+    def forward(
+            self,
+            data: dict,
+            callback: Optional[Callable],
+            operation_callback: Optional[Callable[[SocketOperation], None]] = None
+    ):
         is_operation_message = 'ret_msg' in data
         is_normal_message = 'topic' in data
 
@@ -49,20 +150,60 @@ class WebsocketBase(ABC):
                 logger.critical(ex, exc_info=True)
                 # raise ex
 
-        if is_normal_message:
+        if is_normal_message and callback:
             try:
-                snapshot = EventMessage(**data)
-                data_parsed = self._parse_obj(snapshot.data)
-                callback(data_parsed)
+                with tracer.span(self.__decode_stage):
+                    data_parsed = self.decode(data)
             except ValidationError as ex:
+                self.__decode_errors.inc()
                 logger.error(f"Ошибка валидации. {ex.errors()}")
                 return
+            except (KeyError, TypeError, ValueError, InvalidOperation) as ex:
+                self.__decode_errors.inc()
+                logger.error(f"Ошибка декодирования. {ex!r}")
+                return
+
+            try:
+                callback(data_parsed)
             except Exception as ex:
                 logger.critical(ex, exc_info=True)
                 # raise ex
 
+    def decode(self, data: dict):
+        if self.__is_fast_decode:
+            return self._decode_fast(data)
+
+        return self._parse_message(EventMessage(**data))
+
     def _create_socket(self, channel_type, is_testnet) -> WebSocket:
-        return WebSocket(testnet=is_testnet, channel_type=channel_type)
+        return self._open_socket(testnet=is_testnet, channel_type=channel_type)
+
+    def _open_socket(self, **kwargs) -> WebSocket:
+        if self.__endpoint:
+            return EndpointWebSocket(self.__endpoint, **kwargs)
+        return WebSocket(**kwargs)
+
+    def _parse_message(self, message: EventMessage):
+        return self._parse_obj(message.data)
+
+    # Быстрый разбор без pydantic. По умолчанию - строгая валидация
+    def _decode_fast(self, data: dict):
+        return self._parse_message(EventMessage(**data))
+
+    # Разбивает результат decode по парам; None - результат относится ко всем подписчикам топика
+    def split(self, data) -> Optional[Dict[str, Any]]:
+        return None
+
+    def _unsubscribe_impl(self, socket: WebSocket, topic: str):
+        socket.ws.send(json.dumps({"op": "unsubscribe", "req_id": str(uuid4()), "args": [topic]}))
+        # Иначе pybit подпишется на топик снова при переподключении
+        socket.subscriptions = {req_id: message for req_id, message in socket.subscriptions.items()
+                                if topic not in json.loads(message)["args"]}
+        socket.callback_directory.pop(topic, None)
+
+    @abstractmethod
+    def topic(self, symbol: str) -> str:
+        pass
 
     @abstractmethod
     def _stream_impl(self, socket: WebSocket, symbol: str, callback: Callable):
@@ -77,14 +218,21 @@ class PrivateWebsocket(WebsocketBase):
     __key: str
     __secret: str
 
-    def __init__(self, key: str, secret: str, is_testnet: bool = False):
-        super().__init__(is_testnet)
+    def __init__(
+            self,
+            key: str,
+            secret: str,
+            is_testnet: bool = False,
+            recorder: Optional[FrameRecorder] = None,
+            endpoint: Optional[str] = None
+    ):
+        super().__init__(is_testnet, recorder=recorder, endpoint=endpoint)
 
         self.__key = key
         self.__secret = secret
 
     def _create_socket(self, channel_type, is_testnet) -> WebSocket:
-        return WebSocket(
+        return self._open_socket(
             testnet=is_testnet,
             api_key=self.__key,
             api_secret=self.__secret,
@@ -101,27 +249,76 @@ class PrivateWebsocket(WebsocketBase):
 
 
 class OrderbookWebsocket(WebsocketBase):
+    __depth: int
+
+    def __init__(
+            self,
+            is_testnet: bool,
+            fast_decode: bool = False,
+            recorder: Optional[FrameRecorder] = None,
+            depth: int = ORDERBOOK_DEPTH,
+            endpoint: Optional[str] = None
+    ):
+        super().__init__(is_testnet, fast_decode, recorder, endpoint)
+        self.__depth = depth
+
+    def topic(self, symbol: str) -> str:
+        return f"orderbook.{self.__depth}.{symbol}"
+
     def _stream_impl(self, socket: WebSocket, symbol: str, callback: Callable):
-        socket.orderbook_stream(1, symbol, callback)
+        socket.orderbook_stream(self.__depth, symbol, callback)
+
+    def _parse_message(self, message: EventMessage) -> OrderbookUpdate:
+        orderbook = self._parse_obj(message.data)
+        return OrderbookUpdate.from_orderbook(orderbook, message.message_type == "snapshot",
+                                              self._price_scales.get(orderbook.symbol))
+
+    def _decode_fast(self, data: dict) -> OrderbookUpdate:
+        return OrderbookUpdate.from_raw(data, self._price_scales.get(data["data"]["s"]))
 
     def _parse_obj(self, data):
         return Orderbook(**data)
 
 
 class TickerWebsocket(WebsocketBase):
+    def topic(self, symbol: str) -> str:
+        return f"tickers.{symbol}"
+
     def _stream_impl(self, socket: WebSocket, symbol: str, callback: Callable):
         socket.ticker_stream(symbol, callback)
 
     def _parse_obj(self, data):
         return Ticker(**data)
 
+    # Со шкалой пары строгий разбор отдает тот же TickerRecord в тиках, что и быстрый
+    def _parse_message(self, message: EventMessage):
+        ticker = self._parse_obj(message.data)
+        scale = self._price_scales.get(ticker.symbol)
+        if scale is None:
+            return ticker
+        return TickerRecord(ticker.symbol, scale.to_ticks(ticker.last_price))
+
+    def _decode_fast(self, data: dict) -> TickerRecord:
+        return TickerRecord.from_raw(data, self._price_scales.get(data["data"]["symbol"]))
+
 
 class OrderWebsocket(PrivateWebsocket):
+    # Приватный топик один на аккаунт: ордера всех пар приходят в одном сообщении
+    def topic(self, symbol: str) -> str:
+        return "order"
+
+    def split(self, data: List[Order]) -> Dict[str, List[Order]]:
+        orders_by_symbol: Dict[str, List[Order]] = {}
+        for order in data:
+            orders_by_symbol.setdefault(order.symbol, []).append(order)
+
+        return orders_by_symbol
+
     def _stream_impl(self, socket: WebSocket, symbol: str, callback: Callable):
         socket.order_stream(callback)
 
     def _parse_obj(self, data):
-        logger.debug(data)
+        logger.debug("(order) %s", data)
         result = []
         for item in data:
             result.append(Order(**item))
@@ -129,15 +326,45 @@ class OrderWebsocket(PrivateWebsocket):
         return result
 
 
+class WalletWebsocket(PrivateWebsocket):
+    # Топик один на аккаунт; подписчики получают балансы всех монет
+    def topic(self, symbol: str) -> str:
+        return "wallet"
+
+    def _stream_impl(self, socket: WebSocket, symbol: str, callback: Callable):
+        socket.wallet_stream(callback)
+
+    def _parse_obj(self, data) -> List[CoinBalance]:
+        result = []
+        for account in data:
+            if account.get("accountType", ACCOUNT_TYPE) != ACCOUNT_TYPE:
+                continue
+
+            for item in account.get("coin") or ():
+                result.append(CoinBalance.from_raw(item))
+
+        return result
+
+
 class BybitWebsocketClient:
     orderbook: OrderbookWebsocket
     ticker: TickerWebsocket
     order: OrderWebsocket
+    wallet: WalletWebsocket
 
-    def __init__(self, key: str, secret: str, is_testnet: bool = False):
-        self.orderbook = OrderbookWebsocket(is_testnet)
-        self.ticker = TickerWebsocket(is_testnet)
-        self.order = OrderWebsocket(key, secret)
+    def __init__(
+            self,
+            key: str,
+            secret: str,
+            is_testnet: bool = False,
+            fast_decode: bool = False,
+            recorder: Optional[FrameRecorder] = None,
+            endpoint: Optional[str] = None
+    ):
+        self.orderbook = OrderbookWebsocket(is_testnet, fast_decode, recorder, endpoint=endpoint)
+        self.ticker = TickerWebsocket(is_testnet, fast_decode, recorder, endpoint)
+        self.order = OrderWebsocket(key, secret, recorder=recorder, endpoint=endpoint)
+        self.wallet = WalletWebsocket(key, secret, is_testnet, recorder=recorder, endpoint=endpoint)
 
 
 __all__ = ["BybitWebsocketClient"]
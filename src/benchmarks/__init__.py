@@ -0,0 +1,53 @@
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Sequence
+
+from core.log import logger
+
+# Прогрев перед замером: кэши pydantic, первые аллокации, ленивые метки метрик
+WARMUP_SECONDS = 0.1
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    # Сообщений в секунду; больше - лучше
+    rate: float
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {"rate": round(self.rate, 1), **self.extra}
+
+
+def measure(step: Callable[[Any], Any], frames: Sequence, seconds: float) -> float:
+    deadline = time.perf_counter() + min(WARMUP_SECONDS, seconds)
+    while time.perf_counter() < deadline:
+        for frame in frames:
+            step(frame)
+
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+
+    while time.perf_counter() < deadline:
+        for frame in frames:
+            step(frame)
+        count += len(frames)
+
+    return count / (time.perf_counter() - started)
+
+
+# Логи торгового пути не должны попадать в файл во время замеров: стоимость логирования меряет benchmarks.log
+@contextmanager
+def quiet_logger(level: int = logging.WARNING):
+    previous = logger.level
+    logger.setLevel(level)
+    try:
+        yield
+    finally:
+        logger.setLevel(previous)
+
+
+__all__ = ["BenchmarkResult", "measure", "quiet_logger"]
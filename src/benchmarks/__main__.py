@@ -0,0 +1,90 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from benchmarks import BenchmarkResult, decode, events, log, prices, triggers
+
+# Запуск из каталога src: python -m benchmarks [--seconds 1] [--output run.json] [--compare previous.json]
+# Результат - JSON со скоростью в сообщениях в секунду по каждому случаю; сводка и сравнение - в stderr
+
+SUITES = {
+    "decode": decode.run,
+    "events": events.run,
+    "triggers": triggers.run,
+    "prices": prices.run,
+    "log": log.run
+}
+FORMAT_VERSION = 1
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_report(results: List[BenchmarkResult], seconds: float) -> dict:
+    return {
+        "version": FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seconds": seconds,
+        "results": {result.name: result.to_dict() for result in results}
+    }
+
+
+def format_comparison(current: Dict[str, dict], previous: Dict[str, dict]) -> str:
+    lines = [f"{'case':<36}{'previous':>14}{'current':>14}{'change':>10}"]
+    for name, result in current.items():
+        before = previous.get(name, {}).get("rate")
+        if not before:
+            lines.append(f"{name:<36}{'-':>14}{result['rate']:>14,.0f}{'new':>10}")
+            continue
+
+        change = (result["rate"] / before - 1) * 100
+        lines.append(f"{name:<36}{before:>14,.0f}{result['rate']:>14,.0f}{change:>+9.1f}%")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки горячего пути бота")
+    parser.add_argument("--seconds", type=float, default=1.0, help="Длительность замера одного случая")
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES), help="По умолчанию - все")
+    parser.add_argument("--output", help="Файл для JSON-результата, по умолчанию stdout")
+    parser.add_argument("--compare", help="JSON предыдущего запуска для сравнения")
+    args = parser.parse_args()
+
+    results = []
+    for suite in args.suite or SUITES:
+        print(f"(benchmarks) {suite}...", file=sys.stderr)
+        results.extend(SUITES[suite](args.seconds))
+
+    report = build_report(results, args.seconds)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            previous = json.load(file)
+        print(format_comparison(report["results"], previous.get("results", {})), file=sys.stderr)
+    else:
+        for name, result in report["results"].items():
+            print(f"{name:<36}{result['rate']:>14,.0f} msg/s", file=sys.stderr)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
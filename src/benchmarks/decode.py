@@ -0,0 +1,61 @@
+import json
+import sys
+from typing import List
+
+from api.bybit_client.websockets import OrderbookWebsocket, OrderWebsocket, TickerWebsocket, json_loads, orjson
+from benchmarks import BenchmarkResult, measure, quiet_logger
+from benchmarks.fixtures import TICKER_FRAME, ORDERBOOK_SNAPSHOT_FRAME, ORDERBOOK_DELTA_FRAMES, ORDER_FRAME
+
+# Запуск из каталога src: python -m benchmarks.decode [seconds]
+
+
+def run(seconds: float) -> List[BenchmarkResult]:
+    strict_ticker = TickerWebsocket(False)
+    fast_ticker = TickerWebsocket(False, fast_decode=True)
+    strict_orderbook = OrderbookWebsocket(False)
+    fast_orderbook = OrderbookWebsocket(False, fast_decode=True)
+    order = OrderWebsocket("", "")
+
+    ticker_frames = [TICKER_FRAME]
+    snapshot_frames = [ORDERBOOK_SNAPSHOT_FRAME]
+    delta_frames = ORDERBOOK_DELTA_FRAMES
+
+    results = []
+    for name, strict, fast, frames in [
+        ("ticker", strict_ticker, fast_ticker, ticker_frames),
+        ("orderbook_snapshot_50", strict_orderbook, fast_orderbook, snapshot_frames),
+        ("orderbook_delta_3", strict_orderbook, fast_orderbook, delta_frames)
+    ]:
+        results.append(BenchmarkResult(f"decode.{name}.strict", measure(strict.decode, frames, seconds)))
+        results.append(BenchmarkResult(f"decode.{name}.fast", measure(fast.decode, frames, seconds)))
+
+    # Приватный топик всегда разбирается pydantic; _parse_obj пишет кадр в debug-лог
+    with quiet_logger():
+        results.append(BenchmarkResult("decode.order_3.strict", measure(order.decode, [ORDER_FRAME], seconds)))
+
+    # Полный путь от сырого кадра: json + валидация
+    raw_frames = [json.dumps(frame) for frame in [TICKER_FRAME] + delta_frames]
+    extra = {"json": "orjson" if orjson else "json"}
+    results.append(BenchmarkResult("decode.raw.strict", measure(
+        lambda raw: strict_orderbook.decode(json.loads(raw)) if "orderbook" in raw
+        else strict_ticker.decode(json.loads(raw)), raw_frames, seconds), extra))
+    results.append(BenchmarkResult("decode.raw.fast", measure(
+        lambda raw: fast_orderbook.decode(json_loads(raw)) if "orderbook" in raw
+        else fast_ticker.decode(json_loads(raw)), raw_frames, seconds), extra))
+
+    return results
+
+
+def main(seconds: float):
+    results = {result.name: result for result in run(seconds)}
+
+    for name in ["ticker", "orderbook_snapshot_50", "orderbook_delta_3", "raw"]:
+        strict = results[f"decode.{name}.strict"].rate
+        fast = results[f"decode.{name}.fast"].rate
+        print(f"{name:<24} strict: {strict:>12,.0f} msg/s   fast: {fast:>12,.0f} msg/s   x{fast / strict:.1f}")
+
+    print(f"{'order(3)':<24} strict: {results['decode.order_3.strict'].rate:>12,.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
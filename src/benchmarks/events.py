@@ -0,0 +1,58 @@
+import sys
+import time
+from typing import List
+
+from benchmarks import BenchmarkResult, measure
+from core.event import Event
+
+# Запуск из каталога src: python -m benchmarks.events [seconds]
+
+SUBSCRIBER_COUNTS = (1, 4, 16, 64)
+# Обработчик, который не успевает за потоком сообщений
+SLOW_HANDLER_SECONDS = 0.001
+
+
+class BenchmarkEvent(Event[dict]):
+    pass
+
+
+def run(seconds: float) -> List[BenchmarkResult]:
+    results = []
+    frames = [{}] * 1000
+
+    for subscribers in SUBSCRIBER_COUNTS:
+        event = BenchmarkEvent()
+        for _ in range(subscribers):
+            event.subscribe(lambda message: None)
+
+        rate = measure(event._fire, frames, seconds)
+        results.append(BenchmarkResult(f"event.fire.{subscribers}", rate, {
+            "subscribers": subscribers,
+            "handler_calls_per_sec": round(rate * subscribers, 1)
+        }))
+
+    # Conflation: стоимость публикации для потока сокета при медленных подписчиках
+    for subscribers in SUBSCRIBER_COUNTS[:2]:
+        event = BenchmarkEvent(conflate=True)
+        for _ in range(subscribers):
+            event.subscribe(lambda message: time.sleep(SLOW_HANDLER_SECONDS))
+
+        rate = measure(event._fire, frames, seconds)
+        results.append(BenchmarkResult(f"event.fire.conflate.{subscribers}", rate, {
+            "subscribers": subscribers,
+            "handler_calls_per_sec": round(rate * subscribers, 1),
+            "dropped": event.dropped
+        }))
+        event.clear_subscribers()
+
+    return results
+
+
+def main(seconds: float):
+    for result in run(seconds):
+        print(f"{result.name:<24} {result.rate:>12,.0f} msg/s   "
+              f"{result.extra['handler_calls_per_sec']:>14,.0f} calls/s")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
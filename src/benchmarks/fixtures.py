@@ -0,0 +1,86 @@
+from typing import List
+
+# Кадры в формате публичных и приватных топиков Bybit v5, общие для всех бенчмарков
+
+SYMBOL = "USDCUSDT"
+
+TICKER_FRAME = {
+    "topic": "tickers.USDCUSDT",
+    "ts": 1710000000000,
+    "type": "snapshot",
+    "cs": 123456789,
+    "data": {
+        "symbol": "USDCUSDT",
+        "lastPrice": "0.9998",
+        "highPrice24h": "1.0002",
+        "lowPrice24h": "0.9991",
+        "prevPrice24h": "0.9997",
+        "volume24h": "123456789.12",
+        "turnover24h": "123450000.34",
+        "price24hPcnt": "0.0001",
+        "usdIndexPrice": "0.99987"
+    }
+}
+
+
+def make_ticker_frame(last_price: str) -> dict:
+    return {**TICKER_FRAME, "data": {**TICKER_FRAME["data"], "lastPrice": last_price}}
+
+
+def make_orderbook_frame(message_type: str, levels: int, update_id: int) -> dict:
+    return {
+        "topic": "orderbook.50.USDCUSDT",
+        "ts": 1710000000000,
+        "type": message_type,
+        "cts": 1710000000000,
+        "data": {
+            "s": "USDCUSDT",
+            "b": [[f"{0.9997 - i * 0.0001:.4f}", f"{1000 + i * 13}.25"] for i in range(levels)],
+            "a": [[f"{0.9998 + i * 0.0001:.4f}", f"{2000 + i * 17}.5"] for i in range(levels)],
+            "u": update_id,
+            "seq": update_id * 10
+        }
+    }
+
+
+ORDERBOOK_SNAPSHOT_FRAME = make_orderbook_frame("snapshot", 50, 1)
+# Снимок и следующие за ним дельты: цикл можно проигрывать повторно, снимок сбрасывает update_id
+ORDERBOOK_DELTA_FRAMES = [make_orderbook_frame("delta", 3, update_id) for update_id in range(2, 12)]
+
+
+def make_order(order_id: int, side: str, price: str, status: str) -> dict:
+    return {
+        "orderId": f"1700000000000000{order_id:04d}",
+        "symbol": SYMBOL,
+        "side": side,
+        "orderType": "Limit",
+        "cancelType": "UNKNOWN",
+        "price": price,
+        "qty": "100",
+        "orderIv": "",
+        "orderStatus": status,
+        "updatedTime": str(1710000000000 + order_id)
+    }
+
+
+# Типичный пуш после срабатывания: исполнение одного ордера и выставление двух новых
+ORDER_FRAME = {
+    "id": "5923240c6880ab-c59f-420b-9adb-3639adc9dd90",
+    "topic": "order",
+    "creationTime": 1710000000000,
+    "data": [
+        make_order(1, "Buy", "0.9997", "Filled"),
+        make_order(2, "Sell", "0.9999", "New"),
+        make_order(3, "Buy", "0.9996", "New")
+    ]
+}
+
+
+def ticker_frames(prices: List[str]) -> List[dict]:
+    return [make_ticker_frame(price) for price in prices]
+
+
+__all__ = [
+    "SYMBOL", "TICKER_FRAME", "ORDERBOOK_SNAPSHOT_FRAME", "ORDERBOOK_DELTA_FRAMES", "ORDER_FRAME",
+    "make_ticker_frame", "make_orderbook_frame", "make_order", "ticker_frames"
+]
@@ -0,0 +1,97 @@
+import logging
+import sys
+import tempfile
+from queue import SimpleQueue
+from logging.handlers import QueueListener
+from typing import List
+
+from api.bybit_client.websockets import TickerWebsocket
+from benchmarks import BenchmarkResult, measure
+from benchmarks.fixtures import TICKER_FRAME
+from core.log import BotLogger, LazyQueueHandler, LOG_FORMAT
+
+# Запуск из каталога src: python -m benchmarks.log [seconds]
+# Стоимость логирования на одно сообщение пути тикера (decode + обработчик)
+
+
+def create_logger(name: str, handler: logging.Handler, level: int) -> BotLogger:
+    bench_logger = BotLogger(name)
+    bench_logger.setLevel(level)
+    bench_logger.addHandler(handler)
+    return bench_logger
+
+
+def run(seconds: float) -> List[BenchmarkResult]:
+    # Настоящий файл: синхронный хэндлер платит за запись и flush в вызывающем потоке
+    log_file = tempfile.NamedTemporaryFile("w", suffix=".log")
+    file_handler = logging.StreamHandler(log_file)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    sync_logger = create_logger("bench.sync", file_handler, logging.DEBUG)
+
+    queue = SimpleQueue()
+    listener = QueueListener(queue, file_handler)
+    listener.start()
+    queue_logger = create_logger("bench.queue", LazyQueueHandler(queue), logging.DEBUG)
+
+    ticker = TickerWebsocket(False, fast_decode=True)
+    on_ticker = lambda message: None
+
+    def baseline(frame):
+        ticker.forward(frame, on_ticker)
+
+    def trace_disabled_lazy(frame):
+        queue_logger.trace("%s", frame)
+        ticker.forward(frame, on_ticker)
+
+    def trace_disabled_eager(frame):
+        queue_logger.trace(f"{frame}")
+        ticker.forward(frame, on_ticker)
+
+    def info_sync(frame):
+        sync_logger.info("(ticker) %s", frame["data"]["lastPrice"])
+        ticker.forward(frame, on_ticker)
+
+    def info_queue(frame):
+        queue_logger.info("(ticker) %s", frame["data"]["lastPrice"])
+        ticker.forward(frame, on_ticker)
+
+    frames = [TICKER_FRAME] * 1000
+    base = measure(baseline, frames, seconds)
+    results = [BenchmarkResult("log.baseline", base, {"ns_per_msg": round(1e9 / base, 1)})]
+
+    for name, step in [
+        ("trace_disabled_lazy", trace_disabled_lazy),
+        ("trace_disabled_eager", trace_disabled_eager),
+        ("info_sync_handler", info_sync),
+        ("info_queue_handler", info_queue)
+    ]:
+        rate = measure(step, frames, seconds)
+        results.append(BenchmarkResult(f"log.{name}", rate, {
+            "ns_per_msg": round(1e9 / rate, 1),
+            "overhead_ns": round(1e9 / rate - 1e9 / base, 1)
+        }))
+
+    listener.stop()
+    log_file.close()
+    return results
+
+
+def main(seconds: float):
+    titles = {
+        "log.baseline": "ticker path, no logging",
+        "log.trace_disabled_lazy": "trace disabled, lazy %-args",
+        "log.trace_disabled_eager": "trace disabled, eager f-string",
+        "log.info_sync_handler": "info, synchronous handler",
+        "log.info_queue_handler": "info, queue handler (caller side)"
+    }
+
+    for result in run(seconds):
+        line = f"{titles[result.name]:<36} {result.extra['ns_per_msg']:>10,.0f} ns/msg"
+        if "overhead_ns" in result.extra:
+            line += f"   overhead: {result.extra['overhead_ns']:>8,.0f} ns"
+        print(line)
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
@@ -0,0 +1,133 @@
+import sys
+from decimal import Decimal
+from typing import List, Optional
+
+from api.bybit_client.websockets import OrderbookWebsocket, TickerWebsocket
+from benchmarks import BenchmarkResult, measure
+from benchmarks.fixtures import SYMBOL, ORDERBOOK_SNAPSHOT_FRAME, ORDERBOOK_DELTA_FRAMES, make_orderbook_frame, \
+    ticker_frames
+from domain_models import PriceScale, TradeRange
+from services.orderbook import LocalOrderbook
+
+# Запуск из каталога src: python -m benchmarks.prices [seconds]
+# Цены в Decimal против целых тиков шкалы инструмента: разбор кадра и сравнения, которые делают триггеры.
+# Итог по сообщению показывают orderbook_message и orderbook_delta: разбор, применение к книге и сравнение вместе
+
+PRICE_SCALE = PriceScale(Decimal("0.0001"))
+TRADE_RANGE = TradeRange(Decimal("0.9998"), Decimal("0.9999"), PRICE_SCALE)
+PRICES = ["0.9997", "0.9998", "0.9999", "1.0000", "1.0001"]
+
+
+def ticker_case(scale: Optional[PriceScale], seconds: float) -> BenchmarkResult:
+    ticker = TickerWebsocket(False, fast_decode=True)
+    if scale:
+        ticker.set_price_scale(SYMBOL, scale)
+        top, bottom = TRADE_RANGE.sell_ticks, TRADE_RANGE.buy_ticks
+    else:
+        top, bottom = TRADE_RANGE.sell, TRADE_RANGE.buy
+
+    # Проверка зоны срабатывания TimeRangeTrigger
+    def step(frame):
+        price = ticker.decode(frame).last_price
+        return price >= top or price <= bottom
+
+    name = f"prices.ticker.{'ticks' if scale else 'decimal'}"
+    return BenchmarkResult(name, measure(step, ticker_frames(PRICES), seconds))
+
+
+def orderbook_socket(scale: Optional[PriceScale]) -> OrderbookWebsocket:
+    socket = OrderbookWebsocket(False, fast_decode=True)
+    if scale:
+        socket.set_price_scale(SYMBOL, scale)
+    return socket
+
+
+# Только разбор: тики берутся из кэша строк шкалы, объемы в обоих вариантах - Decimal
+def orderbook_decode_case(scale: Optional[PriceScale], seconds: float) -> BenchmarkResult:
+    socket = orderbook_socket(scale)
+    name = f"prices.orderbook_decode.{'ticks' if scale else 'decimal'}"
+    return BenchmarkResult(name, measure(socket.decode, [ORDERBOOK_SNAPSHOT_FRAME] + ORDERBOOK_DELTA_FRAMES, seconds))
+
+
+# Путь OrderbookBridge и OrderbookTrigger после разбора: применение к книге (сортировка, bisect)
+# и сравнение лучшей цены с коридором
+def orderbook_apply_case(scale: Optional[PriceScale], seconds: float) -> BenchmarkResult:
+    socket = orderbook_socket(scale)
+    sell = TRADE_RANGE.sell_ticks if scale else TRADE_RANGE.sell
+    book = LocalOrderbook(SYMBOL)
+    updates = [socket.decode(frame) for frame in [ORDERBOOK_SNAPSHOT_FRAME] + ORDERBOOK_DELTA_FRAMES]
+
+    def step(update):
+        if book.apply(update):
+            _, best_ask = book.best()
+            return best_ask is not None and best_ask[0] == sell
+
+    name = f"prices.orderbook_apply.{'ticks' if scale else 'decimal'}"
+    return BenchmarkResult(name, measure(step, updates, seconds))
+
+
+# Полный путь сообщения стакана: разбор, применение к книге, сравнение лучшей цены с коридором
+def orderbook_message_step(socket: OrderbookWebsocket, book: LocalOrderbook, sell):
+    def step(frame):
+        if book.apply(socket.decode(frame)):
+            _, best_ask = book.best()
+            return best_ask is not None and best_ask[0] == sell
+
+    return step
+
+
+def orderbook_message_case(scale: Optional[PriceScale], seconds: float) -> BenchmarkResult:
+    sell = TRADE_RANGE.sell_ticks if scale else TRADE_RANGE.sell
+    step = orderbook_message_step(orderbook_socket(scale), LocalOrderbook(SYMBOL), sell)
+
+    name = f"prices.orderbook_message.{'ticks' if scale else 'decimal'}"
+    return BenchmarkResult(name, measure(step, [ORDERBOOK_SNAPSHOT_FRAME] + ORDERBOOK_DELTA_FRAMES, seconds))
+
+
+# То же только на дельтах: снимок применяется один раз на круг из DELTA_COUNT дельт и в замер почти не входит
+DELTA_COUNT = 1000
+
+
+def orderbook_delta_case(scale: Optional[PriceScale], seconds: float) -> BenchmarkResult:
+    socket = orderbook_socket(scale)
+    book = LocalOrderbook(SYMBOL)
+    snapshot = socket.decode(ORDERBOOK_SNAPSHOT_FRAME)
+    message_step = orderbook_message_step(socket, book, TRADE_RANGE.sell_ticks if scale else TRADE_RANGE.sell)
+
+    def step(frame):
+        if frame is None:
+            book.apply(snapshot)
+            return
+        return message_step(frame)
+
+    deltas = [make_orderbook_frame("delta", 3, update_id) for update_id in range(2, DELTA_COUNT + 2)]
+    name = f"prices.orderbook_delta.{'ticks' if scale else 'decimal'}"
+    return BenchmarkResult(name, measure(step, [None] + deltas, seconds))
+
+
+def run(seconds: float) -> List[BenchmarkResult]:
+    return [
+        ticker_case(None, seconds),
+        ticker_case(PRICE_SCALE, seconds),
+        orderbook_decode_case(None, seconds),
+        orderbook_decode_case(PRICE_SCALE, seconds),
+        orderbook_apply_case(None, seconds),
+        orderbook_apply_case(PRICE_SCALE, seconds),
+        orderbook_message_case(None, seconds),
+        orderbook_message_case(PRICE_SCALE, seconds),
+        orderbook_delta_case(None, seconds),
+        orderbook_delta_case(PRICE_SCALE, seconds)
+    ]
+
+
+def main(seconds: float):
+    results = {result.name: result for result in run(seconds)}
+
+    for name in ["ticker", "orderbook_decode", "orderbook_apply", "orderbook_message", "orderbook_delta"]:
+        decimal = results[f"prices.{name}.decimal"].rate
+        ticks = results[f"prices.{name}.ticks"].rate
+        print(f"{name:<24} decimal: {decimal:>12,.0f} msg/s   ticks: {ticks:>12,.0f} msg/s   x{ticks / decimal:.2f}")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
@@ -0,0 +1,96 @@
+import sys
+from decimal import Decimal
+from typing import List
+
+from api.bybit_client.websockets import OrderbookWebsocket, TickerWebsocket
+from benchmarks import BenchmarkResult, measure, quiet_logger
+from benchmarks.fixtures import SYMBOL, ORDERBOOK_SNAPSHOT_FRAME, ORDERBOOK_DELTA_FRAMES, ticker_frames
+from core.clock import VirtualClock
+from domain_models import PriceScale, TradeRange
+from services.bot.socket_bridges import TickerEvent, OrderbookEvent
+from services.bot.triggers import TimeRangeTrigger, OrderbookTrigger
+from services.orderbook import LocalOrderbook
+
+# Запуск из каталога src: python -m benchmarks.triggers [seconds]
+# Обработчики вызываются так же, как из мостов сокета, но без соединения и хаба
+
+# Цены сообщений декодируются в тики шкалы инструмента, как в SymbolRuntime
+PRICE_SCALE = PriceScale(Decimal("0.0001"))
+TRADE_RANGE = TradeRange(Decimal("0.9998"), Decimal("0.9999"), PRICE_SCALE)
+# Шаг виртуального времени на один тик
+TICK_INTERVAL = 0.01
+
+
+class BenchmarkBridge:
+    symbol: str
+
+    def __init__(self, message_event):
+        self.symbol = SYMBOL
+        self.message_event = message_event
+
+
+def time_range_case(name: str, prices: List[str], trigger_duration: float, seconds: float) -> BenchmarkResult:
+    ticker = TickerWebsocket(False, fast_decode=True)
+    ticker.set_price_scale(SYMBOL, PRICE_SCALE)
+    clock = VirtualClock()
+    bridge = BenchmarkBridge(TickerEvent())
+    fired = []
+
+    trigger = TimeRangeTrigger(TRADE_RANGE, trigger_duration, trigger_duration, bridge, clock=clock)
+    trigger.on_triggered = fired.append
+    messages = [ticker.decode(frame) for frame in ticker_frames(prices)]
+
+    # Проверка окна выполняется таймером виртуальных часов внутри того же шага
+    def step(message):
+        clock.advance(TICK_INTERVAL)
+        bridge.message_event._fire(message)
+
+    rate = measure(step, messages, seconds)
+    return BenchmarkResult(name, rate, {"fired": len(fired)})
+
+
+def orderbook_case(seconds: float) -> BenchmarkResult:
+    orderbook_socket = OrderbookWebsocket(False, fast_decode=True)
+    orderbook_socket.set_price_scale(SYMBOL, PRICE_SCALE)
+    book = LocalOrderbook(SYMBOL)
+    bridge = BenchmarkBridge(OrderbookEvent())
+    # Порог ниже любого объема фикстуры: триггер проверяет книгу на каждом сообщении и не срабатывает
+    OrderbookTrigger(bridge, TradeRange(Decimal("0.9997"), Decimal("0.9998"), PRICE_SCALE), Decimal(1), Decimal(1))
+
+    updates = [orderbook_socket.decode(frame) for frame in [ORDERBOOK_SNAPSHOT_FRAME] + ORDERBOOK_DELTA_FRAMES]
+
+    # Путь OrderbookBridge: применение обновления к локальной книге и рассылка подписчикам
+    def step(update):
+        if book.apply(update):
+            bridge.message_event._fire(book)
+
+    return BenchmarkResult("trigger.orderbook", measure(step, updates, seconds))
+
+
+def run(seconds: float) -> List[BenchmarkResult]:
+    results = []
+
+    with quiet_logger():
+        # Цена внутри диапазона: только проверка зоны срабатывания
+        results.append(time_range_case("trigger.time_range.idle", ["0.9998", "0.9999"], 60, seconds))
+
+        # Цена в зоне срабатывания: накопление окна, проверка раз в 100 тиков
+        results.append(time_range_case(
+            "trigger.time_range.window", ["1.0000", "1.0001"], 100 * TICK_INTERVAL, seconds
+        ))
+
+        # Нулевая длительность: запуск таймера и проверка окна на каждом тике
+        results.append(time_range_case("trigger.time_range.validate", ["1.0000", "1.0001"], 0, seconds))
+
+        results.append(orderbook_case(seconds))
+
+    return results
+
+
+def main(seconds: float):
+    for result in run(seconds):
+        print(f"{result.name:<32} {result.rate:>12,.0f} msg/s   {result.extra or ''}")
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
@@ -0,0 +1,352 @@
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future
+from threading import Condition, Lock, Thread, get_ident, local
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from core.clock import Clock, TimerHandle
+from core.log import logger
+from core.metrics import MetricValue, registry
+from core.tracing import LogLinearHistogram, StageStats, tracer
+
+# Очередь событий actor: при заполнении потоки-источники ждут, пока цикл ее разберет
+DEFAULT_MAX_QUEUE = 10_000
+PERCENTILES = (0.5, 0.99, 0.999)
+
+ACTOR_EVENTS = registry.counter("actor_events_total", "События, обработанные циклом actor", ("actor", "event"))
+ACTOR_CONFLATED = registry.counter("actor_conflated_total", "События, замененные более новыми до обработки",
+                                   ("actor", "event"))
+ACTOR_QUEUE_FULL = registry.counter("actor_queue_full_total", "Ожидания источников из-за заполненной очереди actor",
+                                    ("actor",))
+ACTOR_QUEUE_DEPTH = registry.gauge("actor_queue_depth", "События в очереди actor", ("actor",))
+ACTOR_QUEUE_LATENCY = registry.gauge("actor_queue_latency_p99_seconds",
+                                     "99-й перцентиль ожидания события в очереди actor", ("actor", "event"))
+
+
+class Actor(ABC):
+    # Исполнитель логики бота: события сокетов и таймеров выполняются через post, состояние бота
+    # меняется только в потоке actor
+
+    # key: событие с тем же ключом, еще ждущее в очереди, получает новые аргументы вместо постановки нового;
+    # block=False: источник не ждет освобождения заполненной очереди
+    @abstractmethod
+    def post(self, event_type: str, callback: Callable[..., None], *args, key: Optional[Hashable] = None,
+             block: bool = True) -> None:
+        pass
+
+    # Выполняет callback в потоке actor и возвращает его результат
+    @abstractmethod
+    def run(self, callback: Callable[[], Any]) -> Any:
+        pass
+
+    # Часы, таймеры которых срабатывают в потоке actor
+    @abstractmethod
+    def wrap_clock(self, clock: Clock) -> Clock:
+        pass
+
+    # Необработанные события отбрасываются
+    @abstractmethod
+    def stop(self, timeout: float = 5) -> None:
+        pass
+
+    @property
+    @abstractmethod
+    def is_inline(self) -> bool:
+        pass
+
+
+class InlineActor(Actor):
+    # События выполняются сразу в потоке источника: воспроизведение записей и бенчмарки остаются детерминированными.
+    # Событие с key, поставленное из другого события, откладывается до конца внешнего события потока и, как
+    # в очереди EventLoopActor, получает последние аргументы: серия исполнений в одном кадре дает одну сверку
+    __state: local
+
+    def __init__(self):
+        self.__state = local()
+
+    def post(self, event_type: str, callback: Callable[..., None], *args, key: Optional[Hashable] = None,
+             block: bool = True) -> None:
+        state = self.__state
+        depth = getattr(state, "depth", None)
+        if depth is None:
+            depth = state.depth = 0
+            state.pending = {}
+
+        if key is not None and depth:
+            state.pending[key] = (callback, args)
+            return
+
+        state.depth = depth + 1
+        try:
+            callback(*args)
+        finally:
+            state.depth = depth
+
+        if not depth:
+            self.__flush(state)
+
+    @staticmethod
+    def __flush(state):
+        # Отложенные события могут отложить новые: они выполняются в этом же цикле
+        while state.pending:
+            key = next(iter(state.pending))
+            callback, args = state.pending.pop(key)
+            state.depth = 1
+            try:
+                callback(*args)
+            finally:
+                state.depth = 0
+
+    def run(self, callback: Callable[[], Any]) -> Any:
+        return callback()
+
+    def wrap_clock(self, clock: Clock) -> Clock:
+        return clock
+
+    def stop(self, timeout: float = 5) -> None:
+        pass
+
+    @property
+    def is_inline(self) -> bool:
+        return True
+
+
+class _Envelope:
+    __slots__ = ("event_type", "callback", "args", "key", "posted", "frame")
+
+    def __init__(self, event_type: str, callback: Callable[..., None], args: tuple, key: Optional[Hashable],
+                 frame: int):
+        self.event_type = event_type
+        self.callback = callback
+        self.args = args
+        self.key = key
+        self.posted = time.perf_counter_ns()
+        self.frame = frame
+
+
+class _ActorTimer(TimerHandle):
+    # Отмена в потоке actor действует, даже если срабатывание таймера уже стоит в очереди
+    __slots__ = ("callback", "timer", "is_cancelled")
+
+    def __init__(self, callback: Callable[[], None]):
+        self.callback = callback
+        self.timer = None
+        self.is_cancelled = False
+
+    def cancel(self) -> None:
+        self.is_cancelled = True
+        if self.timer:
+            self.timer.cancel()
+
+    def fire(self):
+        if not self.is_cancelled:
+            self.callback()
+
+
+class ActorClock(Clock):
+    __clock: Clock
+    __actor: Actor
+
+    def __init__(self, clock: Clock, actor: Actor):
+        self.__clock = clock
+        self.__actor = actor
+
+    def time(self) -> float:
+        return self.__clock.time()
+
+    # Поток планировщика общий для всех таймеров: срабатывание ставится в очередь без ожидания,
+    # иначе одна заполненная очередь остановила бы таймеры всех actor
+    def call_later(self, delay: float, callback: Callable[[], None]) -> TimerHandle:
+        handle = _ActorTimer(callback)
+        handle.timer = self.__clock.call_later(delay, lambda: self.__actor.post("timer", handle.fire, block=False))
+        return handle
+
+
+class EventLoopActor(Actor):
+    # Один поток обрабатывает события по порядку поступления: гонок между сокетами, таймерами и запуском нет,
+    # блокировки в логике бота не нужны, а потоки сокетов освобождаются сразу после постановки события
+    __name: str
+    __max_queue: int
+    __queue: Deque[_Envelope]
+    __pending: Dict[Hashable, _Envelope]
+    __lock: Lock
+    __not_empty: Condition
+    __not_full: Condition
+    __thread: Optional[Thread]
+    __thread_id: int
+    __is_stopped: bool
+    __stats: Dict[str, Tuple[LogLinearHistogram, MetricValue]]
+    __stats_lock: Lock
+
+    def __init__(self, name: str = "BotLoop", max_queue: int = DEFAULT_MAX_QUEUE):
+        self.__name = name
+        self.__max_queue = max_queue
+        self.__queue = deque()
+        self.__pending = {}
+        self.__lock = Lock()
+        self.__not_empty = Condition(self.__lock)
+        self.__not_full = Condition(self.__lock)
+        self.__thread = None
+        self.__thread_id = 0
+        self.__is_stopped = False
+        self.__stats = {}
+        self.__stats_lock = Lock()
+        self.__full_metric = ACTOR_QUEUE_FULL.labels(name)
+        ACTOR_QUEUE_DEPTH.labels(name).set_function(lambda: len(self.__queue))
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def is_inline(self) -> bool:
+        return False
+
+    @property
+    def is_current(self) -> bool:
+        return self.__thread_id == get_ident()
+
+    @property
+    def pending(self) -> int:
+        return len(self.__queue)
+
+    def post(self, event_type: str, callback: Callable[..., None], *args, key: Optional[Hashable] = None,
+             block: bool = True) -> None:
+        frame = tracer.current_frame()
+
+        with self.__lock:
+            if self.__is_stopped:
+                return
+
+            if key is not None:
+                envelope = self.__pending.get(key)
+                if envelope is not None:
+                    envelope.args = args
+                    envelope.frame = frame
+                    ACTOR_CONFLATED.labels(self.__name, event_type).inc()
+                    return
+
+            # Цикл не ждет сам себя: события из потока actor и неблокирующие события ставятся сверх лимита
+            if len(self.__queue) >= self.__max_queue and block and not self.is_current:
+                self.__full_metric.inc()
+                while len(self.__queue) >= self.__max_queue and not self.__is_stopped:
+                    self.__not_full.wait()
+                if self.__is_stopped:
+                    return
+
+            if self.__thread is None:
+                self.__thread = Thread(target=self.__run, name=self.__name, daemon=True)
+                self.__thread.start()
+
+            envelope = _Envelope(event_type, callback, args, key, frame)
+            self.__queue.append(envelope)
+            if key is not None:
+                self.__pending[key] = envelope
+            self.__not_empty.notify()
+
+    def run(self, callback: Callable[[], Any]) -> Any:
+        if self.is_current:
+            return callback()
+        if self.__is_stopped:
+            raise Exception(f"[actor] {self.__name} остановлен")
+
+        future = Future()
+
+        def execute():
+            try:
+                future.set_result(callback())
+            except BaseException as ex:
+                future.set_exception(ex)
+
+        self.post("call", execute)
+        return future.result()
+
+    def wrap_clock(self, clock: Clock) -> Clock:
+        return ActorClock(clock, self)
+
+    def stop(self, timeout: float = 5) -> None:
+        with self.__lock:
+            self.__is_stopped = True
+            self.__queue.clear()
+            self.__pending.clear()
+            self.__not_empty.notify_all()
+            self.__not_full.notify_all()
+
+        if self.__thread and not self.is_current:
+            self.__thread.join(timeout)
+
+    def __run(self):
+        self.__thread_id = get_ident()
+
+        while True:
+            with self.__lock:
+                while not self.__queue and not self.__is_stopped:
+                    self.__not_empty.wait()
+                if self.__is_stopped:
+                    return
+
+                envelope = self.__queue.popleft()
+                if envelope.key is not None:
+                    del self.__pending[envelope.key]
+                if len(self.__queue) == self.__max_queue - 1:
+                    self.__not_full.notify_all()
+
+            self.__dispatch(envelope)
+
+    def __dispatch(self, envelope: _Envelope):
+        stats = self.__stats.get(envelope.event_type)
+        if stats is None:
+            stats = self.__register(envelope.event_type)
+
+        histogram, events = stats
+        histogram.record(time.perf_counter_ns() - envelope.posted)
+        events.inc()
+
+        # tick_to_trade считается от кадра сокета, породившего событие
+        tracer.set_frame(envelope.frame)
+        try:
+            envelope.callback(*envelope.args)
+        except Exception as ex:
+            logger.critical(ex, exc_info=True)
+        finally:
+            tracer.set_frame(0)
+
+    def __register(self, event_type: str) -> Tuple[LogLinearHistogram, MetricValue]:
+        histogram = LogLinearHistogram()
+        with self.__stats_lock:
+            stats = self.__stats.setdefault(event_type, (histogram, ACTOR_EVENTS.labels(self.__name, event_type)))
+
+        ACTOR_QUEUE_LATENCY.labels(self.__name, event_type).set_function(lambda: histogram.percentile(0.99) / 1e9)
+        return stats
+
+    # Время ожидания событий в очереди по типам, нс
+    def snapshot(self) -> List[StageStats]:
+        with self.__stats_lock:
+            items = sorted(self.__stats.items())
+
+        return [StageStats(
+            stage=event_type,
+            count=histogram.count,
+            mean=histogram.mean,
+            min=histogram.min,
+            max=histogram.max,
+            percentiles={quantile: histogram.percentile(quantile) for quantile in PERCENTILES}
+        ) for event_type, (histogram, _) in items if histogram.count]
+
+    def format(self) -> str:
+        lines = [f"{'event':<24}{'count':>10}{'p50 us':>12}{'p99 us':>12}{'p99.9 us':>12}{'max us':>12}"]
+        for stats in self.snapshot():
+            p50, p99, p999 = (stats.percentiles[quantile] / 1000 for quantile in PERCENTILES)
+            lines.append(f"{stats.stage:<24}{stats.count:>10}{p50:>12.1f}{p99:>12.1f}{p999:>12.1f}"
+                         f"{stats.max / 1000:>12.1f}")
+        return "\n".join(lines)
+
+    def dump(self):
+        logger.info("(actor %s) ожидание в очереди\n%s", self.__name, self.format())
+
+
+# Исполнитель по умолчанию: без отдельного потока
+inline_actor = InlineActor()
+
+__all__ = ["Actor", "InlineActor", "EventLoopActor", "ActorClock", "inline_actor", "DEFAULT_MAX_QUEUE"]
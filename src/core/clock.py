@@ -0,0 +1,73 @@
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Callable, Optional
+
+from core.scheduler import TimerHandle, TimerQueue, TimerScheduler
+
+
+class Clock(ABC):
+    @abstractmethod
+    def time(self) -> float:
+        pass
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.time())
+
+    @abstractmethod
+    def call_later(self, delay: float, callback: Callable[[], None]) -> TimerHandle:
+        pass
+
+
+class SystemClock(Clock):
+    __scheduler: TimerScheduler
+
+    # Все таймеры обслуживает один поток планировщика вместо threading.Timer на каждый вызов
+    def __init__(self, scheduler: Optional[TimerScheduler] = None):
+        # Поток планировщика стартует при первом таймере
+        self.__scheduler = scheduler or TimerScheduler()
+
+    @property
+    def scheduler(self) -> TimerScheduler:
+        return self.__scheduler
+
+    def time(self) -> float:
+        return time.time()
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> TimerHandle:
+        return self.scheduler.call_later(delay, callback)
+
+
+class VirtualClock(Clock):
+    __time: float
+    __timers: TimerQueue
+
+    # Время двигается только через advance_to: таймеры вызываются синхронно в потоке вызывающего
+    def __init__(self, start_time: float = 0.0):
+        self.__time = start_time
+        self.__timers = TimerQueue()
+
+    def time(self) -> float:
+        return self.__time
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> TimerHandle:
+        return self.__timers.push(self.__time + delay, callback)
+
+    def advance_to(self, timestamp: float):
+        while True:
+            timer = self.__timers.pop_due(timestamp)
+            if timer is None:
+                break
+
+            self.__time = max(self.__time, timer.deadline)
+            timer.callback()
+
+        self.__time = max(self.__time, timestamp)
+
+    def advance(self, seconds: float):
+        self.advance_to(self.__time + seconds)
+
+
+system_clock = SystemClock()
+
+__all__ = ["Clock", "TimerHandle", "SystemClock", "VirtualClock", "system_clock"]
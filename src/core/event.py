@@ -1,23 +1,125 @@
 from abc import ABC
-from typing import Callable, List, Generic, TypeVar
+from threading import Condition, Lock, Thread
+from typing import Callable, Generic, Optional, Tuple, TypeVar
+
+from core.log import logger
+from core.metrics import registry
+from core.tracing import tracer
 
 T = TypeVar('T')
 
+EVENT_CONFLATED = registry.counter("event_conflated_total",
+                                   "Сообщения, вытесненные более новыми до обработки медленным подписчиком",
+                                   ("event",))
+
+
+class _ConflatingHandler:
+    # Подписчик в собственном потоке: пока он занят, новое значение заменяет ожидающее в слоте,
+    # поток сокета не блокируется, а подписчик всегда получает самое свежее значение
+    __slots__ = ("handler", "dropped", "__stage", "__metric", "__condition", "__value", "__pending", "__stopped")
+
+    handler: Callable
+    dropped: int
+
+    def __init__(self, handler: Callable, name: str, stage: str):
+        self.handler = handler
+        self.dropped = 0
+        self.__stage = stage
+        self.__metric = EVENT_CONFLATED.labels(name)
+        self.__condition = Condition(Lock())
+        self.__value = None
+        self.__pending = False
+        self.__stopped = False
+        Thread(target=self.__run, name=f"{name}Handler", daemon=True).start()
+
+    def push(self, value):
+        with self.__condition:
+            if self.__pending:
+                self.dropped += 1
+                self.__metric.inc()
+            else:
+                self.__condition.notify()
+            self.__value = value
+            self.__pending = True
+
+    # Не ждет завершения текущего вызова: остановка возможна и из самого обработчика
+    def stop(self):
+        with self.__condition:
+            self.__stopped = True
+            self.__value = None
+            self.__condition.notify()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while not self.__pending and not self.__stopped:
+                    self.__condition.wait()
+                if self.__stopped:
+                    return
+
+                value = self.__value
+                self.__value = None
+                self.__pending = False
+
+            try:
+                with tracer.span(self.__stage):
+                    self.handler(value)
+            except Exception as ex:
+                logger.error(f"(event) {self.__stage}: {ex}", exc_info=True)
+
 
 class Event(ABC, Generic[T]):
-    def __init__(self) -> None:
-        self.__handlers: List[Callable[[T], None]] = []
+    # conflate: каждый подписчик обрабатывает сообщения в своем потоке и пропускает промежуточные,
+    # если не успевает. Подходит для состояний (стакан, тикер), где важно только последнее значение
+    def __init__(self, conflate: bool = False) -> None:
+        # Копирование при записи: _fire перебирает кортеж, подписка во время рассылки его не меняет
+        self.__handlers: Tuple[Callable[[T], None], ...] = ()
+        self.__subscriptions: Tuple[Tuple[Callable[[T], None], Optional[_ConflatingHandler]], ...] = ()
+        self.__lock = Lock()
+        self.__conflate = conflate
+        self.__trace_stage = f"event.{type(self).__name__}"
+
+    @property
+    def is_conflating(self) -> bool:
+        return self.__conflate
+
+    # Сообщения, пропущенные медленными подписчиками
+    @property
+    def dropped(self) -> int:
+        return sum(worker.dropped for _, worker in self.__subscriptions if worker)
 
     def subscribe(self, handler: Callable[[T], None]) -> None:
-        self.__handlers.append(handler)
+        worker = None
+        if self.__conflate:
+            worker = _ConflatingHandler(handler, type(self).__name__, f"{self.__trace_stage}.handler")
+
+        with self.__lock:
+            self.__set_subscriptions(self.__subscriptions + ((handler, worker),))
 
     def unsubscribe(self, handler: Callable[[T], None]) -> None:
-        if handler in self.__handlers:
-            self.__handlers.remove(handler)
+        with self.__lock:
+            subscriptions = self.__subscriptions
+            for index, (subscribed, worker) in enumerate(subscriptions):
+                if subscribed == handler:
+                    self.__set_subscriptions(subscriptions[:index] + subscriptions[index + 1:])
+                    if worker:
+                        worker.stop()
+                    return
 
     def clear_subscribers(self) -> None:
-        self.__handlers.clear()
+        with self.__lock:
+            subscriptions = self.__subscriptions
+            self.__set_subscriptions(())
+
+        for _, worker in subscriptions:
+            if worker:
+                worker.stop()
+
+    def __set_subscriptions(self, subscriptions):
+        self.__subscriptions = subscriptions
+        self.__handlers = tuple(worker.push if worker else handler for handler, worker in subscriptions)
 
     def _fire(self, arg: T) -> None:
-        for handler in self.__handlers:
-            handler(arg)
\ No newline at end of file
+        with tracer.span(self.__trace_stage):
+            for handler in self.__handlers:
+                handler(arg)
@@ -1,12 +1,17 @@
-import inspect
+import atexit
 import logging
 import os
-from logging.handlers import TimedRotatingFileHandler
+import sys
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
+from queue import SimpleQueue
+from types import CodeType
+from typing import Dict
 
 TRACE_LEVEL_NUM = 5
 LOG_LEVEL = logging.INFO
 CONSOLE_LEVEL = logging.DEBUG
 LOG_DIR = 'logs'
+LOG_FORMAT = "%(asctime)s - %(levelname)s - [%(caller)s]%(message)s"
 
 
 class CustomFormatter(logging.Formatter):
@@ -15,7 +20,7 @@ class CustomFormatter(logging.Formatter):
     grey = "\x1b[38m"
     green = "\x1b[32m"
     reset = "\x1b[0m"
-    format = "%(asctime)s - %(levelname)s - %(message)s"
+    format = LOG_FORMAT
 
     FORMATS = {
         TRACE_LEVEL_NUM: dark_white + format + reset,
@@ -26,48 +31,85 @@ class CustomFormatter(logging.Formatter):
         logging.CRITICAL: "\x1b[41m" + format + reset
     }
 
+    def __init__(self):
+        super().__init__()
+        # Форматтеры создаются один раз, а не на каждую запись
+        self.__formatters = {level: logging.Formatter(fmt) for level, fmt in self.FORMATS.items()}
+
     def format(self, record):
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt)
-        return formatter.format(record)
+        formatter = self.__formatters.get(record.levelno)
+        return formatter.format(record) if formatter else super().format(record)
+
+
+class LazyQueueHandler(QueueHandler):
+    # Сообщение форматируется в потоке записи, вызывающий поток только кладет запись в очередь
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
 
 
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
 
+# Имя класса вызывающего кода вычисляется один раз на объект кода
+_caller_classes: Dict[CodeType, str] = {}
 
-def trace(self, message, *args, **kwargs):
-    if self.isEnabledFor(TRACE_LEVEL_NUM):
-        self._log(TRACE_LEVEL_NUM, message, args, **kwargs)
 
+def _class_name(code: CodeType) -> str:
+    class_name = ''
+    parts = getattr(code, "co_qualname", code.co_name).split(".")
 
-original_log = logging.Logger._log
+    # Класс - сегмент qualname, за которым следует имя метода, а не <locals>
+    for index in range(len(parts) - 1):
+        if parts[index] != "<locals>" and parts[index + 1] != "<locals>":
+            class_name = parts[index]
 
+    _caller_classes[code] = class_name
+    return class_name
 
-def custom_log(self, level, msg, args, exc_info=None, extra=None, stack_info=False):
-    # Используем модуль inspect для получения фрейма, откуда был сделан вызов
-    caller_frame = inspect.currentframe().f_back.f_back
-    caller_name = caller_frame.f_globals['__name__']
-    # Выполняем поиск класса в фрейме вызова
-    class_name = ''
-    self_class = caller_frame.f_locals.get('self', None)
-    if self_class:
-        class_name = self_class.__class__.__name__
 
-    # Добавляем имя класса к сообщению лога
-    modified_msg = f"[{class_name}]{msg}"
+class BotLogger(logging.Logger):
+    def trace(self, message, *args, **kwargs):
+        if self.isEnabledFor(TRACE_LEVEL_NUM):
+            self._log(TRACE_LEVEL_NUM, message, args, **kwargs)
+
+    def _log(self, level, msg, args, exc_info=None, extra=None, stack_info=False, stacklevel=1):
+        # Пропускаем фреймы модуля logging и этого файла, чтобы найти вызывающий код
+        frame = sys._getframe(1)
+        while frame.f_code.co_filename in _logging_files:
+            frame = frame.f_back
+
+        code = frame.f_code
+        class_name = _caller_classes.get(code)
+        if class_name is None:
+            class_name = _class_name(code)
+
+        if stack_info or stacklevel != 1:
+            extra = {**extra, "caller": class_name} if extra else {"caller": class_name}
+            return super()._log(level, msg, args, exc_info, extra, stack_info, stacklevel)
+
+        if exc_info:
+            if isinstance(exc_info, BaseException):
+                exc_info = (type(exc_info), exc_info, exc_info.__traceback__)
+            elif not isinstance(exc_info, tuple):
+                exc_info = sys.exc_info()
+
+        # Вызывающий фрейм уже найден: стандартный findCaller со сравнением путей не нужен
+        record = self.makeRecord(self.name, level, code.co_filename, frame.f_lineno, msg, args, exc_info,
+                                 code.co_name, extra)
+        record.caller = class_name
+        self.handle(record)
 
-    # Вызываем оригинальный метод _log с модифицированным сообщением
-    original_log(self, level, modified_msg, args, exc_info, extra, stack_info)
 
+_logging_files = {logging.Logger._log.__code__.co_filename, BotLogger._log.__code__.co_filename}
 
-# Заменяем оригинальный метод _log нашей кастомной реализацией
-logging.Logger._log = custom_log
-# Добавляем уровень и функцию к логгеру
+# Добавляем уровень
 logging.addLevelName(TRACE_LEVEL_NUM, 'TRACE')
-logging.Logger.trace = trace
+# Имя процесса в формате не используется, а его получение дорого на каждой записи
+logging.logMultiprocessing = False
 
-logger = logging.getLogger(__name__)
+logging.setLoggerClass(BotLogger)
+logger: BotLogger = logging.getLogger(__name__)
+logging.setLoggerClass(logging.Logger)
 logger.setLevel(CONSOLE_LEVEL)
 
 # Создаем хэндлер, который будет писать логи в файл и разделять их по дням
@@ -80,7 +122,7 @@ handler = TimedRotatingFileHandler(
 )
 
 handler.setLevel(LOG_LEVEL)
-handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+handler.setFormatter(logging.Formatter(LOG_FORMAT))
 handler.suffix = "-%Y-%m-%d.log"
 
 # Создаем Handler для вывода логов в консоль
@@ -88,9 +130,12 @@ consoleHandler = logging.StreamHandler()
 consoleHandler.setFormatter(CustomFormatter())
 consoleHandler.setLevel(CONSOLE_LEVEL)
 
-logger.addHandler(handler)
-logger.addHandler(consoleHandler)
+# Запись в файл и консоль выполняет фоновый поток, вызывающий код не блокируется на IO
+log_queue = SimpleQueue()
+listener = QueueListener(log_queue, handler, consoleHandler, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)
 
-logger.trace("TRACE asdasdasd")
+logger.addHandler(LazyQueueHandler(log_queue))
 
-__all__ = ["logger"]
+__all__ = ["logger", "BotLogger", "LazyQueueHandler", "CustomFormatter", "TRACE_LEVEL_NUM"]
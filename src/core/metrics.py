@@ -0,0 +1,196 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.log import logger
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class MetricValue:
+    # Значение одного набора меток. Инкремент без блокировки: под GIL потеря единичного
+    # инкремента при гонке возможна, но для мониторинга допустима
+    __slots__ = ("value", "function")
+
+    value: float
+    function: Optional[Callable[[], float]]
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+    # Значение вычисляется при выгрузке в потоке экспортера, торговые потоки не затрагиваются
+    def set_function(self, function: Callable[[], float]):
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            return float(self.function())
+        return self.value
+
+
+class Metric:
+    metric_type = "untyped"
+
+    __name: str
+    __help: str
+    __label_names: Tuple[str, ...]
+    __values: Dict[Tuple[str, ...], MetricValue]
+    __lock: Lock
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.__name = name
+        self.__help = help_text
+        self.__label_names = tuple(label_names)
+        self.__values = {}
+        self.__lock = Lock()
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    # Ссылку на значение стоит получить один раз и хранить: повторный поиск по меткам не нужен
+    def labels(self, *values) -> MetricValue:
+        key = tuple(str(value) for value in values)
+        metric_value = self.__values.get(key)
+        if metric_value is None:
+            if len(key) != len(self.__label_names):
+                raise ValueError(f"[metrics] {self.__name}: ожидаются метки {self.__label_names}")
+
+            with self.__lock:
+                metric_value = self.__values.setdefault(key, MetricValue())
+
+        return metric_value
+
+    def remove(self, *values):
+        with self.__lock:
+            self.__values.pop(tuple(str(value) for value in values), None)
+
+    def render(self) -> List[str]:
+        with self.__lock:
+            items = list(self.__values.items())
+
+        lines = [f"# HELP {self.__name} {self.__help}", f"# TYPE {self.__name} {self.metric_type}"]
+        for key, metric_value in items:
+            try:
+                value = metric_value.get()
+            except Exception as ex:
+                logger.debug("(metrics) %s%s: %s", self.__name, key, ex)
+                continue
+
+            if self.__label_names:
+                labels = ",".join(f'{name}="{_escape(label)}"' for name, label in zip(self.__label_names, key))
+                lines.append(f"{self.__name}{{{labels}}} {_format_value(value)}")
+            else:
+                lines.append(f"{self.__name} {_format_value(value)}")
+
+        return lines
+
+
+class Counter(Metric):
+    metric_type = "counter"
+
+
+class Gauge(Metric):
+    metric_type = "gauge"
+
+
+class MetricsRegistry:
+    __metrics: Dict[str, Metric]
+    __lock: Lock
+
+    def __init__(self):
+        self.__metrics = {}
+        self.__lock = Lock()
+
+    def counter(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        return self.__register(Counter, name, help_text, label_names)
+
+    def gauge(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()) -> Gauge:
+        return self.__register(Gauge, name, help_text, label_names)
+
+    def render(self) -> str:
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def __register(self, metric_class, name: str, help_text: str, label_names: Tuple[str, ...]):
+        with self.__lock:
+            metric = self.__metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, help_text, label_names)
+                self.__metrics[name] = metric
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"[metrics] {name} уже зарегистрирована как {metric.metric_type}")
+
+            return metric
+
+
+# Общий реестр процесса; метрики объявляются в модулях, которые их обновляют
+registry = MetricsRegistry()
+
+
+class MetricsServer:
+    # HTTP-экспортер в формате Prometheus в собственном потоке: выгрузка не блокирует торговые потоки
+    __registry: MetricsRegistry
+    __server: ThreadingHTTPServer
+    __thread: Thread
+
+    def __init__(self, port: int, host: str = "127.0.0.1", metrics_registry: MetricsRegistry = registry):
+        self.__registry = metrics_registry
+        server_registry = metrics_registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+
+                body = server_registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer((host, port), Handler)
+        self.__server.daemon_threads = True
+        self.__thread = Thread(target=self.__server.serve_forever, name="MetricsServer", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.__server.server_address[1]
+
+    def start(self):
+        self.__thread.start()
+        logger.info("(metrics) http://%s:%s/metrics", *self.__server.server_address[:2])
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+
+__all__ = ["registry", "MetricsRegistry", "MetricsServer", "Metric", "MetricValue", "Counter", "Gauge"]
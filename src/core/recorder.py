@@ -0,0 +1,182 @@
+import mmap
+import os
+import struct
+import time
+from datetime import datetime, timezone
+from queue import Queue, Full, Empty
+from threading import Thread
+from typing import Iterator, List, Optional, Tuple, Union
+
+from core.log import logger
+
+# Заголовок файла и запись: [длина payload: u32][время получения, нс: u64][payload]
+FILE_MAGIC = b"BBFRAME1"
+RECORD_HEADER = struct.Struct("<IQ")
+FILE_SUFFIX = ".bin"
+
+DEFAULT_MAX_FILE_SIZE = 256 * 1024 * 1024
+DEFAULT_QUEUE_SIZE = 100_000
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class FrameRecorder:
+    __directory: str
+    __prefix: str
+    __max_file_size: int
+    __queue: Queue
+    __thread: Thread
+    __dropped: int
+
+    def __init__(
+            self,
+            directory: str,
+            prefix: str = "frames",
+            max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+            queue_size: int = DEFAULT_QUEUE_SIZE
+    ):
+        self.__directory = directory
+        self.__prefix = prefix
+        self.__max_file_size = max_file_size
+        self.__queue = Queue(maxsize=queue_size)
+        self.__dropped = 0
+
+        self.__file = None
+        self.__file_size = 0
+        self.__file_day = None
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.__thread = Thread(target=self.__write_loop, name="FrameRecorder", daemon=True)
+        self.__thread.start()
+
+    @property
+    def dropped(self) -> int:
+        return self.__dropped
+
+    # Вызывается из потока сокета: только кладет кадр в очередь, запись - в фоновом потоке
+    def write(self, frame: Union[str, bytes], timestamp_ns: Optional[int] = None):
+        try:
+            self.__queue.put_nowait((timestamp_ns or time.time_ns(), frame))
+        except Full:
+            self.__dropped += 1
+
+    def close(self):
+        self.__queue.put(None)
+        self.__thread.join()
+
+    def __write_loop(self):
+        while True:
+            try:
+                item = self.__queue.get(timeout=1)
+            except Empty:
+                self.__flush()
+                continue
+
+            if item is None:
+                break
+
+            try:
+                self.__write(*item)
+            except Exception as ex:
+                logger.error(f"(recorder) Ошибка записи кадра. {ex}")
+
+            if self.__queue.empty():
+                self.__flush()
+
+        self.__close_file()
+
+    def __write(self, timestamp_ns: int, frame: Union[str, bytes]):
+        payload = frame.encode("utf-8") if isinstance(frame, str) else frame
+        day = datetime.fromtimestamp(timestamp_ns / 1e9, tz=timezone.utc).strftime("%Y%m%d")
+
+        is_size_exceeded = self.__file_size + RECORD_HEADER.size + len(payload) > self.__max_file_size
+        if self.__file is None or day != self.__file_day or is_size_exceeded:
+            self.__rotate(day)
+
+        self.__file.write(RECORD_HEADER.pack(len(payload), timestamp_ns))
+        self.__file.write(payload)
+        self.__file_size += RECORD_HEADER.size + len(payload)
+
+    def __rotate(self, day: str):
+        self.__close_file()
+
+        index = 0
+        while True:
+            path = os.path.join(self.__directory, f"{self.__prefix}-{day}-{index:04d}{FILE_SUFFIX}")
+            if not os.path.exists(path):
+                break
+            index += 1
+
+        self.__file = open(path, "wb", buffering=WRITE_BUFFER_SIZE)
+        self.__file.write(FILE_MAGIC)
+        self.__file_size = len(FILE_MAGIC)
+        self.__file_day = day
+        logger.info(f"(recorder) Новый файл записи {path}")
+
+    def __flush(self):
+        if self.__file:
+            self.__file.flush()
+
+    def __close_file(self):
+        if self.__file:
+            self.__file.close()
+            self.__file = None
+
+
+class FrameReader:
+    # Чтение через mmap: payload отдается как memoryview без копирования
+    __path: str
+
+    def __init__(self, path: str):
+        self.__path = path
+        self.__file = open(path, "rb")
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if os.path.getsize(path) > 0 else None
+
+        if self.__map is None or self.__map[:len(FILE_MAGIC)] != FILE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} не является файлом записи кадров")
+
+    def __iter__(self) -> Iterator[Tuple[int, memoryview]]:
+        view = memoryview(self.__map)
+        offset = len(FILE_MAGIC)
+        size = len(view)
+
+        try:
+            while offset + RECORD_HEADER.size <= size:
+                length, timestamp_ns = RECORD_HEADER.unpack_from(view, offset)
+                offset += RECORD_HEADER.size
+
+                # Незавершенная запись в конце файла, который еще пишется
+                if offset + length > size:
+                    break
+
+                yield timestamp_ns, view[offset:offset + length]
+                offset += length
+        finally:
+            view.release()
+
+    def close(self):
+        if self.__map is not None:
+            try:
+                self.__map.close()
+            except BufferError:
+                # Снаружи остались ссылки на payload: mmap будет закрыт сборщиком мусора
+                pass
+            self.__map = None
+        self.__file.close()
+
+    def __enter__(self) -> 'FrameReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def list_recordings(directory: str, prefix: str = "frames") -> List[str]:
+    names = sorted(name for name in os.listdir(directory)
+                   if name.startswith(f"{prefix}-") and name.endswith(FILE_SUFFIX))
+    return [os.path.join(directory, name) for name in names]
+
+
+__all__ = ["FrameRecorder", "FrameReader", "list_recordings"]
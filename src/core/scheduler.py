@@ -0,0 +1,164 @@
+import heapq
+import itertools
+import time
+from abc import ABC, abstractmethod
+from threading import Condition, Thread
+from typing import Callable, List, Optional, Tuple
+
+from core.log import logger
+
+# Отмененные таймеры удаляются из кучи лениво; сжатие - когда их больше половины
+COMPACT_MIN_CANCELLED = 64
+
+
+class TimerHandle(ABC):
+    @abstractmethod
+    def cancel(self) -> None:
+        pass
+
+
+class ScheduledTimer(TimerHandle):
+    __slots__ = ("deadline", "callback", "is_cancelled", "is_fired", "__canceller")
+
+    def __init__(self, deadline: float, callback: Callable[[], None], canceller: Callable[['ScheduledTimer'], None]):
+        self.deadline = deadline
+        self.callback = callback
+        self.is_cancelled = False
+        self.is_fired = False
+        self.__canceller = canceller
+
+    def cancel(self) -> None:
+        if self.is_cancelled:
+            return
+
+        self.is_cancelled = True
+        self.__canceller(self)
+
+
+class TimerQueue:
+    # Куча дедлайнов без потоков и блокировок: общая основа для TimerScheduler и VirtualClock
+    __heap: List[Tuple[float, int, ScheduledTimer]]
+    __cancelled: int
+
+    def __init__(self):
+        self.__heap = []
+        self.__cancelled = 0
+        self.__counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.__heap) - self.__cancelled
+
+    def push(
+            self,
+            deadline: float,
+            callback: Callable[[], None],
+            canceller: Optional[Callable[[ScheduledTimer], None]] = None
+    ) -> ScheduledTimer:
+        timer = ScheduledTimer(deadline, callback, canceller or self.cancel)
+        heapq.heappush(self.__heap, (deadline, next(self.__counter), timer))
+        return timer
+
+    def cancel(self, timer: ScheduledTimer):
+        # Уже извлеченный из кучи таймер в счетчике отмененных не участвует
+        if timer.is_fired:
+            return
+
+        self.__cancelled += 1
+
+        if self.__cancelled >= COMPACT_MIN_CANCELLED and self.__cancelled * 2 > len(self.__heap):
+            self.__heap = [item for item in self.__heap if not item[2].is_cancelled]
+            heapq.heapify(self.__heap)
+            self.__cancelled = 0
+
+    def next_deadline(self) -> Optional[float]:
+        self.__drop_cancelled()
+        return self.__heap[0][0] if self.__heap else None
+
+    def pop_due(self, now: float) -> Optional[ScheduledTimer]:
+        self.__drop_cancelled()
+        if self.__heap and self.__heap[0][0] <= now:
+            timer = heapq.heappop(self.__heap)[2]
+            timer.is_fired = True
+            return timer
+        return None
+
+    def __drop_cancelled(self):
+        while self.__heap and self.__heap[0][2].is_cancelled:
+            heapq.heappop(self.__heap)
+            self.__cancelled -= 1
+
+
+class TimerScheduler:
+    # Один поток на все таймеры процесса; колбэки выполняются последовательно в этом потоке
+    __queue: TimerQueue
+    __condition: Condition
+    __thread: Optional[Thread]
+    __time_source: Callable[[], float]
+
+    def __init__(self, time_source: Callable[[], float] = time.monotonic, name: str = "TimerScheduler"):
+        self.__queue = TimerQueue()
+        self.__condition = Condition()
+        self.__thread = None
+        self.__time_source = time_source
+        self.__name = name
+        self.__is_stopped = False
+
+    @property
+    def pending(self) -> int:
+        with self.__condition:
+            return len(self.__queue)
+
+    def time(self) -> float:
+        return self.__time_source()
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> TimerHandle:
+        return self.call_at(self.__time_source() + delay, callback)
+
+    def call_at(self, deadline: float, callback: Callable[[], None]) -> TimerHandle:
+        with self.__condition:
+            if self.__thread is None:
+                self.__thread = Thread(target=self.__run, name=self.__name, daemon=True)
+                self.__thread.start()
+
+            timer = self.__queue.push(deadline, callback, self.__cancel)
+            self.__condition.notify()
+            return timer
+
+    def stop(self):
+        with self.__condition:
+            self.__is_stopped = True
+            self.__condition.notify()
+
+        if self.__thread:
+            self.__thread.join()
+
+    def __cancel(self, timer: ScheduledTimer):
+        with self.__condition:
+            self.__queue.cancel(timer)
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                timer = None
+                while not self.__is_stopped:
+                    timer = self.__queue.pop_due(self.__time_source())
+                    if timer:
+                        break
+
+                    deadline = self.__queue.next_deadline()
+                    timeout = None if deadline is None else max(deadline - self.__time_source(), 0)
+                    self.__condition.wait(timeout)
+
+                if self.__is_stopped:
+                    return
+
+            if timer.is_cancelled:
+                continue
+
+            try:
+                timer.callback()
+            except Exception as ex:
+                logger.critical(ex, exc_info=True)
+
+
+__all__ = ["TimerHandle", "ScheduledTimer", "TimerQueue", "TimerScheduler"]
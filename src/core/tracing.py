@@ -0,0 +1,251 @@
+import time
+from dataclasses import dataclass
+from functools import wraps
+from threading import Lock, local
+from typing import Dict, List
+
+from core.log import logger
+
+# 16 линейных корзин на каждую степень двойки: относительная ошибка перцентиля не больше 6.25%
+SUB_BUCKET_BITS = 4
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+# Значения больше 2^40 нс (~18 минут) попадают в последнюю корзину
+MAX_VALUE_BITS = 40
+BUCKET_COUNT = (MAX_VALUE_BITS - SUB_BUCKET_BITS + 1) * SUB_BUCKET_COUNT
+MAX_VALUE = (1 << MAX_VALUE_BITS) - 1
+
+# Время от получения кадра сокета до ответа REST-запроса, вызванного этим кадром
+TICK_TO_TRADE = "tick_to_trade"
+FRAME_STAGE = "ws.frame"
+
+DEFAULT_PERCENTILES = (0.5, 0.99, 0.999)
+
+
+def _bucket_index(value: int) -> int:
+    if value < SUB_BUCKET_COUNT:
+        return value
+
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return ((shift + 1) << SUB_BUCKET_BITS) + (value >> shift) - SUB_BUCKET_COUNT
+
+
+def _bucket_value(index: int) -> int:
+    octave = index >> SUB_BUCKET_BITS
+    if octave == 0:
+        return index
+
+    shift = octave - 1
+    lower = ((index & (SUB_BUCKET_COUNT - 1)) + SUB_BUCKET_COUNT) << shift
+    # Середина корзины
+    return lower + ((1 << shift) >> 1)
+
+
+class LogLinearHistogram:
+    # Фиксированный размер памяти независимо от числа замеров.
+    # Запись без блокировки: при гонке потоков редкий потерянный инкремент допустим для статистики
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def record(self, value: int):
+        if value < 0:
+            value = 0
+        elif value > MAX_VALUE:
+            value = MAX_VALUE
+
+        self.counts[_bucket_index(value)] += 1
+        if not self.count or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    def percentile(self, quantile: float) -> int:
+        if not self.count:
+            return 0
+
+        target = max(1, int(quantile * self.count + 0.5))
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return min(max(_bucket_value(index), self.min), self.max)
+
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def reset(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+
+@dataclass
+class StageStats:
+    stage: str
+    count: int
+    mean: float
+    min: int
+    max: int
+    percentiles: Dict[float, int]
+
+
+class _Span:
+    __slots__ = ("__histogram", "__started")
+
+    def __init__(self, histogram: LogLinearHistogram):
+        self.__histogram = histogram
+        self.__started = 0
+
+    def __enter__(self):
+        self.__started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__histogram.record(time.perf_counter_ns() - self.__started)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    # Гистограммы длительностей по этапам. Выключенный трассировщик отдает общий пустой span
+    enabled: bool
+
+    __histograms: Dict[str, LogLinearHistogram]
+    __lock: Lock
+    __local: local
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.__histograms = {}
+        self.__lock = Lock()
+        self.__local = local()
+
+    def histogram(self, stage: str) -> LogLinearHistogram:
+        histogram = self.__histograms.get(stage)
+        if histogram is None:
+            with self.__lock:
+                histogram = self.__histograms.setdefault(stage, LogLinearHistogram())
+        return histogram
+
+    def span(self, stage: str):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self.histogram(stage))
+
+    # Декоратор метода: замер выполняется, только пока трассировщик включен
+    def traced(self, stage: str):
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+
+                started = time.perf_counter_ns()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.histogram(stage).record(time.perf_counter_ns() - started)
+
+            return wrapper
+
+        return decorator
+
+    def record(self, stage: str, elapsed_ns: int):
+        if self.enabled:
+            self.histogram(stage).record(elapsed_ns)
+
+    # Начало обработки кадра сокета в текущем потоке: от него считается tick_to_trade
+    def begin_frame(self) -> int:
+        if not self.enabled:
+            return 0
+
+        started = time.perf_counter_ns()
+        self.__local.frame_started = started
+        return started
+
+    def end_frame(self, started: int):
+        if not started:
+            return
+
+        self.__local.frame_started = 0
+        self.histogram(FRAME_STAGE).record(time.perf_counter_ns() - started)
+
+    # Кадр, обработка которого в текущем потоке еще не завершена; 0 - вне кадра
+    def current_frame(self) -> int:
+        if not self.enabled:
+            return 0
+        return getattr(self.__local, "frame_started", 0)
+
+    # Продолжение обработки кадра в другом потоке (очередь actor): tick_to_trade считается от исходного кадра
+    def set_frame(self, started: int):
+        if self.enabled:
+            self.__local.frame_started = started
+
+    # Вызывается по завершении REST-запроса; вне обработки кадра (таймеры) ничего не записывает
+    def record_tick_to_trade(self):
+        if not self.enabled:
+            return
+
+        started = getattr(self.__local, "frame_started", 0)
+        if started:
+            self.histogram(TICK_TO_TRADE).record(time.perf_counter_ns() - started)
+
+    def snapshot(self, percentiles=DEFAULT_PERCENTILES) -> List[StageStats]:
+        with self.__lock:
+            histograms = sorted(self.__histograms.items())
+
+        return [StageStats(
+            stage=stage,
+            count=histogram.count,
+            mean=histogram.mean,
+            min=histogram.min,
+            max=histogram.max,
+            percentiles={quantile: histogram.percentile(quantile) for quantile in percentiles}
+        ) for stage, histogram in histograms if histogram.count]
+
+    def reset(self):
+        with self.__lock:
+            for histogram in self.__histograms.values():
+                histogram.reset()
+
+    def format(self) -> str:
+        lines = [f"{'stage':<40}{'count':>10}{'p50 us':>12}{'p99 us':>12}{'p99.9 us':>12}{'max us':>12}"]
+        for stats in self.snapshot():
+            p50, p99, p999 = (stats.percentiles[quantile] / 1000 for quantile in DEFAULT_PERCENTILES)
+            lines.append(f"{stats.stage:<40}{stats.count:>10}{p50:>12.1f}{p99:>12.1f}{p999:>12.1f}"
+                         f"{stats.max / 1000:>12.1f}")
+        return "\n".join(lines)
+
+    def dump(self):
+        if self.enabled:
+            logger.info("(tracing)\n%s", self.format())
+
+
+# Общий трассировщик процесса; включается настройкой tracing
+tracer = Tracer()
+
+__all__ = ["tracer", "Tracer", "LogLinearHistogram", "StageStats", "TICK_TO_TRADE", "FRAME_STAGE"]
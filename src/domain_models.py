@@ -1,12 +1,16 @@
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_EVEN
 from enum import Enum
-from typing import Union
+from typing import Dict, List, Optional, Tuple, Union
 
 
 class OrderStatus(str, Enum):
     Filled = "Filled",
     New = "New",
-    Cancelled = "Cancelled"
+    Cancelled = "Cancelled",
+    PartiallyFilled = "PartiallyFilled",
+    PartiallyFilledCanceled = "PartiallyFilledCanceled",
+    Rejected = "Rejected",
+    Deactivated = "Deactivated"
 
     def __str__(self):
         return self.value
@@ -33,30 +37,145 @@ class Side(str, Enum):
         return self.value
 
 
+class AverageMode(str, Enum):
+    Simple = "Simple",
+    TimeWeighted = "TimeWeighted"
+
+    def __str__(self):
+        return self.value
+
+
+# Разобранных строк цен на шкалу; хватает на коридор в тысячи тиков
+PRICE_CACHE_LIMIT = 4096
+
+
+class PriceScale:
+    # Цена как целое число шагов цены инструмента: сравнения и арифметика на горячем пути - целочисленные,
+    # Decimal собирается только для REST и логов
+    __slots__ = ("__tick_size", "__digits", "__cache")
+
+    __tick_size: Decimal
+    # Число знаков после точки, если шаг - степень десяти (0.0001); иначе None и разбор через Decimal
+    __digits: Optional[int]
+    # Строка цены из сообщения -> тики. Цены у спреда повторяются из кадра в кадр: разбор сводится к поиску в словаре
+    __cache: Dict[str, int]
+
+    def __init__(self, tick_size: Decimal):
+        tick_size = Decimal(tick_size)
+        if tick_size <= 0:
+            raise ValueError(f"Шаг цены должен быть положительным: {tick_size}")
+
+        self.__tick_size = tick_size
+        sign, digits, exponent = tick_size.normalize().as_tuple()
+        self.__digits = -exponent if digits == (1,) and exponent <= 0 else None
+        self.__cache = {}
+
+    # Самый мелкий десятичный шаг среди цен: для диапазонов, заданных без инструмента
+    @staticmethod
+    def of(*prices: Decimal) -> 'PriceScale':
+        exponent = min([Decimal(price).as_tuple().exponent for price in prices] + [0])
+        return PriceScale(Decimal(1).scaleb(exponent))
+
+    @property
+    def tick_size(self) -> Decimal:
+        return self.__tick_size
+
+    # Цена из сообщения сокета без промежуточного Decimal
+    def parse(self, text: str) -> int:
+        ticks = self.__cache.get(text)
+        if ticks is None:
+            ticks = self.__parse(text)
+            # Кэш ограничен: при долгом тренде старые цены больше не встречаются
+            if len(self.__cache) >= PRICE_CACHE_LIMIT:
+                self.__cache.clear()
+            self.__cache[text] = ticks
+        return ticks
+
+    # Уровни стакана [[цена, объем], ...]: цены в тики, объемы в Decimal
+    def parse_levels(self, levels: List[List[str]]) -> List[Tuple[int, Decimal]]:
+        cache = self.__cache
+        return [(cache[price] if price in cache else self.parse(price), Decimal(size)) for price, size in levels]
+
+    def __parse(self, text: str) -> int:
+        # Bybit отдает цены с числом знаков шага: "0.9998" при шаге 0.0001 - это 9998 тиков
+        digits = self.__digits
+        if digits and len(text) > digits and text[-digits - 1] == ".":
+            try:
+                return int(text.replace(".", "", 1))
+            except ValueError:
+                pass
+
+        return self.to_ticks(Decimal(text))
+
+    # Цена вне сетки шагов округляется до ближайшего шага
+    def to_ticks(self, price: Decimal) -> int:
+        return int((Decimal(price) / self.__tick_size).to_integral_value(ROUND_HALF_EVEN))
+
+    def to_price(self, ticks: Union[int, Decimal]) -> Decimal:
+        return self.__tick_size * ticks
+
+    def __eq__(self, other):
+        return isinstance(other, PriceScale) and self.__tick_size == other.tick_size
+
+    def __hash__(self):
+        return hash(self.__tick_size)
+
+    def __repr__(self):
+        return f"PriceScale({self.__tick_size})"
+
+
 class TradeRange:
-    __sell: Decimal
-    __buy: Decimal
+    # Границы хранятся в тиках: сдвиг и проверки триггеров - целочисленные
+    __buy_ticks: int
+    __sell_ticks: int
+    __scale: PriceScale
+
+    # scale не задан - шаг берется по самим ценам
+    def __init__(self, buy: Decimal, sell: Decimal, scale: Optional[PriceScale] = None):
+        self.__scale = scale or PriceScale.of(buy, sell)
+        self.__buy_ticks = self.__scale.to_ticks(buy)
+        self.__sell_ticks = self.__scale.to_ticks(sell)
+
+    @staticmethod
+    def from_ticks(buy_ticks: int, sell_ticks: int, scale: PriceScale) -> 'TradeRange':
+        trade_range = TradeRange.__new__(TradeRange)
+        trade_range.__buy_ticks = buy_ticks
+        trade_range.__sell_ticks = sell_ticks
+        trade_range.__scale = scale
+        return trade_range
 
-    def __init__(self, buy: Decimal, sell: Decimal):
-        self.__buy = buy
-        self.__sell = sell
+    @property
+    def scale(self) -> PriceScale:
+        return self.__scale
 
     @property
     def sell(self) -> Decimal:
-        return self.__sell
+        return self.__scale.to_price(self.__sell_ticks)
 
     @property
     def buy(self) -> Decimal:
-        return self.__buy
+        return self.__scale.to_price(self.__buy_ticks)
+
+    @property
+    def sell_ticks(self) -> int:
+        return self.__sell_ticks
+
+    @property
+    def buy_ticks(self) -> int:
+        return self.__buy_ticks
 
     @property
     def height(self) -> Decimal:
-        return abs(self.__sell - self.__buy)
+        return self.__scale.to_price(self.height_ticks)
+
+    @property
+    def height_ticks(self) -> int:
+        return abs(self.__sell_ticks - self.__buy_ticks)
 
-    def offset(self, step_offset: Union[int, Decimal]):
-        length = self.height * step_offset
-        self.__sell = self.__sell + length
-        self.__buy = self.__buy + length
+    def offset(self, step_offset: int):
+        length = self.height_ticks * step_offset
+        self.__sell_ticks += length
+        self.__buy_ticks += length
 
     def __str__(self):
-        return f"[{self.__buy}, {self.__sell}]"
+        return f"[{self.buy}, {self.sell}]"
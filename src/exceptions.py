@@ -15,3 +15,8 @@ class WithoutTradeRangeException(TriggerException):
         super().__init__(f"Ошибка. Неверно указан торговый канал. "
                          f"trade_range: {trade_range.buy}-{trade_range.sell} "
                          f"market_range: {current_range.buy}-{current_range.sell}")
+
+
+class OrderValidationException(DomainException):
+    def __init__(self, symbol: str, reason: str):
+        super().__init__(f"Ошибка. Ордер {symbol} не пройдет проверку биржи: {reason}")
@@ -1,99 +1,60 @@
+import atexit
 import json
 import time
-from decimal import Decimal
 
-from domain_models import CoinType, TradeRange
+from core.actor import EventLoopActor, inline_actor
+from core.log import logger
+from core.metrics import MetricsServer
+from core.recorder import FrameRecorder
+from core.tracing import tracer
 from schemas.setting import Setting
-from services.bot.socket_bridges import OrderBridge, TickerBridge
 from api.bybit_client import BybitClient
-from services.bot import Side, OrderbookBridge, OrderManager, BotOptions, BybitBotService, TimeRangeTrigger, \
-    OrderbookTrigger
-
-client = None
-
-
-def get_market_trade_range(symbol: str, category: str) -> TradeRange:
-    orderbook = client.get_orderbook(
-        category=category,
-        symbol=symbol
-    )
-
-    return TradeRange(orderbook.bids[0].price, orderbook.asks[0].price)
-
+from api.bybit_client.scheduler import RequestScheduler, RateLimit
+from services.instruments import get_instrument_cache
+from services.runtime import BotRuntime
 
 # Получаем настройки бота
 with open("settings.json", "r") as file:
     settingText = file.read()
 settings = Setting(**json.loads(settingText))
 
-client = BybitClient(
-    key=settings.key,
-    secret_key=settings.secret_key
-)
-
-target_range = get_market_trade_range(
-    symbol=settings.symbol,
-    category="spot"
-)
-
-orderbook_bridge = OrderbookBridge(
-    symbol=settings.symbol,
-    client=client,
-    category="spot"
-)
+tracer.enabled = settings.tracing
+atexit.register(tracer.dump)
 
-order_bridge = OrderBridge(
-    symbol=settings.symbol,
-    client=client,
-    category="private"
-)
-
-ticker_bridge = TickerBridge(
-    symbol=settings.symbol,
-    client=client,
-    category="spot"
-)
+if settings.metrics_port:
+    MetricsServer(settings.metrics_port).start()
 
-bot_options = BotOptions(
-    category="spot",
-    symbol=settings.symbol,
-    trade_range=target_range,
-    allow_range=TradeRange(settings.allow_bottom_price, settings.allow_top_price),
-    overlap_top_price=settings.overlap_sell_price,
-    qty=settings.trade_amount
+# Один клиент на все пары: общая REST-сессия, лимиты и сокеты
+client = BybitClient(
+    key=settings.key,
+    secret_key=settings.secret_key,
+    fast_decode=settings.fast_decode,
+    recorder=FrameRecorder(settings.record_dir) if settings.record_dir else None,
+    scheduler=RequestScheduler(limits={
+        group: RateLimit(rate, max(1, int(rate))) for group, rate in (settings.rate_limits or {}).items()
+    }),
+    endpoint=settings.rest_endpoint,
+    ws_endpoint=settings.ws_endpoint
 )
 
-time_trigger = TimeRangeTrigger(
-    target_range=target_range,
-    ticker_bridge=ticker_bridge,
-    trigger_duration_buy=settings.trigger_duration_buy,
-    trigger_duration_sell=settings.trigger_duration_sell
-)
+get_instrument_cache(client, path=settings.instruments_cache)
 
-orderbook_trigger = OrderbookTrigger(
-    orderbook_bridge=orderbook_bridge,
-    trade_range=target_range,
-    min_bid_size=settings.min_bid_size,
-    min_ask_size=settings.min_ask_size
-)
+actor = inline_actor
+if settings.event_loop:
+    actor = EventLoopActor(max_queue=settings.event_queue_size)
+    atexit.register(actor.dump)
 
-bot = BybitBotService(
-    order_bridge=order_bridge,
-    client=client,
-    options=bot_options,
-    time_trigger=time_trigger,
-    orderbook_trigger=orderbook_trigger
-)
+runtime = BotRuntime(client=client, conflate=settings.conflate_events, actor=actor)
 
-# manager = OrderManager(
-#     client=client,
-#     order_bridge=order_bridge,
-#     symbol=settings.symbol,
-#     category="spot"
-# )
-#
-# manager.sell_all(Decimal("1.0005"), "USDCUSDT")
+for symbol_setting in settings.symbols:
+    runtime.add_symbol(symbol_setting)
 
+runtime.start()
 
-while True:
-    time.sleep(1)
+try:
+    while True:
+        time.sleep(1)
+except KeyboardInterrupt:
+    logger.info("(main) завершение работы")
+finally:
+    runtime.exit()
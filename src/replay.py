@@ -0,0 +1,90 @@
+import argparse
+import json
+from decimal import Decimal
+
+from core.clock import VirtualClock
+from core.log import logger
+from core.tracing import tracer
+from schemas.setting import Setting
+from services.instruments import build_instrument, split_symbol
+from services.replay import ReplayClient, ReplayEngine, load_recording
+from services.runtime import BotRuntime
+
+# Прогон записанной сессии на виртуальном времени:
+# python replay.py session.jsonl --settings settings.json --balance USDT=1000 --balance USDC=0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay записанных рыночных данных через BybitBotService")
+    parser.add_argument("recording")
+    parser.add_argument("--settings", default="settings.json")
+    parser.add_argument("--balance", action="append", default=[], help="COIN=AMOUNT")
+    parser.add_argument("--tick-size", default="0.0001")
+    parser.add_argument("--base-precision", default="0.0001")
+    parser.add_argument("--base-coin")
+    parser.add_argument("--quote-coin")
+    parser.add_argument("--with-recorded-orders", action="store_true",
+                        help="Передавать записанные order-кадры вместо симуляции исполнения")
+    parser.add_argument("--trace", action="store_true", help="Вывести перцентили задержек по этапам")
+    return parser.parse_args()
+
+
+args = parse_args()
+tracer.enabled = args.trace
+
+with open(args.settings, "r") as file:
+    settings = Setting(**json.loads(file.read()))
+
+if (args.base_coin or args.quote_coin) and len(settings.symbols) > 1:
+    raise ValueError("--base-coin и --quote-coin задаются только для одной пары")
+
+instruments = []
+balances = {}
+for symbol_setting in settings.symbols:
+    base_coin, quote_coin = (args.base_coin, args.quote_coin) if args.base_coin and args.quote_coin \
+        else split_symbol(symbol_setting.symbol)
+    instruments.append(build_instrument(symbol_setting.symbol, base_coin, quote_coin,
+                                        args.tick_size, args.base_precision))
+    balances.setdefault(base_coin, Decimal(0))
+    balances.setdefault(quote_coin, Decimal(0))
+
+for item in args.balance:
+    coin, amount = item.split("=")
+    balances[coin] = Decimal(amount)
+
+clock = VirtualClock()
+client = ReplayClient(
+    clock=clock,
+    instruments=instruments,
+    balances=balances,
+    fast_decode=settings.fast_decode
+)
+engine = ReplayEngine(
+    client=client,
+    clock=clock,
+    frames=load_recording(args.recording),
+    simulate_fills=not args.with_recorded_orders
+)
+
+runtime = BotRuntime(client=client, clock=clock)
+for symbol_setting in settings.symbols:
+    runtime.add_symbol(symbol_setting)
+
+# Торговый коридор каждой пары берется из первого snapshot стакана в записи
+engine.run(stop_when=lambda: all(item.orderbook_bridge.book.is_synced for item in runtime.symbols))
+for item in runtime.symbols:
+    if not item.orderbook_bridge.book.is_synced:
+        raise Exception(f"В записи нет snapshot стакана {item.symbol}")
+
+start_time = clock.time()
+runtime.start()
+
+engine.run()
+engine.finish(max(max(item.trigger_duration_buy, item.trigger_duration_sell) for item in settings.symbols))
+
+logger.info(f"REPLAY DONE frames:{engine.processed} "
+            f"virtual_time:{clock.time() - start_time:.0f}s "
+            f"fills:{len(client.fills)} "
+            f"balances:{ {coin: str(amount) for coin, amount in client.balances.items()} } "
+            f"trade_ranges:{ {item.symbol: str(item.trade_range) for item in runtime.symbols} }")
+tracer.dump()
@@ -1,7 +1,7 @@
-from .orderbook import Orderbook
-from .ticker import Ticker
+from .orderbook import Orderbook, OrderbookUpdate
+from .ticker import Ticker, TickerRecord
 from .webcallbacks import EventMessage, SocketOperation
 from .order import Order, OrderEntity
 from .book import Book
 
-__all__ = ["Orderbook", "EventMessage", "Ticker", "Order", "SocketOperation", "Book", "OrderEntity"]
+__all__ = ["Orderbook", "OrderbookUpdate", "EventMessage", "Ticker", "TickerRecord", "Order", "SocketOperation", "Book", "OrderEntity"]
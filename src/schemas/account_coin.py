@@ -44,3 +44,33 @@ class Account(BaseModel):
     account_ltv: str = Field(alias='accountLTV')
     total_maintenance_margin: str = Field(alias='totalMaintenanceMargin')
     coins: List[Coin] = Field(alias="coin")
+
+
+def _decimal_or_zero(value) -> Decimal:
+    return Decimal(value) if value else Decimal(0)
+
+
+class CoinBalance:
+    # Баланс монеты без pydantic: собирается из REST-ответа и сообщений топика wallet
+    __slots__ = ("coin", "wallet_balance", "locked")
+
+    coin: str
+    wallet_balance: Decimal
+    locked: Decimal
+
+    def __init__(self, coin: str, wallet_balance: Decimal, locked: Decimal):
+        self.coin = coin
+        self.wallet_balance = wallet_balance
+        self.locked = locked
+
+    @property
+    def free(self) -> Decimal:
+        return self.wallet_balance - self.locked
+
+    @staticmethod
+    def from_raw(data: dict) -> 'CoinBalance':
+        return CoinBalance(data["coin"], _decimal_or_zero(data.get("walletBalance")),
+                           _decimal_or_zero(data.get("locked")))
+
+    def __repr__(self):
+        return f"CoinBalance(coin={self.coin}, wallet_balance={self.wallet_balance}, locked={self.locked})"
@@ -18,3 +18,5 @@ class Order(OrderEntity):
     order_iv: Optional[str] = Field(alias="orderIv", default=None)
     # time_in_force: str = Field(alias="timeInForce", default=datetime.now)
     status: str = Field(..., alias="orderStatus")
+    # Время последнего изменения ордера на бирже, мс
+    updated_time: Optional[int] = Field(alias="updatedTime", default=None)
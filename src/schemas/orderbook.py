@@ -1,8 +1,13 @@
 from decimal import Decimal
-from typing import List
+from typing import List, Optional, Tuple, Union
 
 from pydantic import BaseModel, Field, model_validator
 
+from domain_models import PriceScale
+
+# Цена уровня: тики PriceScale пары или, без шкалы, Decimal
+Price = Union[int, Decimal]
+
 
 class PriceVolume(BaseModel):
     price: Decimal
@@ -27,3 +32,65 @@ class Orderbook(BaseModel):
     asks: List[PriceVolume] = Field(alias='a')
     update_id: int = Field(alias='u')
     sequence: int = Field(alias='seq')
+
+
+class OrderbookUpdate:
+    __slots__ = ("is_snapshot", "symbol", "bids", "asks", "update_id", "sequence")
+
+    is_snapshot: bool
+    symbol: str
+    bids: List[Tuple[Price, Decimal]]
+    asks: List[Tuple[Price, Decimal]]
+    update_id: int
+    sequence: int
+
+    def __init__(
+            self,
+            is_snapshot: bool,
+            symbol: str,
+            bids: List[Tuple[Price, Decimal]],
+            asks: List[Tuple[Price, Decimal]],
+            update_id: int,
+            sequence: int
+    ):
+        self.is_snapshot = is_snapshot
+        self.symbol = symbol
+        self.bids = bids
+        self.asks = asks
+        self.update_id = update_id
+        self.sequence = sequence
+
+    @staticmethod
+    def from_raw(message: dict, scale: Optional[PriceScale] = None) -> 'OrderbookUpdate':
+        data = message["data"]
+        if scale:
+            bids = scale.parse_levels(data["b"])
+            asks = scale.parse_levels(data["a"])
+        else:
+            bids = [(Decimal(price), Decimal(size)) for price, size in data["b"]]
+            asks = [(Decimal(price), Decimal(size)) for price, size in data["a"]]
+
+        return OrderbookUpdate(
+            is_snapshot=message["type"] == "snapshot",
+            symbol=data["s"],
+            bids=bids,
+            asks=asks,
+            update_id=data["u"],
+            sequence=data["seq"]
+        )
+
+    @staticmethod
+    def from_orderbook(
+            orderbook: Orderbook,
+            is_snapshot: bool,
+            scale: Optional[PriceScale] = None
+    ) -> 'OrderbookUpdate':
+        convert = scale.to_ticks if scale else Decimal
+        return OrderbookUpdate(
+            is_snapshot=is_snapshot,
+            symbol=orderbook.symbol,
+            bids=[(convert(level.price), level.size) for level in orderbook.bids],
+            asks=[(convert(level.price), level.size) for level in orderbook.asks],
+            update_id=orderbook.update_id,
+            sequence=orderbook.sequence
+        )
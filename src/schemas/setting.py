@@ -1,11 +1,16 @@
 from decimal import Decimal
+from typing import Dict, List, Optional
+
 from pydantic import BaseModel, Field, field_validator, model_validator
 
+from core.actor import DEFAULT_MAX_QUEUE
+from domain_models import AverageMode
 
-class Setting(BaseModel):
-    is_testnet: bool = Field(..., alias="isTestnet")
-    key: str = Field(...)
-    secret_key: str = Field(..., alias="secretKey")
+# Лимит открытых ордеров spot на аккаунт у Bybit
+MAX_OPEN_ORDERS = 500
+
+
+class SymbolSetting(BaseModel):
     allow_top_price: Decimal = Field(..., alias="allowTopPrice")
     allow_bottom_price: Decimal = Field(..., alias="allowBottomPrice")
     overlap_sell_price: Decimal = Field(..., alias="overlapSellPrice", validate_default=True)
@@ -15,12 +20,58 @@ class Setting(BaseModel):
     min_ask_size: Decimal = Field(..., alias="MinAskSize")
     trigger_duration_buy: int = Field(..., alias="triggerDurationBuy")
     trigger_duration_sell: int = Field(..., alias="triggerDurationSell")
+    average_mode: AverageMode = Field(default=AverageMode.Simple, alias="averageMode")
+    # Уровней сетки на сторону с шагом в высоту коридора; 1 - ордера только на границах trade_range
+    grid_levels: int = Field(default=1, alias="gridLevels", ge=1)
+    # Не больше открытых ордеров пары; пары одного аккаунта делят лимит биржи MAX_OPEN_ORDERS
+    max_open_orders: int = Field(default=MAX_OPEN_ORDERS, alias="maxOpenOrders", ge=1, le=MAX_OPEN_ORDERS)
 
     @model_validator(mode="after")
     def validate_overlap_price(self):
         if self.overlap_sell_price < self.allow_top_price:
             raise Exception("Неверно заданы настройки: overlapSellPrice < allowTopPrice")
-        pass
+        return self
+
+
+class Setting(BaseModel):
+    is_testnet: bool = Field(..., alias="isTestnet")
+    key: str = Field(...)
+    secret_key: str = Field(..., alias="secretKey")
+    fast_decode: bool = Field(default=False, alias="fastDecode")
+    record_dir: Optional[str] = Field(default=None, alias="recordDir")
+    # Переопределение лимитов планировщика: группа эндпоинтов -> запросов в секунду
+    rate_limits: Optional[Dict[str, float]] = Field(default=None, alias="rateLimits")
+    # Файл кэша правил инструментов (шаг цены, точность, минимальные суммы) между запусками
+    instruments_cache: Optional[str] = Field(default=None, alias="instrumentsCache")
+    # Замер задержек по этапам обработки; перцентили выводятся в лог при завершении
+    tracing: bool = Field(default=False)
+    # Порт HTTP-экспортера метрик в формате Prometheus (127.0.0.1); не задан - экспортер не запускается
+    metrics_port: Optional[int] = Field(default=None, alias="metricsPort")
+    # Адреса REST и websocket вместо серверов Bybit, например локального симулятора (simulator.py)
+    rest_endpoint: Optional[str] = Field(default=None, alias="restEndpoint")
+    ws_endpoint: Optional[str] = Field(default=None, alias="wsEndpoint")
+    # Стакан и тикер обрабатываются триггерами в отдельных потоках, устаревшие сообщения пропускаются
+    conflate_events: bool = Field(default=False, alias="conflateEvents")
+    # Триггеры и логика ордеров всех пар выполняются в одном потоке, события сокетов и таймеров - через его очередь
+    event_loop: bool = Field(default=True, alias="eventLoop")
+    event_queue_size: int = Field(default=DEFAULT_MAX_QUEUE, alias="eventQueueSize", gt=0)
+    symbols: List[SymbolSetting] = Field(..., min_length=1)
+
+    @model_validator(mode="before")
+    @classmethod
+    def validate_single_symbol(cls, data):
+        # Старый формат: настройки одной пары на верхнем уровне
+        if isinstance(data, dict) and "symbols" not in data:
+            data = {**data, "symbols": [data]}
+        return data
+
+    @field_validator("symbols")
+    @classmethod
+    def validate_unique_symbols(cls, symbols: List[SymbolSetting]):
+        names = [item.symbol for item in symbols]
+        if len(names) != len(set(names)):
+            raise ValueError("Неверно заданы настройки: пары в symbols повторяются")
+        return symbols
 
 
 
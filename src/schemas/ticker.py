@@ -1,7 +1,10 @@
 from decimal import Decimal
+from typing import Optional, Union
 
 from pydantic import BaseModel, Field
 
+from domain_models import PriceScale
+
 
 class Ticker(BaseModel):
     symbol: str
@@ -11,4 +14,25 @@ class Ticker(BaseModel):
     previous_price_24h: Decimal = Field(..., alias='prevPrice24h')
     volume_24h: Decimal = Field(..., alias='volume24h')
     turnover_24h: Decimal = Field(..., alias='turnover24h')
-    price_change_percent_24h: str = Field(..., alias='price24hPcnt')
\ No newline at end of file
+    price_change_percent_24h: str = Field(..., alias='price24hPcnt')
+
+
+class TickerRecord:
+    __slots__ = ("symbol", "last_price")
+
+    symbol: str
+    # В тиках PriceScale пары, без шкалы - Decimal
+    last_price: Union[int, Decimal]
+
+    def __init__(self, symbol: str, last_price: Union[int, Decimal]):
+        self.symbol = symbol
+        self.last_price = last_price
+
+    @staticmethod
+    def from_raw(message: dict, scale: Optional[PriceScale] = None) -> 'TickerRecord':
+        data = message["data"]
+        price = data["lastPrice"]
+        return TickerRecord(data["symbol"], scale.parse(price) if scale else Decimal(price))
+
+    def __repr__(self):
+        return f"TickerRecord(symbol={self.symbol}, last_price={self.last_price})"
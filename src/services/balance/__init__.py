@@ -0,0 +1,130 @@
+from threading import Lock, Thread
+from typing import Any, Dict, List, Optional
+from weakref import WeakKeyDictionary
+
+from core.log import logger
+from schemas import SocketOperation
+from schemas.account_coin import CoinBalance
+from services.socket_hub import get_socket_hub
+
+# Приватный топик wallet общий для всех пар: подписчик хаба регистрируется без символа
+WALLET_CHANNEL = "private"
+WALLET_SYMBOL = ""
+
+
+class BalanceService:
+    # Балансы монет в памяти: REST-снимок при старте и после переподключения, далее - топик wallet
+    __client: Any
+    __balances: Dict[str, CoinBalance]
+    __versions: Dict[str, int]
+    __lock: Lock
+    __is_started: bool
+    # Соединение, обновления которого уже учтены снимком; новое соединение - признак переподключения
+    __conn_id: Optional[str]
+    __is_refresh_pending: bool
+
+    def __init__(self, client):
+        self.__client = client
+        self.__balances = {}
+        self.__versions = {}
+        self.__lock = Lock()
+        self.__is_started = False
+        self.__conn_id = None
+        self.__is_refresh_pending = False
+
+    @property
+    def balances(self) -> List[CoinBalance]:
+        return list(self.__balances.values())
+
+    def get(self, coin: str) -> Optional[CoinBalance]:
+        return self.__balances.get(str(coin))
+
+    def start(self):
+        if self.__is_started:
+            return
+
+        self.__is_started = True
+        get_socket_hub(self.__client).subscribe(
+            self.__client.websocket.wallet, WALLET_CHANNEL, WALLET_SYMBOL, self.__on_wallet, self.__on_operation
+        )
+        self.refresh()
+
+    def refresh(self):
+        with self.__lock:
+            versions = dict(self.__versions)
+
+        try:
+            snapshot = self.__client.wallet_balances()
+        except Exception as ex:
+            logger.warning(f"(balance) Ошибка получения снимка балансов. {ex}")
+            return
+
+        with self.__lock:
+            balances = dict(self.__balances)
+            for coin in snapshot:
+                # Обновление из сокета, пришедшее во время запроса, новее снимка
+                if self.__versions.get(coin.coin, 0) == versions.get(coin.coin, 0):
+                    balances[coin.coin] = coin
+            self.__balances = balances
+
+        logger.info("(balance) снимок %s", snapshot)
+
+    def exit(self):
+        if not self.__is_started:
+            return
+
+        self.__is_started = False
+        get_socket_hub(self.__client).unsubscribe(
+            self.__client.websocket.wallet, WALLET_CHANNEL, WALLET_SYMBOL, self.__on_wallet, self.__on_operation
+        )
+
+    def __on_wallet(self, coins: List[CoinBalance]):
+        with self.__lock:
+            # Словарь заменяется целиком: читатели обращаются к нему без блокировки
+            balances = dict(self.__balances)
+            for coin in coins:
+                balances[coin.coin] = coin
+                self.__versions[coin.coin] = self.__versions.get(coin.coin, 0) + 1
+            self.__balances = balances
+
+    def __on_operation(self, operation: SocketOperation):
+        if operation.op != "subscribe" or not operation.success:
+            return
+
+        # Пока соединение было разорвано, обновления wallet терялись: после переподписки берем снимок.
+        # Первое соединение учтено снимком в start, подтверждения других топиков того же соединения пропускаются
+        with self.__lock:
+            is_reconnect = self.__conn_id is not None and self.__conn_id != operation.conn_id
+            self.__conn_id = operation.conn_id
+            if not is_reconnect or self.__is_refresh_pending:
+                return
+            self.__is_refresh_pending = True
+
+        # REST-запрос не выполняется в потоке сокета: он задержал бы сообщения всех топиков соединения
+        Thread(target=self.__refresh_after_reconnect, name="BalanceRefresh", daemon=True).start()
+
+    def __refresh_after_reconnect(self):
+        try:
+            self.refresh()
+        finally:
+            with self.__lock:
+                self.__is_refresh_pending = False
+
+
+_services: 'WeakKeyDictionary[Any, BalanceService]' = WeakKeyDictionary()
+_services_lock = Lock()
+
+
+# Один сервис на клиента: балансы аккаунта общие для всех пар
+def get_balance_service(client) -> BalanceService:
+    with _services_lock:
+        service = _services.get(client)
+        if service is None:
+            service = BalanceService(client)
+            _services[client] = service
+
+        service.start()
+        return service
+
+
+__all__ = ["BalanceService", "get_balance_service"]
@@ -1,17 +1,26 @@
 from dataclasses import dataclass
-from datetime import datetime
 from decimal import Decimal
 from typing import Union, Optional
 
 from pybit.unified_trading import WebSocket
 
 from api import BybitClient
+from core.actor import Actor, inline_actor
+from core.clock import Clock, system_clock
 from core.log import logger
+from core.metrics import registry
+from core.tracing import tracer
 from schemas.order import Order
+from schemas.setting import MAX_OPEN_ORDERS
 from domain_models import Side, TradeRange
+from services.bot.ladder import GridLadder
 from services.bot.order_manager import OrderManager
 from .socket_bridges import TickerBridge, OrderbookBridge, OrderBridge
 from services.bot.triggers import TimeRangeTrigger, OrderbookTrigger
+from services.balance import get_balance_service
+from services.instruments import get_instrument_cache
+
+TRADE_RANGE = registry.gauge("bot_trade_range", "Текущий торговый коридор пары", ("symbol", "bound"))
 
 
 @dataclass
@@ -29,6 +38,10 @@ class BotOptions:
     allow_range: TradeRange
     trade_range: TradeRange
     overlap_top_price: Decimal
+    # Уровней лестницы на сторону; 1 - все ордера стороны на границе trade_range
+    grid_levels: int = 1
+    # Не больше открытых ордеров пары
+    max_open_orders: int = MAX_OPEN_ORDERS
 
 
 @dataclass
@@ -40,6 +53,7 @@ class SocketBridgesHub:
 class BybitBotService:
     __symbol_info: Optional[SymbolInfo]
     __is_order_placement_in_progress: bool
+    __is_exited: bool
 
     __client: BybitClient
     __order_manager: OrderManager
@@ -47,6 +61,9 @@ class BybitBotService:
 
     __time_trigger: TimeRangeTrigger
     __orderbook_trigger: OrderbookTrigger
+    __ladder: Optional[GridLadder]
+    __actor: Actor
+    __clock: Clock
 
     def __init__(
             self,
@@ -55,37 +72,70 @@ class BybitBotService:
             client: BybitClient,
             orderbook_trigger: OrderbookTrigger,
             time_trigger: TimeRangeTrigger,
+            actor: Optional[Actor] = None,
+            clock: Clock = system_clock
     ):
         self.__order_manager = OrderManager(
             symbol=options.symbol,
             order_bridge=order_bridge,
             category=options.category,
-            client=client)
+            client=client,
+            balances=get_balance_service(client),
+            max_open_orders=options.max_open_orders,
+            clock=clock)
 
         self.__client = client
+        self.__actor = actor or inline_actor
+        self.__clock = clock
         self.__is_order_placement_in_progress = False
+        self.__is_exited = False
         self.__order_manager.on_order_filled = self.__on_order_filled
         self.__options = options
         self.__time_trigger = time_trigger
         self.__orderbook_trigger = orderbook_trigger
         self.__is_overlap_sell_price = self.__options.allow_range.sell == self.__options.trade_range.sell
 
+        # Коридор читается при выгрузке метрик, на каждом смещении ничего не обновляется
+        TRADE_RANGE.labels(options.symbol, "buy").set_function(lambda: options.trade_range.buy)
+        TRADE_RANGE.labels(options.symbol, "sell").set_function(lambda: options.trade_range.sell)
+
         time_trigger.on_triggered = self.__on_time_trigger
         orderbook_trigger.on_triggered = self.__on_orderbook_trigger
         self.get_symbol_info()
-        self.__two_side_create_orders()
+        self.__ladder = self.__create_ladder() if options.grid_levels > 1 else None
+
+        if self.__ladder:
+            self.__sync_ladder()
+        else:
+            self.__two_side_create_orders()
 
         self.__time_trigger.reset()
         self.__orderbook_trigger.reset()
 
     def get_symbol_info(self):
-        tick_size = self.__client.get_instrument_info(self.__options.symbol, "spot").list[0].priceFilter.tick_size
-        self.__symbol_info = SymbolInfo(self.__options.symbol, tick_size, None)
-        # TODO order_manager.set_symbol()
+        instrument = get_instrument_cache(self.__client).get(self.__options.symbol, self.__options.category)
+        self.__symbol_info = SymbolInfo(self.__options.symbol, instrument.tick_size, None)
+        self.__order_manager.set_instrument(instrument)
+
+    def __create_ladder(self) -> GridLadder:
+        instrument = get_instrument_cache(self.__client).get(self.__options.symbol, self.__options.category)
+        return GridLadder(
+            levels=self.__options.grid_levels,
+            allow_range=self.__options.allow_range,
+            order_qty=instrument.quantize_qty(Decimal(self.__options.qty)),
+            overlap_sell_price=self.__options.overlap_top_price,
+            scale=self.__options.trade_range.scale,
+            max_orders=self.__options.max_open_orders
+        )
 
+    @tracer.traced("bot.time_trigger")
     def __on_time_trigger(self, direction: Side):
         self.__offset_trade_range(direction)
 
+        if self.__ladder:
+            self.__sync_ladder()
+            return
+
         if direction == direction.Sell:
             self.__amend_all_orders(Side.Buy)
         else:
@@ -96,9 +146,14 @@ class BybitBotService:
 
         self.__two_side_create_orders()
 
+    @tracer.traced("bot.orderbook_trigger")
     def __on_orderbook_trigger(self, side: Side):
         if side == Side.Buy:
             self.__offset_trade_range(side)
+            if self.__ladder:
+                self.__sync_ladder()
+                return
+
             try:
                 self.__order_manager.sell_all(price_per_unit=self.__options.trade_range.sell,
                                               symbol=self.__options.symbol)
@@ -107,7 +162,15 @@ class BybitBotService:
 
             self.__two_side_create_orders()
 
+    @tracer.traced("bot.order_filled")
     def __on_order_filled(self, order: Order):
+        # Сверка лестницы ставится в очередь actor после уже полученных кадров ордеров: серия исполнений
+        # дает одну сверку, и она не переставляет ордера, закрытие которых еще не применено. Без отдельного
+        # потока (InlineActor) сверка откладывается до конца внешнего события: кадра ордеров или пачки кадров
+        if self.__ladder:
+            self.__actor.post("ladder", self.__sync_ladder, key=("ladder", self.__options.symbol))
+            return
+
         if order.side == Side.Sell:
             side = Side.Buy
         else:
@@ -115,12 +178,39 @@ class BybitBotService:
 
         self.__create_orders_while_possible(side)
 
+    # Целевые уровни по текущему коридору и средствам; на биржу уходит только разница с открытыми ордерами.
+    # Сдвиг коридора переставляет ордера освободившихся уровней, остальные не трогаются
+    @tracer.traced("bot.ladder")
+    def __sync_ladder(self):
+        # Сверка, поставленная в очередь actor до удаления пары, ордеров уже не выставляет
+        if self.__is_order_placement_in_progress or self.__is_exited:
+            return
+
+        self.__is_order_placement_in_progress = True
+        try:
+            targets = self.__ladder.targets(self.__options.trade_range, self.__order_manager.ladder_budgets())
+            actions = self.__ladder.diff(targets, self.__order_manager.open_orders)
+            if actions:
+                self.__order_manager.apply_ladder(actions, self.__ladder.scale, self.__ladder.order_qty)
+        finally:
+            self.__is_order_placement_in_progress = False
+
+    # Пара удаляется: триггеры и их таймеры отключаются, OrderManager отписывается от ордеров.
+    # Открытые ордера на бирже остаются
+    def exit(self):
+        self.__is_exited = True
+        self.__time_trigger.exit()
+        self.__orderbook_trigger.exit()
+        self.__order_manager.exit()
+        TRADE_RANGE.remove(self.__options.symbol, "buy")
+        TRADE_RANGE.remove(self.__options.symbol, "sell")
+
     def __two_side_create_orders(self):
         self.__create_orders_while_possible(Side.Buy)
         self.__create_orders_while_possible(Side.Sell)
 
     def __offset_trade_range(self, direction: Side):
-        logger.info(f"{datetime.now()} TRIGGER")
+        logger.info(f"{self.__clock.now()} TRIGGER")
         is_outside_bottom = self.__options.trade_range.buy <= self.__options.allow_range.buy and direction == Side.Buy
         is_outside_top = self.__options.trade_range.sell >= self.__options.allow_range.sell and direction == Side.Sell
 
@@ -143,6 +233,7 @@ class BybitBotService:
         price = self.__options.trade_range.buy if side == Side.Buy else self.__options.trade_range.sell
         self.__order_manager.amend_all_orders(side=side, price=price)
 
+    # Флаг защищает от повторного входа: без actor исполнение ордера может прийти во время выставления
     def __create_orders_while_possible(self, side: Union[str, Side]):
         if self.__is_order_placement_in_progress:
             return
@@ -0,0 +1,201 @@
+from decimal import Decimal
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from domain_models import PriceScale, Side, TradeRange
+from schemas.account_coin import CoinBalance
+from schemas.setting import MAX_OPEN_ORDERS
+from services.bot.order_store import OrderRecord
+
+# Уровень лестницы: сторона и цена в тиках
+LevelKey = Tuple[str, int]
+
+
+class LadderActionKind(str, Enum):
+    Place = "place"
+    Amend = "amend"
+    Cancel = "cancel"
+
+    def __str__(self):
+        return self.value
+
+
+class LadderAction:
+    __slots__ = ("kind", "side", "price", "order_id")
+
+    kind: LadderActionKind
+    side: str
+    # Новая цена ордера в тиках; для отмены - None
+    price: Optional[int]
+    order_id: Optional[str]
+
+    def __init__(self, kind: LadderActionKind, side: str, price: Optional[int] = None, order_id: Optional[str] = None):
+        self.kind = kind
+        self.side = side
+        self.price = price
+        self.order_id = order_id
+
+    def __repr__(self):
+        return f"LadderAction({self.kind}, side={self.side}, price={self.price}, order_id={self.order_id})"
+
+
+class GridLadder:
+    # K ценовых уровней на сторону с шагом в высоту trade_range: покупки от trade_range.buy вниз,
+    # продажи от trade_range.sell вверх, в пределах allow_range. Ордера одного объема, на уровне их может быть
+    # несколько. При сдвиге коридора или исполнении разница с открытыми ордерами сводится к минимуму запросов:
+    # ордера совпавших уровней не трогаются, лишние переносятся amend на недостающие уровни той же стороны,
+    # и только остаток отменяется или выставляется
+    __levels: int
+    __allow_buy: int
+    __allow_sell: int
+    __order_qty: Decimal
+    __overlap_sell_price: int
+    __scale: PriceScale
+    __max_orders: int
+
+    def __init__(
+            self,
+            levels: int,
+            allow_range: TradeRange,
+            order_qty: Decimal,
+            overlap_sell_price: Decimal,
+            scale: PriceScale,
+            max_orders: int = MAX_OPEN_ORDERS
+    ):
+        if levels < 1:
+            raise ValueError(f"Число уровней лестницы должно быть положительным: {levels}")
+
+        self.__levels = levels
+        self.__allow_buy = scale.to_ticks(allow_range.buy)
+        self.__allow_sell = scale.to_ticks(allow_range.sell)
+        self.__order_qty = order_qty
+        self.__overlap_sell_price = scale.to_ticks(overlap_sell_price)
+        self.__scale = scale
+        self.__max_orders = max_orders
+
+    @property
+    def levels(self) -> int:
+        return self.__levels
+
+    @property
+    def order_qty(self) -> Decimal:
+        return self.__order_qty
+
+    @property
+    def scale(self) -> PriceScale:
+        return self.__scale
+
+    # Цены уровней стороны в тиках, от ближайшего к рынку
+    def level_prices(self, trade_range: TradeRange, side: str) -> List[int]:
+        step = max(trade_range.height_ticks, 1)
+
+        if side == Side.Buy:
+            prices = (trade_range.buy_ticks - step * index for index in range(self.__levels))
+            return [price for price in prices if self.__allow_buy <= price < self.__allow_sell]
+
+        prices = (trade_range.sell_ticks + step * index for index in range(self.__levels))
+        # Как у одиночного коридора: продажа на верхней границе allow_range переносится на overlapSellPrice
+        return [price for price in prices if self.__allow_buy < price < self.__allow_sell] \
+            or [self.__overlap_sell_price]
+
+    # Число ордеров на уровнях обеих сторон. budgets - средства стороны: quote на покупки, base на продажи,
+    # включая заблокированные в открытых ордерах пары, которые лестница может переставить (см. budget)
+    # Сторон в сумме не больше max_orders: сторона, которой не нужна своя половина лимита, отдает остаток другой
+    def targets(self, trade_range: TradeRange, budgets: Dict[str, Decimal]) -> Dict[LevelKey, int]:
+        prices = {side: self.level_prices(trade_range, side) for side in (Side.Buy, Side.Sell)}
+        costs = {
+            Side.Buy: [self.__scale.to_price(price) * self.__order_qty for price in prices[Side.Buy]],
+            Side.Sell: [self.__order_qty] * len(prices[Side.Sell])
+        }
+        wanted = {side: sum(self.__allocate(costs[side], budgets.get(str(side), Decimal(0)), self.__max_orders))
+                  for side in costs}
+
+        half = self.__max_orders // 2
+        limits = {
+            Side.Buy: self.__max_orders - min(wanted[Side.Sell], self.__max_orders - half),
+            Side.Sell: self.__max_orders - min(wanted[Side.Buy], half)
+        }
+
+        result = {}
+        for side in (Side.Buy, Side.Sell):
+            counts = self.__allocate(costs[side], budgets.get(str(side), Decimal(0)), limits[side])
+            for price, count in zip(prices[side], counts):
+                result[(str(side), price)] = count
+
+        return result
+
+    # Действия, приводящие открытые ордера к целевым уровням
+    def diff(self, targets: Dict[LevelKey, int], orders: Iterable[OrderRecord]) -> List[LadderAction]:
+        placed: Dict[LevelKey, List[OrderRecord]] = {}
+        for order in orders:
+            placed.setdefault((order.side, self.__scale.to_ticks(order.price)), []).append(order)
+
+        spare: Dict[str, List[OrderRecord]] = {str(side): [] for side in Side}
+        missing: Dict[str, List[int]] = {str(side): [] for side in Side}
+
+        for key, level_orders in placed.items():
+            surplus = len(level_orders) - targets.get(key, 0)
+            if surplus > 0:
+                # Самые новые ордера уровня: старые сохраняют место в очереди биржи
+                spare[key[0]].extend(level_orders[-surplus:])
+
+        for (side, price), count in targets.items():
+            deficit = count - len(placed.get((side, price), ()))
+            if deficit > 0:
+                missing[side].extend([price] * deficit)
+
+        actions = []
+        for side in spare:
+            # Ближайшие к рынку уровни заполняются первыми
+            prices = sorted(missing[side], reverse=side == Side.Buy)
+            moved = min(len(spare[side]), len(prices))
+
+            actions.extend(LadderAction(LadderActionKind.Amend, side, price, order.order_id)
+                           for order, price in zip(spare[side], prices))
+            actions.extend(LadderAction(LadderActionKind.Cancel, side, order_id=order.order_id)
+                           for order in spare[side][moved:])
+            actions.extend(LadderAction(LadderActionKind.Place, side, price) for price in prices[moved:])
+
+        return actions
+
+    # Средства стороны: свободный остаток монеты и заблокированное в ордерах лестницы. Считается как баланс
+    # без заблокированного чужими ордерами (другие пары, ордера вне бота): баланс с биржи отстает от только что
+    # выставленных ордеров, и free + own_locked учел бы их средства дважды, а здесь отставание только занижает чужое
+    @staticmethod
+    def budget(balance: Optional[CoinBalance], own_locked: Decimal) -> Decimal:
+        if balance is None:
+            return Decimal(0)
+
+        others_locked = max(balance.locked - own_locked, Decimal(0))
+        return max(balance.wallet_balance - others_locked, Decimal(0))
+
+    # Средства, заблокированные ордерами стороны: quote у покупок, base у продаж
+    @staticmethod
+    def locked(side: str, orders: Iterable[OrderRecord]) -> Decimal:
+        if side == Side.Buy:
+            return sum((order.price * order.qty for order in orders), Decimal(0))
+        return sum((order.qty for order in orders), Decimal(0))
+
+    # Раскладка бюджета по уровням: целые круги по всем уровням сразу, остаток - ближайшим к рынку.
+    # limit - не больше ордеров на всех уровнях
+    @staticmethod
+    def __allocate(costs: List[Decimal], budget: Decimal, limit: int) -> List[int]:
+        total = sum(costs)
+        if not costs or total <= 0 or budget <= 0 or limit <= 0:
+            return [0] * len(costs)
+
+        rounds = min(int(budget // total), limit // len(costs))
+        counts = [rounds] * len(costs)
+        budget -= total * rounds
+        limit -= rounds * len(costs)
+
+        for index, cost in enumerate(costs):
+            if limit > 0 and cost <= budget:
+                counts[index] += 1
+                budget -= cost
+                limit -= 1
+
+        return counts
+
+
+__all__ = ["GridLadder", "LadderAction", "LadderActionKind", "LevelKey"]
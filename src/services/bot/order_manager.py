@@ -1,123 +1,286 @@
 import time
 from decimal import Decimal
-from typing import List, Callable, Optional, Union
+from functools import partial
+from typing import Dict, List, Callable, Optional, Union
 
 from api import BybitClient
-from domain_models import OrderStatus, CoinType
+from domain_models import CoinType, PriceScale
+from exceptions import OrderValidationException
 from schemas import SocketOperation, Order
+from schemas.setting import MAX_OPEN_ORDERS
 from services.bot import Side
+from core.clock import Clock, system_clock
 from core.log import logger
+from core.metrics import registry
+from services.balance import BalanceService
+from services.bot.ladder import GridLadder, LadderAction, LadderActionKind
+from services.bot.order_reconciler import OrderReconciler
+from services.bot.order_store import OrderStore, OrderRecord
 from services.bot.socket_bridges import OrderBridge
+from services.instruments import InstrumentRules
+
+OPEN_ORDERS = registry.gauge("bot_open_orders", "Открытые ордера бота", ("symbol", "side"))
 
 
 class OrderManager:
     on_order_filled: Optional[Callable[[Order], None]]
 
-    __open_orders: List[Order]
+    __open_orders: OrderStore
+    __reconciler: OrderReconciler
     __client: BybitClient
-    __is_first_connect: bool
+    __balances: BalanceService
+    __instrument: Optional[InstrumentRules]
+    __max_open_orders: int
 
     def __init__(
             self,
             client: BybitClient,
             order_bridge: OrderBridge,
             category: str,
-            symbol: str
+            symbol: str,
+            balances: BalanceService,
+            max_open_orders: int = MAX_OPEN_ORDERS,
+            clock: Clock = system_clock
     ):
         self.on_order_filled = None
-        self.__is_first_connect = True
+        self.__instrument = None
+        self.__max_open_orders = max_open_orders
         self.__symbol = symbol
         self.__category = category
         self.__client = client
+        self.__balances = balances
         self.__order_bridge = order_bridge
+        self.__open_orders = OrderStore()
+        self.__reconciler = OrderReconciler(client, self.__open_orders, category, symbol, clock=clock)
+
+        for side in Side:
+            OPEN_ORDERS.labels(symbol, side).set_function(partial(self.__open_orders.count, side))
 
         order_bridge.message_event.subscribe(self.__on_order_state_change)
+        order_bridge.operation_event.subscribe(self.__socket_operation_handler)
 
         self.__reload_open_orders()
 
     @property
-    def open_orders(self):
-        return self.__open_orders
+    def open_orders(self) -> List[OrderRecord]:
+        return self.__open_orders.orders
+
+    def set_instrument(self, instrument: InstrumentRules):
+        self.__instrument = instrument
 
     def place_order(self, **kwargs):
         order = self.__client.place_order(**kwargs)
-        self.__open_orders.append(order)
+        self.__open_orders.add(order)
 
     def cancel_order(self, **kwargs):
         cancel_order_entity = self.__client.cancel_order(**kwargs)
-        self.__open_orders = [order for order in self.__open_orders if order.order_id != cancel_order_entity.order_id]
+        self.__open_orders.remove(cancel_order_entity.order_id)
 
     def place_orders_while_possible(self, **kwargs) -> bool:
+        if not self.__instrument:
+            return self.__place_orders_one_by_one(**kwargs)
+
+        # Ордер, который биржа отклонит по шагу цены или минимальной сумме, не отправляем
+        try:
+            price, qty = self.__instrument.normalize(
+                price=Decimal(str(kwargs["price"])),
+                qty=Decimal(str(kwargs["qty"])),
+                side=kwargs["side"]
+            )
+        except OrderValidationException as ex:
+            logger.warning(ex)
+            return False
+
+        kwargs = {**kwargs, "price": price, "qty": qty}
+        order_count = self.__get_available_order_count(side=kwargs["side"], price=price, qty=qty)
+
+        if order_count <= 0:
+            return False
+
+        category = kwargs.pop("category")
+        try:
+            results = self.__client.place_batch_order(category=category, requests=[kwargs] * order_count)
+        except Exception as ex:
+            logger.warning(f"Ошибка. {ex}")
+            return False
+
+        placed_orders = [order for order in results if order]
+        self.__open_orders.add_many(placed_orders)
+
+        return len(placed_orders) > 0
+
+    def __place_orders_one_by_one(self, **kwargs) -> bool:
         is_success = False
 
-        while True:
+        while len(self.__open_orders) < self.__max_open_orders:
             try:
                 open_order = self.__client.place_order(**kwargs)
-                self.__open_orders.append(open_order)
+                self.__open_orders.add(open_order)
                 is_success = True
             # TODO типизировать ошибку
             except Exception as ex:
                 logger.warning(f"Ошибка. {ex}")
                 return is_success
 
+        return is_success
+
+    def __get_available_order_count(self, side: str, price: Decimal, qty: Decimal) -> int:
+        # На покупку расходуется quote монета, на продажу - base
+        if side == Side.Buy:
+            coin = self.__balances.get(self.__instrument.quote_coin)
+            order_cost = price * qty
+        else:
+            coin = self.__balances.get(self.__instrument.base_coin)
+            order_cost = qty
+
+        if not coin:
+            return 0
+
+        # Средства ограничивают число ордеров только сверху: без лимита весь остаток ушел бы в ордера одной цены
+        return min(int(coin.free // order_cost), self.__max_open_orders - len(self.__open_orders))
+
     def cancel_last_order(self, side: Side):
-        exist_orders = [order for order in self.__open_orders if order.side == side]
+        last_order = self.__open_orders.last(side)
 
-        if not exist_orders:
+        if not last_order:
             return
 
-        cancel_order_id = exist_orders[-1].order_id
-
         try:
-            self.__client.cancel_order(category=self.__category, orderId=cancel_order_id, symbol=self.__symbol)
-            self.__open_orders.remove(exist_orders[-1])
-            logger.info(f"(cancel last order) {exist_orders[-1]}")
+            self.__client.cancel_order(category=self.__category, orderId=last_order.order_id, symbol=self.__symbol)
+            self.__open_orders.remove(last_order.order_id)
+            logger.info("(cancel last order) %s", last_order)
 
         except Exception as ex:
             logger.warning(ex)
 
     def amend_all_orders(self, side: Side, price: Decimal):
-        # Из-за возможных разрывов соединения WebSocket необходимо актуализировать информацию
-        self.__reload_open_orders()
-        amend_orders = [order for order in self.__open_orders if order.side == side]
+        if self.__instrument:
+            price = self.__instrument.quantize_price(price, side)
+
+        # Пропущенные при разрыве соединения изменения восстанавливает OrderReconciler
+        amend_orders = self.__open_orders.by_side(side)
+
+        if not amend_orders:
+            return
+
+        try:
+            results = self.__client.amend_batch_order(
+                category=self.__category,
+                requests=[{"symbol": order.symbol, "orderId": order.order_id, "price": price} for order in amend_orders]
+            )
+        except Exception as ex:
+            logger.warning(ex, exc_info=True)
+            return
+
+        for amend_order, result in zip(amend_orders, results):
+            if result:
+                self.__open_orders.set_price(amend_order.order_id, price)
+
+    # Средства сторон для лестницы: свободный остаток и заблокированное в ордерах этой пары. Ордера других пар
+    # с общей монетой в бюджет не входят
+    def ladder_budgets(self) -> Dict[str, Decimal]:
+        coins = {str(Side.Buy): self.__instrument.quote_coin, str(Side.Sell): self.__instrument.base_coin}
+
+        budgets = {}
+        for side, coin in coins.items():
+            own_locked = GridLadder.locked(side, self.__open_orders.by_side(side))
+            budgets[side] = GridLadder.budget(self.__balances.get(coin), own_locked)
+
+        return budgets
+
+    # Отмены первыми: освобожденные средства нужны переносам и новым ордерам. Неудачная отмена или перенос
+    # значит, что ордер уже закрыт, а его кадр еще в очереди: список перечитывается с биржи, иначе следующая
+    # сверка лестницы повторила бы те же действия
+    def apply_ladder(self, actions: List[LadderAction], scale: PriceScale, qty: Decimal):
+        cancels = [action for action in actions if action.kind == LadderActionKind.Cancel]
+        amends = [action for action in actions if action.kind == LadderActionKind.Amend]
+        places = [action for action in actions if action.kind == LadderActionKind.Place]
+        logger.info("(ladder) place:%s amend:%s cancel:%s", len(places), len(amends), len(cancels))
+        is_stale = False
+
+        if cancels:
+            try:
+                results = self.__client.cancel_batch_order(
+                    category=self.__category,
+                    requests=[{"symbol": self.__symbol, "orderId": action.order_id} for action in cancels]
+                )
+            except Exception as ex:
+                logger.warning(ex, exc_info=True)
+                results = []
+
+            for action, result in zip(cancels, results):
+                if result:
+                    self.__open_orders.remove(action.order_id)
+            is_stale = sum(map(bool, results)) < len(cancels)
 
-        for amend_order in amend_orders:
+        if amends:
             try:
-                self.__client.amend_order(
-                    symbol=amend_order.symbol,
+                results = self.__client.amend_batch_order(
                     category=self.__category,
-                    orderId=amend_order.order_id,
-                    price=price
+                    requests=[{"symbol": self.__symbol, "orderId": action.order_id,
+                               "price": scale.to_price(action.price)} for action in amends]
                 )
-                amend_order.price = price
             except Exception as ex:
                 logger.warning(ex, exc_info=True)
+                results = []
+
+            for action, result in zip(amends, results):
+                if result:
+                    self.__open_orders.set_price(action.order_id, scale.to_price(action.price))
+            is_stale = is_stale or sum(map(bool, results)) < len(amends)
+
+        if is_stale:
+            self.__resync_open_orders()
+
+        requests = []
+        for action in places:
+            price = scale.to_price(action.price)
+            # Уровень, который биржа отклонит по минимальной сумме, не отправляем
+            try:
+                if self.__instrument:
+                    self.__instrument.validate(price, qty)
+            except OrderValidationException as ex:
+                logger.warning(ex)
+                continue
+
+            requests.append({"symbol": self.__symbol, "side": str(action.side), "price": price, "qty": qty,
+                             "orderType": "Limit", "timeInForce": "GTC"})
+
+        if requests:
+            try:
+                results = self.__client.place_batch_order(category=self.__category, requests=requests)
+            except Exception as ex:
+                logger.warning(f"Ошибка. {ex}")
+                return
+
+            self.__open_orders.add_many(order for order in results if order)
 
     def exit(self):
         self.on_order_filled = None
+        self.__order_bridge.message_event.unsubscribe(self.__on_order_state_change)
+        self.__order_bridge.operation_event.unsubscribe(self.__socket_operation_handler)
+        for side in Side:
+            OPEN_ORDERS.remove(self.__symbol, side)
 
     def sell_all(self, price_per_unit: Decimal, symbol: str):
-        coins_names = [member.value for name, member in CoinType.__members__.items()]
-        matches = []
-        for coin_name in coins_names:
-            if coin_name in symbol:
-                matches.append(coin_name)
-
-        if len(matches) != 2:
-            raise ValueError()
-
-        if symbol.index(matches[0]) == 0:
-            base_coin = matches[0]
-        else:
-            base_coin = matches[1]
+        base_coin = self.__instrument.base_coin if self.__instrument else self.__get_base_coin(symbol)
 
-        self.__client.cancel_all_orders(category=self.__category)
-        self.__open_orders = list()
-        base_coin_balance = self.__client.wallet_balance(base_coin)
+        self.__client.cancel_all_orders(category=self.__category, symbol=self.__symbol)
+        self.__open_orders.clear()
+        base_coin_balance = self.__balances.get(base_coin)
 
         if not base_coin_balance:
             return
 
+        price, qty = price_per_unit, base_coin_balance.wallet_balance
+        if self.__instrument:
+            # Остаток меньше минимального ордера биржа не примет: повторы бесполезны
+            try:
+                price, qty = self.__instrument.normalize(price, qty, Side.Sell)
+            except OrderValidationException as ex:
+                logger.warning(ex)
+                return
+
         MAX_RETRY_COUNT = 20
         retry_count = 0
 
@@ -127,11 +290,11 @@ class OrderManager:
                     symbol=self.__symbol,
                     orderType="Limit",
                     category=self.__category,
-                    price=price_per_unit,
-                    qty=base_coin_balance.wallet_balance,
+                    price=price,
+                    qty=qty,
                     side=Side.Sell
                 )
-                self.__open_orders = [placed_order]
+                self.__open_orders.add(placed_order)
                 break
             except Exception as ex:
                 logger.warning(ex)
@@ -139,43 +302,49 @@ class OrderManager:
             finally:
                 retry_count += 1
 
+    @staticmethod
+    def __get_base_coin(symbol: str) -> str:
+        coins_names = [member.value for name, member in CoinType.__members__.items()]
+        matches = []
+        for coin_name in coins_names:
+            if coin_name in symbol:
+                matches.append(coin_name)
 
-    def __on_order_state_change(self, orders: [Order]):
-        # for order in orders:
-        #     if order.status == OrderStatus.Filled:
-        #         self.__open_orders = [item for item in self.__open_orders if item.order_id != order.order_id]
-        #         self.on_order_filled(order)
+        if len(matches) != 2:
+            raise ValueError()
 
-        # TODO заплатка
-        for order in orders:
-            if order.status == OrderStatus.Filled:
-                self.__open_orders = [item for item in self.__open_orders if item.order_id != order.order_id]
-                self.on_order_filled(order)
-            break
+        if symbol.index(matches[0]) == 0:
+            return matches[0]
+        return matches[1]
 
-    def __reload_open_orders(self):
-        self.__open_orders = self.__client.get_open_orders(category=self.__category, symbol=self.__symbol)
+    def __on_order_state_change(self, orders: List[Order]):
+        self.__apply_orders(self.__reconciler.observe(orders))
 
-    def __order_stream_handler(self, orders: [Order]):
-        for order in orders:
-            is_order_filled = order.status == OrderStatus.Filled
-            is_order_canceled = order.status == OrderStatus.Cancelled
+    def __apply_orders(self, orders: List[Order]):
+        # Сначала применяется весь кадр, затем уведомления: обработчик видит актуальный список ордеров
+        for order in self.__open_orders.apply(orders):
+            if self.on_order_filled:
+                self.on_order_filled(order)
 
-            if is_order_filled or is_order_canceled:
-                self.__open_orders = [item for item in self.__open_orders if item.order_id != order.order_id]
+    def __reload_open_orders(self):
+        self.__open_orders.replace_all(self.__client.get_open_orders(category=self.__category, symbol=self.__symbol))
 
-            if is_order_filled and self.on_order_filled:
-                self.on_order_filled(order)
-            break # TODO заплатка
+    def __resync_open_orders(self):
+        try:
+            self.__reload_open_orders()
+        except Exception as ex:
+            logger.warning(f"(ladder) Ошибка загрузки открытых ордеров. {ex}")
 
     def __socket_operation_handler(self, operation: SocketOperation):
         is_success_subscription = operation.op == "subscribe" and operation.success is True
 
-        if is_success_subscription and not self.__is_first_connect:
-            self.__reload_open_orders()
-
+        # Сверка дешевая: запрашивается только история с последнего известного изменения,
+        # поэтому выполняется на каждую успешную подписку, включая первую
         if is_success_subscription:
-            self.__is_first_connect = False
+            try:
+                self.__apply_orders(self.__reconciler.reconcile())
+            except Exception as ex:
+                logger.warning(f"(reconcile) Ошибка сверки ордеров. {ex}")
 
     def __del__(self):
         self.exit()
@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Iterable, List, Optional
+
+from core.clock import Clock, system_clock
+from core.log import logger
+from schemas.order import Order
+from services.bot.order_store import OrderStore, CLOSED_STATUSES
+
+# Запас на расхождение часов и задержку публикации истории на бирже, мс
+RECONCILE_MARGIN_MS = 5_000
+# История ордеров Bybit доступна за 7 дней: при более долгом разрыве - полная перезагрузка
+HISTORY_WINDOW_MS = 7 * 24 * 60 * 60 * 1000
+# Сколько закрытых ордеров помнить, чтобы не уведомлять об исполнении повторно
+CLOSED_ORDERS_LIMIT = 1024
+
+
+class OrderReconciler:
+    # Отслеживает updatedTime ордеров пары. После переподключения запрашивает только историю
+    # с момента последнего известного изменения и возвращает пропущенные обновления
+    __client: object
+    __store: OrderStore
+    __category: str
+    __symbol: str
+    __versions: Dict[str, int]
+    __closed: 'OrderedDict[str, int]'
+    __watermark: int
+    __clock: Clock
+    __lock: Lock
+
+    # clock - источник времени для водяной отметки: в replay это время записи, как у updatedTime ордеров
+    def __init__(
+            self,
+            client,
+            store: OrderStore,
+            category: str,
+            symbol: str,
+            watermark: Optional[int] = None,
+            clock: Clock = system_clock
+    ):
+        self.__client = client
+        self.__store = store
+        self.__category = category
+        self.__symbol = symbol
+        self.__versions = {}
+        self.__closed = OrderedDict()
+        self.__clock = clock
+        self.__watermark = watermark if watermark is not None else self.__now_ms()
+        self.__lock = Lock()
+
+    @property
+    def watermark(self) -> int:
+        return self.__watermark
+
+    # Отбрасывает устаревшие и повторные обновления, запоминает updatedTime остальных
+    def observe(self, orders: Iterable[Order]) -> List[Order]:
+        result = []
+
+        with self.__lock:
+            for order in orders:
+                updated_time = order.updated_time or 0
+
+                if order.order_id in self.__closed:
+                    continue
+                if updated_time < self.__versions.get(order.order_id, 0):
+                    continue
+
+                if order.status in CLOSED_STATUSES:
+                    self.__versions.pop(order.order_id, None)
+                    self.__closed[order.order_id] = updated_time
+                    if len(self.__closed) > CLOSED_ORDERS_LIMIT:
+                        self.__closed.popitem(last=False)
+                else:
+                    self.__versions[order.order_id] = updated_time
+
+                if updated_time > self.__watermark:
+                    self.__watermark = updated_time
+
+                result.append(order)
+
+        return result
+
+    # Возвращает синтетические обновления за время разрыва; применять их нужно так же, как кадры сокета
+    def reconcile(self) -> List[Order]:
+        now = self.__now_ms()
+        since = self.__watermark - RECONCILE_MARGIN_MS
+
+        if now - since > HISTORY_WINDOW_MS:
+            logger.warning("(reconcile) %s разрыв дольше окна истории, полная перезагрузка", self.__symbol)
+            self.__store.replace_all(self.__client.get_open_orders(category=self.__category, symbol=self.__symbol))
+            return []
+
+        history = self.__client.get_order_history(symbol=self.__symbol, category=self.__category, start_time=since)
+        history.sort(key=lambda item: item.updated_time or 0)
+
+        missed = self.observe([order for order in history if self.__is_missed(order)])
+        logger.info("(reconcile) %s с %s: получено %s, пропущено %s", self.__symbol, since, len(history), len(missed))
+
+        return missed
+
+    def __now_ms(self) -> int:
+        return int(self.__clock.time() * 1000)
+
+    # Событие нужно только для расхождений с локальным состоянием.
+    # Закрытый ордер, которого нет в хранилище, уже обработан или не относится к боту
+    def __is_missed(self, order: Order) -> bool:
+        record = self.__store.get(order.order_id)
+
+        if record is None:
+            return order.status not in CLOSED_STATUSES
+        return record.status != order.status or record.price != order.price or record.qty != order.qty
+
+
+__all__ = ["OrderReconciler", "RECONCILE_MARGIN_MS", "HISTORY_WINDOW_MS"]
@@ -0,0 +1,185 @@
+from decimal import Decimal
+from threading import RLock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from domain_models import OrderStatus
+from schemas.order import Order
+
+# Статусы, после которых ордер больше не стоит в книге
+CLOSED_STATUSES = frozenset(status.value for status in (
+    OrderStatus.Filled,
+    OrderStatus.Cancelled,
+    OrderStatus.PartiallyFilledCanceled,
+    OrderStatus.Rejected,
+    OrderStatus.Deactivated
+))
+
+
+class OrderRecord:
+    __slots__ = ("order_id", "symbol", "side", "price", "qty", "status")
+
+    order_id: str
+    symbol: str
+    side: str
+    price: Decimal
+    qty: Decimal
+    status: str
+
+    def __init__(self, order_id: str, symbol: str, side: str, price: Decimal, qty: Decimal, status: str):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.side = side
+        self.price = price
+        self.qty = qty
+        self.status = status
+
+    @staticmethod
+    def from_order(order: Order) -> 'OrderRecord':
+        return OrderRecord(order.order_id, order.symbol, str(order.side), order.price, order.qty, order.status)
+
+    def __repr__(self):
+        return (f"OrderRecord(order_id={self.order_id}, symbol={self.symbol}, side={self.side}, "
+                f"price={self.price}, qty={self.qty}, status={self.status})")
+
+
+class OrderStore:
+    # Открытые ордера пары с индексами по id, стороне и ценовому уровню.
+    # Словари сохраняют порядок вставки: последний ордер стороны - последний ключ
+    __orders: Dict[str, OrderRecord]
+    __by_side: Dict[str, Dict[str, OrderRecord]]
+    __by_price: Dict[Tuple[str, Decimal], Dict[str, OrderRecord]]
+    __lock: RLock
+
+    def __init__(self):
+        self.__orders = {}
+        self.__by_side = {}
+        self.__by_price = {}
+        self.__lock = RLock()
+
+    def __len__(self) -> int:
+        return len(self.__orders)
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self.__orders
+
+    @property
+    def orders(self) -> List[OrderRecord]:
+        with self.__lock:
+            return list(self.__orders.values())
+
+    def get(self, order_id: str) -> Optional[OrderRecord]:
+        return self.__orders.get(order_id)
+
+    def count(self, side: str) -> int:
+        return len(self.__by_side.get(str(side), ()))
+
+    def by_side(self, side: str) -> List[OrderRecord]:
+        with self.__lock:
+            return list(self.__by_side.get(str(side), {}).values())
+
+    def at_price(self, side: str, price: Decimal) -> List[OrderRecord]:
+        with self.__lock:
+            return list(self.__by_price.get((str(side), price), {}).values())
+
+    def last(self, side: str) -> Optional[OrderRecord]:
+        with self.__lock:
+            orders = self.__by_side.get(str(side))
+            if not orders:
+                return None
+            return orders[next(reversed(orders))]
+
+    def add(self, order: Order) -> OrderRecord:
+        with self.__lock:
+            return self.__upsert(order)
+
+    def add_many(self, orders: Iterable[Order]):
+        with self.__lock:
+            for order in orders:
+                self.__upsert(order)
+
+    def remove(self, order_id: str) -> Optional[OrderRecord]:
+        with self.__lock:
+            record = self.__orders.pop(order_id, None)
+            if record:
+                self.__unindex(record)
+            return record
+
+    def set_price(self, order_id: str, price: Decimal):
+        with self.__lock:
+            record = self.__orders.get(order_id)
+            if record is None or record.price == price:
+                return
+
+            self.__unindex_price(record)
+            record.price = price
+            self.__index_price(record)
+
+    def replace_all(self, orders: Iterable[Order]):
+        with self.__lock:
+            self.clear()
+            self.add_many(orders)
+
+    def clear(self):
+        with self.__lock:
+            self.__orders = {}
+            self.__by_side = {}
+            self.__by_price = {}
+
+    # Применяет пачку обновлений из топика order за O(k); возвращает исполненные ордера
+    def apply(self, orders: Iterable[Order]) -> List[Order]:
+        filled = []
+
+        with self.__lock:
+            for order in orders:
+                if order.status in CLOSED_STATUSES:
+                    record = self.__orders.pop(order.order_id, None)
+                    if record:
+                        self.__unindex(record)
+                else:
+                    self.__upsert(order)
+
+                if order.status == OrderStatus.Filled:
+                    filled.append(order)
+
+        return filled
+
+    def __upsert(self, order: Order) -> OrderRecord:
+        record = self.__orders.get(order.order_id)
+
+        if record is None:
+            record = OrderRecord.from_order(order)
+            self.__orders[record.order_id] = record
+            self.__by_side.setdefault(record.side, {})[record.order_id] = record
+            self.__index_price(record)
+            return record
+
+        if record.price != order.price:
+            self.__unindex_price(record)
+            record.price = order.price
+            self.__index_price(record)
+
+        record.qty = order.qty
+        record.status = order.status
+        return record
+
+    def __unindex(self, record: OrderRecord):
+        orders = self.__by_side.get(record.side)
+        if orders is not None:
+            orders.pop(record.order_id, None)
+        self.__unindex_price(record)
+
+    def __index_price(self, record: OrderRecord):
+        self.__by_price.setdefault((record.side, record.price), {})[record.order_id] = record
+
+    def __unindex_price(self, record: OrderRecord):
+        key = (record.side, record.price)
+        orders = self.__by_price.get(key)
+        if orders is None:
+            return
+
+        orders.pop(record.order_id, None)
+        if not orders:
+            del self.__by_price[key]
+
+
+__all__ = ["OrderStore", "OrderRecord", "CLOSED_STATUSES"]
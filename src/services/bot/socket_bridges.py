@@ -1,9 +1,22 @@
 from abc import ABC, abstractmethod
+from threading import Event as ThreadingEvent, Lock
+from typing import Callable, Hashable, Optional
 
 from pybit.unified_trading import WebSocket
 from api import BybitClient
+from api.bybit_client.websockets import WebsocketBase
+from core.actor import Actor, inline_actor
+from core.clock import Clock, TimerHandle, system_clock
+from core.log import logger
 from core.event import Event
-from schemas import Ticker, Orderbook, Order
+from domain_models import PriceScale
+from schemas import Ticker, OrderbookUpdate, Order, SocketOperation
+from services.orderbook import LocalOrderbook
+from services.socket_hub import SocketHub, get_socket_hub
+
+# Пауза перед повторной переподпиской, пока снимок стакана не пришел, сек; удваивается до RESYNC_MAX_DELAY
+RESYNC_DELAY = 1.0
+RESYNC_MAX_DELAY = 30.0
 
 
 class SocketBridgeBase(ABC):
@@ -13,17 +26,67 @@ class SocketBridgeBase(ABC):
     _symbol: str
     _channel_type: str
     _client: BybitClient
+    _hub: SocketHub
+    _conflate: bool
+    _actor: Actor
+    _price_scale: Optional[PriceScale]
+
+    __stream: Optional[WebsocketBase]
+    __handler: Optional[Callable]
+    __operation_handler: Optional[Callable[[SocketOperation], None]]
 
-    def __init__(self, symbol: str, category: str, client: BybitClient):
+    # conflate: подписчики пропускают устаревшие значения. С actor устаревшее событие заменяется в его очереди,
+    # без actor - подписчики работают в своих потоках (см. Event)
+    # actor: поток, в котором вызываются подписчики; по умолчанию - поток сокета
+    # price_scale: цены сообщений пары в тиках инструмента, без шкалы - Decimal
+    def __init__(
+            self,
+            symbol: str,
+            category: str,
+            client: BybitClient,
+            conflate: bool = False,
+            actor: Optional[Actor] = None,
+            price_scale: Optional[PriceScale] = None
+    ):
         self._symbol = symbol
         self._channel_type = category
         self._client = client
+        self._conflate = conflate
+        self._actor = actor or inline_actor
+        self._price_scale = price_scale
+        self._hub = get_socket_hub(client)
+        self.__stream = None
+        self.__handler = None
+        self.__operation_handler = None
         self._impl()
 
     def exit(self):
-        self._socket.exit()
+        if self.__stream:
+            self._hub.unsubscribe(
+                self.__stream, self._channel_type, self._symbol, self.__handler, self.__operation_handler
+            )
+            self.__stream = None
         self._message_event.clear_subscribers()
 
+    # Соединение канала общее для всех мостов клиента: подписывается только топик пары
+    def _subscribe(
+            self,
+            stream: WebsocketBase,
+            handler: Callable,
+            operation_handler: Optional[Callable[[SocketOperation], None]] = None
+    ):
+        self.__stream = stream
+        self.__handler = handler
+        self.__operation_handler = operation_handler
+        if self._price_scale:
+            stream.set_price_scale(self._symbol, self._price_scale)
+        self._socket = self._hub.subscribe(stream, self._channel_type, self._symbol, handler, operation_handler)
+
+    # Топик пары подписывается заново, например чтобы получить свежий снимок стакана
+    def _resubscribe(self):
+        if self.__stream:
+            self._hub.resubscribe(self.__stream, self._channel_type, self._symbol)
+
     @abstractmethod
     def _impl(self):
         pass
@@ -32,6 +95,14 @@ class SocketBridgeBase(ABC):
     def symbol(self) -> str:
         return self._symbol
 
+    @property
+    def price_scale(self) -> Optional[PriceScale]:
+        return self._price_scale
+
+    @property
+    def _is_event_conflating(self) -> bool:
+        return self._conflate and self._actor.is_inline
+
     # @property
     # def category(self):
     #     return self._category
@@ -44,51 +115,150 @@ class TickerEvent(Event[Ticker]):
 class TickerBridge(SocketBridgeBase):
     _message_event: TickerEvent
 
+    __key: Optional[Hashable]
+
     @property
     def message_event(self) -> TickerEvent:
         return self._message_event
 
     def __handler(self, message: Ticker):
-        self._message_event._fire(message)
+        self._actor.post("ticker", self._message_event._fire, message, key=self.__key)
 
     def _impl(self):
-        self._socket = self._client.websocket.ticker.stream(self._symbol, self._channel_type, self.__handler)
-        self._message_event = TickerEvent()
+        self._message_event = TickerEvent(conflate=self._is_event_conflating)
+        self.__key = ("ticker", self._symbol) if self._conflate else None
+        self._subscribe(self._client.websocket.ticker, self.__handler)
 
 
 class OrderEvent(Event[Order]):
     pass
 
 
+class SocketOperationEvent(Event[SocketOperation]):
+    pass
+
+
 class OrderBridge(SocketBridgeBase):
     _message_event: OrderEvent
 
+    __operation_event: SocketOperationEvent
+
     @property
     def message_event(self) -> OrderEvent:
         return self._message_event
 
+    # Служебные сообщения соединения (auth, subscribe): переподписка после разрыва
+    @property
+    def operation_event(self) -> SocketOperationEvent:
+        return self.__operation_event
+
+    def exit(self):
+        super().exit()
+        self.__operation_event.clear_subscribers()
+
+    # Ордера не объединяются: каждое изменение статуса должно дойти до OrderManager
     def __handler(self, orders: [Order]):
-        self._message_event._fire(orders)
+        self._actor.post("order", self._message_event._fire, orders)
+
+    def __operation_handler(self, operation: SocketOperation):
+        self._actor.post("operation", self.__operation_event._fire, operation)
 
     def _impl(self):
-        self._socket = self._client.websocket.order.stream(self._symbol, self._channel_type, self.__handler)
         self._message_event = OrderEvent()
+        self.__operation_event = SocketOperationEvent()
+        self._subscribe(self._client.websocket.order, self.__handler, self.__operation_handler)
 
 
-class OrderbookEvent(Event[Orderbook]):
+class OrderbookEvent(Event[LocalOrderbook]):
     pass
 
 
 class OrderbookBridge(SocketBridgeBase):
     _message_event: OrderbookEvent
 
+    __book: LocalOrderbook
+    __ready: ThreadingEvent
+    __key: Hashable
+    __clock: Clock
+    __resync_timer: Optional[TimerHandle]
+    __resync_delay: float
+    __resync_lock: Lock
+    __is_exited: bool
+
+    # clock: таймеры повторной переподписки после пропуска обновлений
+    def __init__(
+            self,
+            symbol: str,
+            category: str,
+            client: BybitClient,
+            conflate: bool = False,
+            actor: Optional[Actor] = None,
+            price_scale: Optional[PriceScale] = None,
+            clock: Clock = system_clock
+    ):
+        self.__clock = clock
+        self.__resync_timer = None
+        self.__resync_delay = RESYNC_DELAY
+        self.__resync_lock = Lock()
+        self.__is_exited = False
+        super().__init__(symbol, category, client, conflate, actor, price_scale)
+
     @property
     def message_event(self) -> OrderbookEvent:
         return self._message_event
 
-    def __handler(self, message: Orderbook):
-        self._message_event._fire(message)
+    @property
+    def book(self) -> LocalOrderbook:
+        return self.__book
+
+    def wait_ready(self, timeout: float) -> bool:
+        return self.__ready.wait(timeout)
+
+    def exit(self):
+        with self.__resync_lock:
+            self.__is_exited = True
+            self.__cancel_resync()
+        super().exit()
+
+    def __handler(self, message: OrderbookUpdate):
+        was_synced = self.__book.is_synced
+        if not self.__book.apply(message):
+            # Пропуск обновлений: снимок для восстановления книги биржа пришлет на новую подписку
+            if was_synced and not self.__book.is_synced:
+                with self.__resync_lock:
+                    self.__cancel_resync()
+                    self.__resync_delay = RESYNC_DELAY
+                self.__resync()
+            return
+
+        self.__ready.set()
+        self._actor.post("orderbook", self._message_event._fire, self.__book, key=self.__key)
+
+    # Переподписка повторяется с растущей паузой, пока книга не получит снимок: ошибка переподписки
+    # или потерянный ответ биржи иначе оставили бы стакан несинхронизированным, а триггер - без событий
+    def __resync(self):
+        with self.__resync_lock:
+            self.__resync_timer = None
+            if self.__book.is_synced or self.__is_exited:
+                return
+
+            delay = self.__resync_delay
+            self.__resync_delay = min(delay * 2, RESYNC_MAX_DELAY)
+            self.__resync_timer = self.__clock.call_later(delay, self.__resync)
+
+        logger.info(f"(orderbook {self._symbol}) переподписка для снимка, следующая проверка через {delay} сек")
+        self._resubscribe()
+
+    def __cancel_resync(self):
+        if self.__resync_timer:
+            self.__resync_timer.cancel()
+            self.__resync_timer = None
 
     def _impl(self):
-        self._socket = self._client.websocket.orderbook.stream(self._symbol, self._channel_type, self.__handler)
-        self._message_event = OrderbookEvent()
+        self.__book = LocalOrderbook(self._symbol)
+        self.__ready = ThreadingEvent()
+        self._message_event = OrderbookEvent(conflate=self._is_event_conflating)
+        # Событие несет сам стакан, а не снимок: ждущее в очереди actor событие уже увидит последнее состояние,
+        # поэтому повторные события стакана не ставятся
+        self.__key = ("orderbook", self._symbol)
+        self._subscribe(self._client.websocket.orderbook, self.__handler)
@@ -1,16 +1,21 @@
 from abc import ABC, abstractmethod
-from datetime import datetime
 from decimal import Decimal
-from threading import Timer
 from typing import Optional, Callable
 
+from core.clock import Clock, TimerHandle, system_clock
+from core.metrics import registry
+from core.tracing import tracer
+from domain_models import AverageMode, PriceScale
 from exceptions import WithoutTradeRangeException
 from schemas import Ticker
-from schemas.orderbook import Orderbook
 from services.bot import Side, TradeRange
+from services.orderbook import LocalOrderbook
 from services.bot.socket_bridges import TickerBridge, OrderbookBridge
 from core.log import logger
 
+TRIGGER_EVENTS = registry.counter("bot_trigger_events_total", "Запуски, сбросы и срабатывания триггеров",
+                                  ("symbol", "trigger", "event"))
+
 
 class TradeTriggerBase(ABC):
     on_triggered: Optional[Callable[[Side], None]]
@@ -26,12 +31,78 @@ class TradeTriggerBase(ABC):
     def reset(self):
         pass
 
+    # Триггер пары снимается: обработчик отключается, таймер отменяется
+    def exit(self):
+        self.on_triggered = None
+        self.reset()
+
+
+class PriceWindow:
+    # Агрегаты окна триггера за O(1) памяти: цены не накапливаются. Цены - целые тики шкалы пары,
+    # сумма окна остается целой, Decimal нужен только для средних
+    __slots__ = ("count", "total", "low", "high", "last", "__start_time", "__last_time", "__weighted_total")
+
+    count: int
+    total: int
+    low: Optional[int]
+    high: Optional[int]
+    last: Optional[int]
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.total = 0
+        self.low = None
+        self.high = None
+        self.last = None
+        self.__start_time = 0.0
+        self.__last_time = 0.0
+        self.__weighted_total = Decimal(0)
+
+    def push(self, price: int, timestamp: float):
+        if self.count == 0:
+            self.__start_time = timestamp
+            self.low = price
+            self.high = price
+        else:
+            # Предыдущая цена действовала до текущего момента
+            self.__weighted_total += self.last * self.__elapsed(self.__last_time, timestamp)
+            self.low = min(self.low, price)
+            self.high = max(self.high, price)
+
+        self.__last_time = max(self.__last_time, timestamp)
+        self.count += 1
+        self.total += price
+        self.last = price
+
+    # Средние - в тиках, дробные
+    def average(self) -> Decimal:
+        return Decimal(self.total) / self.count
+
+    def time_weighted_average(self, timestamp: float) -> Decimal:
+        duration = self.__elapsed(self.__start_time, timestamp)
+        if duration <= 0:
+            return Decimal(self.last)
+
+        weighted_total = self.__weighted_total + self.last * self.__elapsed(self.__last_time, timestamp)
+        return weighted_total / duration
+
+    @staticmethod
+    def __elapsed(start: float, end: float) -> Decimal:
+        return Decimal(str(max(end - start, 0.0)))
+
 
 class TimeRangeTrigger(TradeTriggerBase):
     __top_range: TradeRange
     __bottom_range: TradeRange
-    __timer: Optional[Timer]
-    __values: list[Decimal]
+    __scale: PriceScale
+    __timer: Optional[TimerHandle]
+    __clock: Clock
+    __ticker_bridge: TickerBridge
+    __window: PriceWindow
+    __average_mode: AverageMode
     __trigger_duration_buy: int
     __side: Side
 
@@ -40,88 +111,118 @@ class TimeRangeTrigger(TradeTriggerBase):
             target_range: TradeRange,
             trigger_duration_buy: int,
             trigger_duration_sell: int,
-            ticker_bridge: TickerBridge
+            ticker_bridge: TickerBridge,
+            clock: Clock = system_clock,
+            average_mode: AverageMode = AverageMode.Simple
     ):
         super().__init__()
         self.on_triggered = None
         self.__timer = None
-        self.__values = list()
+        self.__clock = clock
+        self.__window = PriceWindow()
+        self.__average_mode = average_mode
         self.__trigger_duration_buy = trigger_duration_buy
         self.__trigger_duration_sell = trigger_duration_sell
         self.__side = Side.Buy
+        self.__started_metric = TRIGGER_EVENTS.labels(ticker_bridge.symbol, "time_range", "start")
+        self.__reset_metric = TRIGGER_EVENTS.labels(ticker_bridge.symbol, "time_range", "reset")
+        self.__fired_metric = TRIGGER_EVENTS.labels(ticker_bridge.symbol, "time_range", "fire")
         self.set_range_and_restart(target_range)
+        self.__ticker_bridge = ticker_bridge
         ticker_bridge.message_event.subscribe(self.__push)
 
+    def exit(self):
+        self.__ticker_bridge.message_event.unsubscribe(self.__push)
+        super().exit()
+
+    # Тикер должен приходить в тиках шкалы target_range (TickerBridge с price_scale)
     def set_range_and_restart(self, target_range: TradeRange):
-        accept_height = target_range.height
-        r_top_top = target_range.sell + accept_height
+        scale = target_range.scale
+        accept_height = target_range.height_ticks
+        r_top_top = target_range.sell_ticks + accept_height
         r_top_bottom = r_top_top - accept_height
-        self.__top_range = TradeRange(r_top_bottom, r_top_top)
-        r_bottom_top = target_range.buy
+        self.__top_range = TradeRange.from_ticks(r_top_bottom, r_top_top, scale)
+        r_bottom_top = target_range.buy_ticks
         r_bottom_bottom = r_bottom_top - accept_height
-        self.__bottom_range = TradeRange(r_bottom_bottom, r_bottom_top)
-        logger.info(f"{datetime.now()} SET TRIGGER AREA "
-                    f"BUY [{r_top_top},{r_top_bottom}] "
-                    f"SELL [{r_bottom_bottom} out:{r_bottom_top}]")
+        self.__bottom_range = TradeRange.from_ticks(r_bottom_bottom, r_bottom_top, scale)
+        self.__scale = scale
+        logger.info(f"{self.__clock.now()} SET TRIGGER AREA "
+                    f"BUY [{self.__top_range.sell},{self.__top_range.buy}] "
+                    f"SELL [{self.__bottom_range.buy} out:{self.__bottom_range.sell}]")
         self.reset()
 
+    @tracer.traced("trigger.time_range.push")
     def __push(self, ticker: Ticker):
+        price = ticker.last_price
         is_trigger_start = self.__timer is not None
         if is_trigger_start:
-            self.__values.append(ticker.last_price)
+            self.__window.push(price, self.__clock.time())
 
         if not is_trigger_start:
-            is_trigger_area = ticker.last_price >= self.__top_range.sell or ticker.last_price <= self.__bottom_range.buy
+            is_trigger_area = price >= self.__top_range.sell_ticks or price <= self.__bottom_range.buy_ticks
 
             if is_trigger_area:
-                self.__values = list()
+                self.__window.clear()
 
-                if ticker.last_price >= self.__top_range.buy:
+                if price >= self.__top_range.buy_ticks:
                     self.__side = Side.Sell
                     trigger_duration = self.__trigger_duration_sell
                 else:
                     self.__side = Side.Buy
                     trigger_duration = self.__trigger_duration_buy
 
-                self.__values.append(ticker.last_price)
-                self.__timer = Timer(trigger_duration, self.__trigger)
-                self.__timer.start()
+                self.__window.push(price, self.__clock.time())
+                self.__timer = self.__clock.call_later(trigger_duration, self.__trigger)
+                self.__started_metric.inc()
                 logger.info(f"TRIGGER TIME START\n"
-                            f"side:{self.__side.value} price:{ticker.last_price}")
+                            f"side:{self.__side.value} price:{self.__scale.to_price(price)}")
 
-        is_outside_top_trigger_area = self.__side == Side.Sell and ticker.last_price < self.__top_range.buy
-        is_outside_bottom_trigger_area = self.__side == Side.Buy and ticker.last_price > self.__bottom_range.sell
+        is_outside_top_trigger_area = self.__side == Side.Sell and price < self.__top_range.buy_ticks
+        is_outside_bottom_trigger_area = self.__side == Side.Buy and price > self.__bottom_range.sell_ticks
         if is_trigger_start and (is_outside_top_trigger_area or is_outside_bottom_trigger_area):
             logger.info(f"TRIGGER TIME STOP "
-                        f"side:{self.__side.value} price:{ticker.last_price}")
+                        f"side:{self.__side.value} price:{self.__scale.to_price(price)}")
+            self.__reset_metric.inc()
             self.reset()
 
+    @tracer.traced("trigger.time_range.validate")
     def __trigger(self):
-        average_price = sum(self.__values) / len(self.__values)
+        if self.__average_mode == AverageMode.TimeWeighted:
+            average_price = self.__window.time_weighted_average(self.__clock.time())
+        else:
+            average_price = self.__window.average()
+
+        scale = self.__scale
         logger.info("TRIGGER TIME VALIDATE "
-                    f"average_price:{average_price}")
+                    f"average_price:{scale.to_price(average_price)} mode:{self.__average_mode} "
+                    f"low:{scale.to_price(self.__window.low)} high:{scale.to_price(self.__window.high)} "
+                    f"last:{scale.to_price(self.__window.last)} count:{self.__window.count}")
 
         if self.__side == Side.Sell:
-            offset_top = self.__top_range.sell - average_price
-            offset_bottom = average_price - self.__top_range.buy
+            offset_top = self.__top_range.sell_ticks - average_price
+            offset_bottom = average_price - self.__top_range.buy_ticks
 
-            if offset_top < offset_bottom or average_price >= self.__top_range.sell:
+            if offset_top < offset_bottom or average_price >= self.__top_range.sell_ticks:
                 if self.on_triggered:
+                    self.__fired_metric.inc()
                     self.on_triggered(self.__side)
                     logger.info("TRIGGER TIME SUCCESS "
-                                f"average_price:{average_price}")
+                                f"average_price:{scale.to_price(average_price)}")
                     self.reset()
             else:
+                self.__reset_metric.inc()
                 self.reset()
         else:
-            offset_top = self.__bottom_range.sell - average_price
-            offset_bottom = average_price - self.__bottom_range.buy
+            offset_top = self.__bottom_range.sell_ticks - average_price
+            offset_bottom = average_price - self.__bottom_range.buy_ticks
 
-            if offset_bottom < offset_top or average_price < self.__bottom_range.buy:
+            if offset_bottom < offset_top or average_price < self.__bottom_range.buy_ticks:
                 if self.on_triggered:
+                    self.__fired_metric.inc()
                     self.on_triggered(self.__side)
                     self.reset()
             else:
+                self.__reset_metric.inc()
                 self.reset()
 
     def reset(self):
@@ -129,7 +230,7 @@ class TimeRangeTrigger(TradeTriggerBase):
         if self.__timer:
             self.__timer.cancel()
         self.__timer = None
-        self.__values = list()
+        self.__window.clear()
 
 
 class OrderbookTrigger(TradeTriggerBase):
@@ -137,6 +238,7 @@ class OrderbookTrigger(TradeTriggerBase):
     __trade_range: TradeRange
     __min_bid_size: Decimal
     __min_ask_size: Decimal
+    __orderbook_bridge: OrderbookBridge
 
     def __init__(
             self,
@@ -151,11 +253,17 @@ class OrderbookTrigger(TradeTriggerBase):
         self.__is_triggered = False
         self.__min_bid_size = min_bid_size
         self.__min_ask_size = min_ask_size
+        self.__fired_metric = TRIGGER_EVENTS.labels(orderbook_bridge.symbol, "orderbook", "fire")
         self.set_range_and_restart(trade_range)
         self.__trade_range = trade_range
+        self.__orderbook_bridge = orderbook_bridge
 
         orderbook_bridge.message_event.subscribe(self.__orderbook_handler)
 
+    def exit(self):
+        self.__orderbook_bridge.message_event.unsubscribe(self.__orderbook_handler)
+        super().exit()
+
     def set_range_and_restart(self, trade_range: TradeRange):
         logger.info(
             f"Установлен trade_range: {str(trade_range)} size[{self.__min_bid_size}, {self.__min_ask_size}]")
@@ -165,25 +273,33 @@ class OrderbookTrigger(TradeTriggerBase):
     def reset(self):
         self.__is_triggered = False
 
-    def __orderbook_handler(self, orderbook: Orderbook):
+    @tracer.traced("trigger.orderbook")
+    def __orderbook_handler(self, orderbook: LocalOrderbook):
         if self.__is_triggered:
             return
 
-        if not self.__validate_trade_range(orderbook):
+        nearest_bid, nearest_ask = orderbook.best()
+
+        if not nearest_bid or not nearest_ask:
             return
 
-        nearest_bid = orderbook.bids[0]
-        nearest_ask = orderbook.asks[0]
+        _, bid_size = nearest_bid
+        ask_price, ask_size = nearest_ask
+
+        if not self.__validate_trade_range(ask_price):
+            return
 
-        self.__check_and_trigger(nearest_bid.size, self.__min_bid_size, Side.Buy)
-        self.__check_and_trigger(nearest_ask.size, self.__min_ask_size, Side.Sell)
+        self.__check_and_trigger(bid_size, self.__min_bid_size, Side.Buy)
+        self.__check_and_trigger(ask_size, self.__min_ask_size, Side.Sell)
 
     def __check_and_trigger(self, size, min_size, side):
         if size <= min_size:
             self.__is_triggered = True
             if self.on_triggered:
+                self.__fired_metric.inc()
                 logger.info(f"Сработал триггер side:{side} min_size:{min_size} size:{size}")
                 self.on_triggered(side)
 
-    def __validate_trade_range(self, orderbook: Orderbook) -> bool:
-        return orderbook.asks[0].price == self.__trade_range.sell
+    # Стакан в тиках шкалы trade_range (OrderbookBridge с price_scale)
+    def __validate_trade_range(self, ask_price: int) -> bool:
+        return ask_price == self.__trade_range.sell_ticks
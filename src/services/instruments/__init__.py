@@ -0,0 +1,230 @@
+import json
+import os
+import time
+from dataclasses import dataclass, asdict
+from functools import cached_property
+from decimal import Decimal, ROUND_DOWN, ROUND_UP, InvalidOperation
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from core.log import logger
+from data import ListDatum
+from domain_models import CoinType, PriceScale, Side
+from exceptions import OrderValidationException
+
+# Правила инструментов меняются редко: по умолчанию перечитываем раз в сутки
+DEFAULT_TTL = 24 * 60 * 60
+
+
+def _decimal(value: Any, default: Decimal) -> Decimal:
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return default
+
+
+@dataclass(frozen=True)
+class InstrumentRules:
+    symbol: str
+    base_coin: str
+    quote_coin: str
+    tick_size: Decimal
+    base_precision: Decimal
+    min_order_qty: Decimal
+    max_order_qty: Decimal
+    min_order_amt: Decimal
+    max_order_amt: Decimal
+
+    @staticmethod
+    def from_instrument(instrument: ListDatum) -> 'InstrumentRules':
+        lot_size = instrument.lotSizeFilter
+        tick_size = instrument.priceFilter.tick_size
+        return InstrumentRules(
+            symbol=instrument.symbol,
+            base_coin=instrument.baseCoin,
+            quote_coin=instrument.quoteCoin,
+            tick_size=tick_size,
+            base_precision=_decimal(lot_size.basePrecision, tick_size),
+            min_order_qty=_decimal(lot_size.minOrderQty, Decimal(0)),
+            max_order_qty=_decimal(lot_size.maxOrderQty, Decimal("Infinity")),
+            min_order_amt=_decimal(lot_size.minOrderAmt, Decimal(0)),
+            max_order_amt=_decimal(lot_size.maxOrderAmt, Decimal("Infinity"))
+        )
+
+    @staticmethod
+    def from_dict(obj: Dict[str, str]) -> 'InstrumentRules':
+        return InstrumentRules(
+            symbol=obj["symbol"],
+            base_coin=obj["base_coin"],
+            quote_coin=obj["quote_coin"],
+            tick_size=Decimal(obj["tick_size"]),
+            base_precision=Decimal(obj["base_precision"]),
+            min_order_qty=Decimal(obj["min_order_qty"]),
+            max_order_qty=Decimal(obj["max_order_qty"]),
+            min_order_amt=Decimal(obj["min_order_amt"]),
+            max_order_amt=Decimal(obj["max_order_amt"])
+        )
+
+    def to_dict(self) -> Dict[str, str]:
+        return {key: str(value) for key, value in asdict(self).items()}
+
+    # Цены пары в тиках tick_size: сокеты, стакан, TradeRange и триггеры
+    @cached_property
+    def price_scale(self) -> PriceScale:
+        return PriceScale(self.tick_size)
+
+    # Цена покупки округляется вниз, продажи - вверх: округление не ухудшает цену ордера
+    def quantize_price(self, price: Decimal, side: Optional[str] = None) -> Decimal:
+        rounding = ROUND_UP if side == Side.Sell else ROUND_DOWN
+        return (Decimal(price) / self.tick_size).to_integral_value(rounding) * self.tick_size
+
+    # Количество только вниз: нельзя выставить больше, чем есть на балансе
+    def quantize_qty(self, qty: Decimal) -> Decimal:
+        return (Decimal(qty) / self.base_precision).to_integral_value(ROUND_DOWN) * self.base_precision
+
+    def validate(self, price: Decimal, qty: Decimal):
+        if price <= 0 or price % self.tick_size:
+            raise OrderValidationException(self.symbol, f"цена {price} не кратна шагу {self.tick_size}")
+
+        if qty % self.base_precision:
+            raise OrderValidationException(self.symbol, f"количество {qty} не кратно {self.base_precision}")
+
+        if not self.min_order_qty <= qty <= self.max_order_qty:
+            raise OrderValidationException(
+                self.symbol, f"количество {qty} вне [{self.min_order_qty}, {self.max_order_qty}]")
+
+        amount = price * qty
+        if not self.min_order_amt <= amount <= self.max_order_amt:
+            raise OrderValidationException(
+                self.symbol, f"сумма {amount} вне [{self.min_order_amt}, {self.max_order_amt}]")
+
+    # Приводит цену и количество к шагам инструмента; ордер, который биржа все равно отклонит, - исключение
+    def normalize(self, price: Decimal, qty: Decimal, side: Optional[str] = None) -> Tuple[Decimal, Decimal]:
+        price = self.quantize_price(price, side)
+        qty = self.quantize_qty(qty)
+        self.validate(price, qty)
+        return price, qty
+
+
+class InstrumentCache:
+    # Правила пар в памяти процесса и, если задан path, в JSON-файле между запусками
+    __client: Any
+    __path: Optional[str]
+    __ttl: float
+    __rules: Dict[Tuple[str, str], Tuple[InstrumentRules, float]]
+    __lock: Lock
+
+    def __init__(self, client, path: Optional[str] = None, ttl: float = DEFAULT_TTL):
+        self.__client = client
+        self.__path = path
+        self.__ttl = ttl
+        self.__rules = {}
+        self.__lock = Lock()
+
+        if path:
+            self.__load()
+
+    def get(self, symbol: str, category: str = "spot") -> InstrumentRules:
+        key = (category, symbol)
+
+        with self.__lock:
+            cached = self.__rules.get(key)
+            if cached and time.time() - cached[1] < self.__ttl:
+                return cached[0]
+
+        instrument = self.__client.get_instrument_info(symbol, category).list[0]
+        rules = InstrumentRules.from_instrument(instrument)
+        logger.info("(instruments) %s %s", category, rules)
+
+        with self.__lock:
+            self.__rules[key] = (rules, time.time())
+            if self.__path:
+                self.__save()
+
+        return rules
+
+    def invalidate(self, symbol: Optional[str] = None, category: str = "spot"):
+        with self.__lock:
+            if symbol is None:
+                self.__rules.clear()
+            else:
+                self.__rules.pop((category, symbol), None)
+
+    def __load(self):
+        if not os.path.exists(self.__path):
+            return
+
+        try:
+            with open(self.__path, "r") as file:
+                items = json.loads(file.read())
+
+            for item in items:
+                rules = InstrumentRules.from_dict(item["rules"])
+                self.__rules[(item["category"], rules.symbol)] = (rules, float(item["updated_at"]))
+        except (OSError, ValueError, KeyError, TypeError, InvalidOperation) as ex:
+            logger.warning(f"(instruments) Ошибка чтения кэша {self.__path}. {ex}")
+            self.__rules = {}
+
+    def __save(self):
+        items = [{"category": category, "updated_at": updated_at, "rules": rules.to_dict()}
+                 for (category, _), (rules, updated_at) in self.__rules.items()]
+
+        # Запись через временный файл: прерванное сохранение не портит кэш
+        temp_path = f"{self.__path}.tmp"
+        try:
+            with open(temp_path, "w") as file:
+                file.write(json.dumps(items, indent=2))
+            os.replace(temp_path, self.__path)
+        except OSError as ex:
+            logger.warning(f"(instruments) Ошибка записи кэша {self.__path}. {ex}")
+
+
+_caches: 'WeakKeyDictionary[Any, InstrumentCache]' = WeakKeyDictionary()
+_caches_lock = Lock()
+
+
+# Один кэш на клиента; path и ttl учитываются при первом обращении
+def get_instrument_cache(client, path: Optional[str] = None, ttl: float = DEFAULT_TTL) -> InstrumentCache:
+    with _caches_lock:
+        cache = _caches.get(client)
+        if cache is None:
+            cache = InstrumentCache(client, path, ttl)
+            _caches[client] = cache
+
+        return cache
+
+
+# Монеты пары по суффиксу котируемой монеты: USDCUSDT -> (USDC, USDT)
+def split_symbol(symbol: str) -> Tuple[str, str]:
+    for coin in CoinType:
+        if symbol.endswith(coin.value) and symbol != coin.value:
+            return symbol[:-len(coin.value)], coin.value
+
+    raise ValueError(f"Не удалось определить монеты пары {symbol}, укажите --base-coin и --quote-coin")
+
+
+# Элемент списка instruments-info в формате ответа Bybit; используется replay и симулятором
+def build_instrument(symbol: str, base_coin: str, quote_coin: str, tick_size: str, base_precision: str) -> dict:
+    return {
+        "symbol": symbol,
+        "baseCoin": base_coin,
+        "quoteCoin": quote_coin,
+        "innovation": "0",
+        "status": "Trading",
+        "marginTrading": "none",
+        "lotSizeFilter": {
+            "basePrecision": base_precision,
+            "quotePrecision": tick_size,
+            "minOrderQty": base_precision,
+            "maxOrderQty": "1000000000",
+            "minOrderAmt": "0",
+            "maxOrderAmt": "1000000000"
+        },
+        "priceFilter": {"tickSize": tick_size},
+        "riskParameters": {"limitParameter": "0.05", "marketParameter": "0.05"}
+    }
+
+
+__all__ = ["InstrumentRules", "InstrumentCache", "get_instrument_cache", "DEFAULT_TTL", "split_symbol",
+           "build_instrument"]
@@ -0,0 +1,169 @@
+from bisect import bisect_left
+from decimal import Decimal
+from threading import Lock
+from typing import List, Optional, Tuple, Iterable
+
+from core.log import logger
+from schemas.orderbook import OrderbookUpdate, Price
+
+# Цена в тиках PriceScale пары (или Decimal для обновлений без шкалы) и объем
+PriceLevel = Tuple[Price, Decimal]
+
+
+class OrderbookSide:
+    __slots__ = ("__prices", "__sizes", "__is_bid")
+
+    __prices: List[Price]
+    __sizes: List[Decimal]
+    __is_bid: bool
+
+    # Цены хранятся по возрастанию для обеих сторон: лучший bid в конце, лучший ask в начале
+    def __init__(self, is_bid: bool):
+        self.__prices = []
+        self.__sizes = []
+        self.__is_bid = is_bid
+
+    def reset(self, levels: Iterable[PriceLevel]):
+        levels = sorted(level for level in levels if level[1] != 0)
+        self.__prices = [price for price, _ in levels]
+        self.__sizes = [size for _, size in levels]
+
+    def update(self, price: Price, size: Decimal):
+        index = bisect_left(self.__prices, price)
+        is_exist = index < len(self.__prices) and self.__prices[index] == price
+
+        if size == 0:
+            if is_exist:
+                del self.__prices[index]
+                del self.__sizes[index]
+        elif is_exist:
+            self.__sizes[index] = size
+        else:
+            self.__prices.insert(index, price)
+            self.__sizes.insert(index, size)
+
+    def best(self) -> Optional[PriceLevel]:
+        if not self.__prices:
+            return None
+
+        index = -1 if self.__is_bid else 0
+        return self.__prices[index], self.__sizes[index]
+
+    def top(self, depth: int) -> List[PriceLevel]:
+        if self.__is_bid:
+            start = max(len(self.__prices) - depth, 0)
+            return list(zip(reversed(self.__prices[start:]), reversed(self.__sizes[start:])))
+
+        return list(zip(self.__prices[:depth], self.__sizes[:depth]))
+
+    def __len__(self):
+        return len(self.__prices)
+
+
+class LocalOrderbook:
+    __symbol: str
+    __bids: OrderbookSide
+    __asks: OrderbookSide
+    __update_id: int
+    __sequence: int
+    __is_synced: bool
+    __gap_count: int
+    # Стакан читается не только потоком сокета: потоками подписчиков при conflation и при запуске пары
+    __lock: Lock
+
+    def __init__(self, symbol: str):
+        self.__symbol = symbol
+        self.__bids = OrderbookSide(is_bid=True)
+        self.__asks = OrderbookSide(is_bid=False)
+        self.__update_id = 0
+        self.__sequence = 0
+        self.__is_synced = False
+        self.__gap_count = 0
+        self.__lock = Lock()
+
+    @property
+    def symbol(self) -> str:
+        return self.__symbol
+
+    @property
+    def update_id(self) -> int:
+        return self.__update_id
+
+    @property
+    def sequence(self) -> int:
+        return self.__sequence
+
+    @property
+    def is_synced(self) -> bool:
+        return self.__is_synced
+
+    @property
+    def gap_count(self) -> int:
+        return self.__gap_count
+
+    def apply(self, update: OrderbookUpdate) -> bool:
+        with self.__lock:
+            return self.__apply(update)
+
+    def __apply(self, update: OrderbookUpdate) -> bool:
+        if update.is_snapshot:
+            self.__bids.reset(update.bids)
+            self.__asks.reset(update.asks)
+            self.__update_id = update.update_id
+            self.__sequence = update.sequence
+            self.__is_synced = True
+            return True
+
+        # delta без snapshot или устаревшее сообщение применять нельзя
+        if not self.__is_synced or update.update_id <= self.__update_id:
+            return False
+
+        # После пропуска книга неверна: дельты отбрасываются до нового снимка (см. OrderbookBridge)
+        if update.update_id != self.__update_id + 1:
+            self.__gap_count += 1
+            self.__is_synced = False
+            logger.warning(f"(orderbook {self.__symbol}) пропуск обновлений: "
+                           f"{self.__update_id} -> {update.update_id}, ожидание снимка")
+            return False
+
+        for price, size in update.bids:
+            self.__bids.update(price, size)
+        for price, size in update.asks:
+            self.__asks.update(price, size)
+
+        self.__update_id = update.update_id
+        self.__sequence = update.sequence
+        return True
+
+    def reset(self):
+        with self.__lock:
+            self.__bids.reset(())
+            self.__asks.reset(())
+            self.__is_synced = False
+
+    def best_bid(self) -> Optional[PriceLevel]:
+        with self.__lock:
+            return self.__bids.best()
+
+    def best_ask(self) -> Optional[PriceLevel]:
+        with self.__lock:
+            return self.__asks.best()
+
+    # Лучшие bid и ask из одного состояния стакана
+    def best(self) -> Tuple[Optional[PriceLevel], Optional[PriceLevel]]:
+        with self.__lock:
+            return self.__bids.best(), self.__asks.best()
+
+    def top_bids(self, depth: int) -> List[PriceLevel]:
+        with self.__lock:
+            return self.__bids.top(depth)
+
+    def top_asks(self, depth: int) -> List[PriceLevel]:
+        with self.__lock:
+            return self.__asks.top(depth)
+
+    def __str__(self):
+        return f"[{self.__symbol} bid:{self.best_bid()} ask:{self.best_ask()} u:{self.__update_id}]"
+
+
+__all__ = ["LocalOrderbook", "OrderbookSide", "PriceLevel"]
@@ -0,0 +1,5 @@
+from .client import ReplayClient
+from .engine import ReplayEngine, load_recording
+from .sockets import ReplayHub
+
+__all__ = ["ReplayClient", "ReplayEngine", "ReplayHub", "load_recording"]
@@ -0,0 +1,268 @@
+import itertools
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from core.clock import Clock
+from core.log import logger
+from data import InstrumentInfo
+from domain_models import OrderStatus, Side
+from schemas import Orderbook
+from schemas.account_coin import Coin, CoinBalance
+from schemas.order import Order, OrderEntity
+from .sockets import ReplayHub, ReplayWebsocketClient
+
+
+class ReplayClient:
+    # Заглушка BybitClient: ордера и баланс живут в памяти, исполнение - по lastPrice тикера
+    websocket: ReplayWebsocketClient
+    hub: ReplayHub
+    fills: List[Tuple[float, Order]]
+
+    __clock: Clock
+    __instruments: Dict[str, dict]
+    __open_orders: Dict[str, Order]
+    __closed_orders: List[Order]
+    __balances: Dict[str, Decimal]
+    __locked: Dict[str, Decimal]
+    __frames: List[dict]
+
+    def __init__(
+            self,
+            clock: Clock,
+            instruments: List[dict],
+            balances: Dict[str, Decimal],
+            fast_decode: bool = False
+    ):
+        self.hub = ReplayHub()
+        self.websocket = ReplayWebsocketClient(self.hub, fast_decode)
+        self.fills = []
+
+        self.__clock = clock
+        self.__instruments = {instrument["symbol"]: instrument for instrument in instruments}
+        self.__open_orders = {}
+        self.__closed_orders = []
+        self.__balances = dict(balances)
+        self.__locked = {coin: Decimal(0) for coin in balances}
+        self.__frames = []
+        self.__order_ids = itertools.count(1)
+
+    @property
+    def balances(self) -> Dict[str, Decimal]:
+        return dict(self.__balances)
+
+    def place_order(self, **kwargs) -> Order:
+        needed_keys = ["side", "price", "qty", "symbol"]
+        if not all(key in kwargs for key in needed_keys):
+            raise ValueError("Не все обязательные ключи предоставлены")
+
+        order = Order(
+            orderId=f"replay-{next(self.__order_ids)}",
+            symbol=kwargs["symbol"],
+            side=str(kwargs["side"]),
+            orderType=kwargs.get("orderType"),
+            price=str(kwargs["price"]),
+            qty=str(kwargs["qty"]),
+            orderStatus=OrderStatus.New.value,
+            updatedTime=self.__now_ms()
+        )
+
+        coin, amount = self.__order_cost(order)
+        if self.__free(coin) < amount:
+            raise Exception(f"[place_order] Недостаточно средств. {coin}: {self.__free(coin)} < {amount}")
+
+        self.__locked[coin] = self.__locked.get(coin, Decimal(0)) + amount
+        self.__open_orders[order.order_id] = order
+        self.__publish_wallet(coin)
+
+        return order.model_copy()
+
+    def place_batch_order(self, category: str, requests: List[dict]) -> List[Optional[Order]]:
+        result = []
+        for request in requests:
+            try:
+                result.append(self.place_order(category=category, **request))
+            except Exception as ex:
+                logger.debug(ex)
+                result.append(None)
+
+        return result
+
+    def get_open_orders(self, symbol: str, category: str) -> [Order]:
+        return [order.model_copy() for order in self.__open_orders.values() if order.symbol == symbol]
+
+    def get_order_history(self, symbol: str, category: str = "spot", start_time: Optional[int] = None) -> List[Order]:
+        return [order.model_copy() for order in self.__closed_orders
+                if order.symbol == symbol and (start_time is None or order.updated_time >= start_time)]
+
+    def wallet_balance(self, coin_name: str) -> Optional[Coin]:
+        coin_name = str(coin_name)
+        if coin_name not in self.__balances:
+            return None
+
+        total = self.__balances[coin_name]
+        locked = self.__locked.get(coin_name, Decimal(0))
+
+        return Coin(
+            availableToBorrow="",
+            accruedInterest="",
+            availableToWithdraw=str(total - locked),
+            totalOrderIM="",
+            equity=str(total),
+            totalPositionMM="",
+            usdValue="0",
+            unrealisedPnl="",
+            borrowAmount="",
+            totalPositionIM="",
+            walletBalance=str(total),
+            cumRealisedPnl="",
+            locked=str(locked),
+            coin=coin_name
+        )
+
+    def wallet_balances(self) -> List[CoinBalance]:
+        return [CoinBalance(coin, total, self.__locked.get(coin, Decimal(0))) for coin, total in self.__balances.items()]
+
+    def get_instrument_info(self, symbol: str, category: str) -> InstrumentInfo:
+        return InstrumentInfo.from_dict({"category": category, "list": [self.__instruments[symbol]]})
+
+    def cancel_order(self, **kwargs) -> OrderEntity:
+        order = self.__open_orders.get(kwargs["orderId"])
+        if not order:
+            raise Exception("[cancel_order] Order does not exist")
+
+        self.__close(order, OrderStatus.Cancelled)
+        return OrderEntity(orderId=order.order_id)
+
+    def amend_order(self, **kwargs):
+        order = self.__open_orders.get(kwargs["orderId"])
+        if not order:
+            raise Exception("[amend_order] Order does not exist")
+
+        coin, amount = self.__order_cost(order)
+        self.__locked[coin] -= amount
+
+        amended = order.model_copy(update={
+            "price": Decimal(str(kwargs.get("price", order.price))),
+            "qty": Decimal(str(kwargs.get("qty", order.qty))),
+            "updated_time": self.__now_ms()
+        })
+        new_coin, new_amount = self.__order_cost(amended)
+
+        if self.__free(new_coin) < new_amount:
+            self.__locked[coin] += amount
+            raise Exception("[amend_order] Недостаточно средств")
+
+        self.__locked[new_coin] += new_amount
+        self.__open_orders[order.order_id] = amended
+        self.__publish_wallet(coin, new_coin)
+
+    def amend_batch_order(self, category: str, requests: List[dict]) -> List[Optional[OrderEntity]]:
+        result = []
+        for request in requests:
+            try:
+                self.amend_order(category=category, **request)
+                result.append(OrderEntity(orderId=request["orderId"]))
+            except Exception as ex:
+                logger.debug(ex)
+                result.append(None)
+
+        return result
+
+    def cancel_batch_order(self, category: str, requests: List[dict]) -> List[Optional[OrderEntity]]:
+        result = []
+        for request in requests:
+            try:
+                result.append(self.cancel_order(category=category, **request))
+            except Exception as ex:
+                logger.debug(ex)
+                result.append(None)
+
+        return result
+
+    def cancel_all_orders(self, category: str, symbol: Optional[str] = None):
+        for order in list(self.__open_orders.values()):
+            if symbol is None or order.symbol == symbol:
+                self.__close(order, OrderStatus.Cancelled)
+
+    def get_orderbook(self, **kwargs) -> Orderbook:
+        raise Exception("[get_orderbook] Стакан в режиме replay доступен только через OrderbookBridge")
+
+    def match(self, symbol: str, last_price: Decimal):
+        for order in list(self.__open_orders.values()):
+            if order.symbol != symbol:
+                continue
+
+            is_buy_filled = order.side == Side.Buy and order.price >= last_price
+            is_sell_filled = order.side == Side.Sell and order.price <= last_price
+
+            if is_buy_filled or is_sell_filled:
+                self.__fill(order)
+
+    def take_frames(self) -> List[dict]:
+        frames, self.__frames = self.__frames, []
+        return frames
+
+    def __fill(self, order: Order):
+        instrument = self.__instruments[order.symbol]
+        base_coin, quote_coin = instrument["baseCoin"], instrument["quoteCoin"]
+        quote_amount = order.price * order.qty
+
+        self.__close(order, OrderStatus.Filled)
+
+        if order.side == Side.Buy:
+            self.__balances[quote_coin] -= quote_amount
+            self.__balances[base_coin] = self.__balances.get(base_coin, Decimal(0)) + order.qty
+        else:
+            self.__balances[base_coin] -= order.qty
+            self.__balances[quote_coin] = self.__balances.get(quote_coin, Decimal(0)) + quote_amount
+
+        self.__publish_wallet(base_coin, quote_coin)
+        self.fills.append((self.__clock.time(), order))
+        self.__frames.append({
+            "topic": "order",
+            "creationTime": self.__now_ms(),
+            "data": [{
+                "orderId": order.order_id,
+                "symbol": order.symbol,
+                "side": order.side,
+                "orderType": order.order_type,
+                "price": str(order.price),
+                "qty": str(order.qty),
+                "orderStatus": OrderStatus.Filled.value,
+                "updatedTime": str(self.__now_ms())
+            }]
+        })
+
+    def __close(self, order: Order, status: OrderStatus):
+        coin, amount = self.__order_cost(order)
+        self.__locked[coin] -= amount
+        del self.__open_orders[order.order_id]
+        self.__closed_orders.append(order.model_copy(update={"status": status.value, "updated_time": self.__now_ms()}))
+        self.__publish_wallet(coin)
+
+    # Изменение баланса сразу уходит в топик wallet, как push биржи
+    def __publish_wallet(self, *coins: str):
+        self.hub.dispatch({
+            "topic": "wallet",
+            "creationTime": self.__now_ms(),
+            "data": [{
+                "accountType": "SPOT",
+                "coin": [{
+                    "coin": coin,
+                    "walletBalance": str(self.__balances.get(coin, Decimal(0))),
+                    "locked": str(self.__locked.get(coin, Decimal(0)))
+                } for coin in dict.fromkeys(coins)]
+            }]
+        })
+
+    def __now_ms(self) -> int:
+        return int(self.__clock.time() * 1000)
+
+    def __order_cost(self, order: Order):
+        instrument = self.__instruments[order.symbol]
+        if order.side == Side.Buy:
+            return instrument["quoteCoin"], order.price * order.qty
+        return instrument["baseCoin"], order.qty
+
+    def __free(self, coin: str) -> Decimal:
+        return self.__balances.get(coin, Decimal(0)) - self.__locked.get(coin, Decimal(0))
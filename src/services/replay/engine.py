@@ -0,0 +1,105 @@
+import json
+import os
+from decimal import Decimal
+from typing import Iterable, Iterator, List, Tuple, Callable, Optional
+
+from api.bybit_client.websockets import json_loads, orjson
+from core.actor import Actor, inline_actor
+from core.clock import VirtualClock
+from core.recorder import FrameReader, list_recordings, FILE_SUFFIX
+from .client import ReplayClient
+
+RecordedFrame = Tuple[int, dict]
+
+
+def load_recording(path: str) -> Iterator[RecordedFrame]:
+    if os.path.isdir(path):
+        for file_path in list_recordings(path):
+            yield from load_frames(file_path)
+        return
+
+    if path.endswith(FILE_SUFFIX):
+        yield from load_frames(path)
+        return
+
+    # Формат: по строке JSON на кадр {"ts": <время получения, мс>, "frame": {...}}
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield record["ts"], record["frame"]
+
+
+def load_frames(path: str) -> Iterator[RecordedFrame]:
+    # Файлы FrameRecorder: orjson разбирает memoryview без копирования
+    with FrameReader(path) as reader:
+        for timestamp_ns, payload in reader:
+            frame = json_loads(payload) if orjson else json.loads(bytes(payload))
+            payload.release()
+            yield timestamp_ns // 1_000_000, frame
+
+
+class ReplayEngine:
+    __client: ReplayClient
+    __clock: VirtualClock
+    __frames: Iterator[RecordedFrame]
+    __simulate_fills: bool
+    __processed: int
+    __actor: Actor
+
+    # simulate_fills: ордера бота исполняются по цене тикера, записанные order-кадры пропускаются
+    # actor: исполнитель бота; кадры исполнений одного тикера доставляются в одном его событии
+    def __init__(
+            self,
+            client: ReplayClient,
+            clock: VirtualClock,
+            frames: Iterable[RecordedFrame],
+            simulate_fills: bool = True,
+            actor: Actor = inline_actor
+    ):
+        self.__client = client
+        self.__clock = clock
+        self.__frames = iter(frames)
+        self.__simulate_fills = simulate_fills
+        self.__processed = 0
+        self.__actor = actor
+
+    @property
+    def processed(self) -> int:
+        return self.__processed
+
+    def run(self, stop_when: Optional[Callable[[], bool]] = None) -> int:
+        for timestamp, frame in self.__frames:
+            self.__clock.advance_to(timestamp / 1000)
+            self.__dispatch(frame)
+            self.__processed += 1
+
+            if stop_when and stop_when():
+                break
+
+        return self.__processed
+
+    def finish(self, seconds: float):
+        # Досчитываем таймеры, запущенные последними кадрами
+        self.__clock.advance(seconds)
+
+    def __dispatch(self, frame: dict):
+        topic = frame.get("topic", "")
+        # Ордера и балансы в режиме симуляции публикует ReplayClient
+        is_account_frame = topic in ("order", "wallet")
+
+        if is_account_frame and self.__simulate_fills:
+            return
+
+        self.__client.hub.dispatch(frame)
+
+        if self.__simulate_fills and topic.startswith("tickers."):
+            data = frame["data"]
+            self.__client.match(data["symbol"], Decimal(data["lastPrice"]))
+            # Как у биржи, присылающей исполнения одной сделки подряд: сверка лестницы выполняется после всех кадров
+            self.__actor.post("fills", self.__dispatch_fills, self.__client.take_frames())
+
+    def __dispatch_fills(self, frames: List[dict]):
+        for frame in frames:
+            self.__client.hub.dispatch(frame)
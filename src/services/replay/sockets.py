@@ -0,0 +1,123 @@
+from typing import Callable, Dict, List, Optional
+
+from api.bybit_client.websockets import OrderbookWebsocket, TickerWebsocket, OrderWebsocket, WalletWebsocket
+from services.socket_hub import route_key
+
+
+class ReplaySocket:
+    # Подменяет pybit WebSocket: принимает подписки и получает кадры от ReplayHub
+    callback: Callable[[dict], None]
+
+    def __init__(self, hub: 'ReplayHub'):
+        self.__hub = hub
+        self.callback = lambda data: None
+
+    def ticker_stream(self, symbol: str, callback: Callable):
+        self.__hub.register(f"tickers.{symbol}", self)
+
+    def orderbook_stream(self, depth: int, symbol: str, callback: Callable):
+        self.__hub.register(f"orderbook.{symbol}", self)
+
+    def order_stream(self, callback: Callable):
+        self.__hub.register("order", self)
+
+    def wallet_stream(self, callback: Callable):
+        self.__hub.register("wallet", self)
+
+    def unsubscribe(self, topic: str):
+        self.__hub.unregister(self, ReplayHub.route_key(topic))
+
+    def _handle_incoming_message(self, message: dict):
+        pass
+
+    @staticmethod
+    def _is_custom_pong(message: dict) -> bool:
+        return message.get("op") == "pong"
+
+    def exit(self):
+        self.__hub.unregister(self)
+
+
+class ReplayHub:
+    __sockets: Dict[str, List[ReplaySocket]]
+
+    def __init__(self):
+        self.__sockets = {}
+
+    # Та же нормализация, что у SocketHub: иначе кадр дошел бы до сокета, но не до подписчиков топика
+    @staticmethod
+    def route_key(topic: str) -> str:
+        return route_key(topic)
+
+    def register(self, route_key: str, socket: ReplaySocket):
+        self.__sockets.setdefault(route_key, []).append(socket)
+
+    def unregister(self, socket: ReplaySocket, route_key: Optional[str] = None):
+        for key, sockets in self.__sockets.items():
+            if socket in sockets and (route_key is None or key == route_key):
+                sockets.remove(socket)
+
+    def dispatch(self, frame: dict):
+        for socket in self.__sockets.get(self.route_key(frame["topic"]), ()):
+            socket.callback(frame)
+
+
+class ReplayOrderbookWebsocket(OrderbookWebsocket):
+    def __init__(self, hub: ReplayHub, fast_decode: bool = False):
+        super().__init__(False, fast_decode)
+        self.__hub = hub
+
+    def _create_socket(self, channel_type, is_testnet) -> ReplaySocket:
+        return ReplaySocket(self.__hub)
+
+    def _unsubscribe_impl(self, socket: ReplaySocket, topic: str):
+        socket.unsubscribe(topic)
+
+
+class ReplayTickerWebsocket(TickerWebsocket):
+    def __init__(self, hub: ReplayHub, fast_decode: bool = False):
+        super().__init__(False, fast_decode)
+        self.__hub = hub
+
+    def _create_socket(self, channel_type, is_testnet) -> ReplaySocket:
+        return ReplaySocket(self.__hub)
+
+    def _unsubscribe_impl(self, socket: ReplaySocket, topic: str):
+        socket.unsubscribe(topic)
+
+
+class ReplayOrderWebsocket(OrderWebsocket):
+    def __init__(self, hub: ReplayHub):
+        super().__init__("", "")
+        self.__hub = hub
+
+    def _create_socket(self, channel_type, is_testnet) -> ReplaySocket:
+        return ReplaySocket(self.__hub)
+
+    def _unsubscribe_impl(self, socket: ReplaySocket, topic: str):
+        socket.unsubscribe(topic)
+
+
+class ReplayWalletWebsocket(WalletWebsocket):
+    def __init__(self, hub: ReplayHub):
+        super().__init__("", "")
+        self.__hub = hub
+
+    def _create_socket(self, channel_type, is_testnet) -> ReplaySocket:
+        return ReplaySocket(self.__hub)
+
+    def _unsubscribe_impl(self, socket: ReplaySocket, topic: str):
+        socket.unsubscribe(topic)
+
+
+class ReplayWebsocketClient:
+    orderbook: ReplayOrderbookWebsocket
+    ticker: ReplayTickerWebsocket
+    order: ReplayOrderWebsocket
+    wallet: ReplayWalletWebsocket
+
+    def __init__(self, hub: ReplayHub, fast_decode: bool = False):
+        self.orderbook = ReplayOrderbookWebsocket(hub, fast_decode)
+        self.ticker = ReplayTickerWebsocket(hub, fast_decode)
+        self.order = ReplayOrderWebsocket(hub)
+        self.wallet = ReplayWalletWebsocket(hub)
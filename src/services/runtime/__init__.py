@@ -0,0 +1,239 @@
+from typing import Dict, List, Optional
+
+from api import BybitClient
+from core.actor import Actor, inline_actor
+from core.clock import Clock, system_clock
+from core.log import logger
+from domain_models import PriceScale, TradeRange
+from schemas.setting import SymbolSetting
+from services.bot import OrderbookBridge, BotOptions, BybitBotService, TimeRangeTrigger, OrderbookTrigger
+from services.bot.socket_bridges import OrderBridge, TickerBridge
+from services.instruments import get_instrument_cache
+
+# Время ожидания первого snapshot стакана, сек
+ORDERBOOK_READY_TIMEOUT = 10
+
+
+def get_market_trade_range(
+        client: BybitClient,
+        orderbook_bridge: OrderbookBridge,
+        category: str,
+        timeout: float = ORDERBOOK_READY_TIMEOUT
+) -> TradeRange:
+    scale = orderbook_bridge.price_scale
+    if orderbook_bridge.wait_ready(timeout):
+        best_bid, best_ask = orderbook_bridge.book.best()
+
+        if best_bid and best_ask:
+            if scale:
+                return TradeRange.from_ticks(best_bid[0], best_ask[0], scale)
+            return TradeRange(best_bid[0], best_ask[0])
+
+    orderbook = client.get_orderbook(
+        category=category,
+        symbol=orderbook_bridge.symbol
+    )
+
+    return TradeRange(orderbook.bids[0].price, orderbook.asks[0].price, scale)
+
+
+class SymbolRuntime:
+    # Состояние одной пары: мосты, триггеры и бот. Клиент, REST-сессия и сокеты общие для всех пар
+    orderbook_bridge: OrderbookBridge
+    order_bridge: OrderBridge
+    ticker_bridge: TickerBridge
+
+    __setting: SymbolSetting
+    __client: BybitClient
+    __clock: Clock
+    __category: str
+    __actor: Actor
+    __price_scale: PriceScale
+    __bot: Optional[BybitBotService]
+    __trade_range: Optional[TradeRange]
+
+    # conflate: медленный триггер получает только последние стакан и тикер.
+    # Для воспроизведения записей не подходит: обработка перестает быть детерминированной
+    # actor: поток, в котором выполняются триггеры, бот и его таймеры; по умолчанию - потоки источников
+    def __init__(
+            self,
+            setting: SymbolSetting,
+            client: BybitClient,
+            clock: Clock = system_clock,
+            category: str = "spot",
+            conflate: bool = False,
+            actor: Actor = inline_actor
+    ):
+        self.__setting = setting
+        self.__client = client
+        self.__clock = actor.wrap_clock(clock)
+        self.__category = category
+        self.__actor = actor
+        self.__bot = None
+        self.__trade_range = None
+        # Цены стакана, тикера, коридора и триггеров - в тиках шага цены пары
+        self.__price_scale = get_instrument_cache(client).get(setting.symbol, category).price_scale
+
+        # Подписки создаются сразу, чтобы стаканы всех пар наполнялись параллельно до start
+        self.orderbook_bridge = OrderbookBridge(symbol=setting.symbol, client=client, category=category,
+                                                conflate=conflate, actor=actor, price_scale=self.__price_scale,
+                                                clock=clock)
+        self.order_bridge = OrderBridge(symbol=setting.symbol, client=client, category="private", actor=actor)
+        self.ticker_bridge = TickerBridge(symbol=setting.symbol, client=client, category=category, conflate=conflate,
+                                          actor=actor, price_scale=self.__price_scale)
+
+    @property
+    def symbol(self) -> str:
+        return self.__setting.symbol
+
+    @property
+    def setting(self) -> SymbolSetting:
+        return self.__setting
+
+    @property
+    def bot(self) -> Optional[BybitBotService]:
+        return self.__bot
+
+    @property
+    def trade_range(self) -> Optional[TradeRange]:
+        return self.__trade_range
+
+    @property
+    def is_started(self) -> bool:
+        return self.__bot is not None
+
+    # Бот создается в потоке actor: события его ордеров и триггеров не обрабатываются до завершения запуска.
+    # Snapshot стакана ожидается в вызывающем потоке, actor в это время продолжает разбирать события других пар
+    def start(self, target_range: Optional[TradeRange] = None):
+        if target_range is None:
+            self.orderbook_bridge.wait_ready(ORDERBOOK_READY_TIMEOUT)
+        self.__actor.run(lambda: self.__start(target_range))
+
+    def __start(self, target_range: Optional[TradeRange]):
+        if self.__bot:
+            return
+
+        setting = self.__setting
+        target_range = target_range or get_market_trade_range(
+            client=self.__client,
+            orderbook_bridge=self.orderbook_bridge,
+            category=self.__category,
+            timeout=0
+        )
+        # Триггеры сравнивают тики коридора с тиками сообщений: шкала должна совпадать
+        if target_range.scale != self.__price_scale:
+            target_range = TradeRange(target_range.buy, target_range.sell, self.__price_scale)
+
+        time_trigger = TimeRangeTrigger(
+            target_range=target_range,
+            ticker_bridge=self.ticker_bridge,
+            trigger_duration_buy=setting.trigger_duration_buy,
+            trigger_duration_sell=setting.trigger_duration_sell,
+            clock=self.__clock,
+            average_mode=setting.average_mode
+        )
+
+        orderbook_trigger = OrderbookTrigger(
+            orderbook_bridge=self.orderbook_bridge,
+            trade_range=target_range,
+            min_bid_size=setting.min_bid_size,
+            min_ask_size=setting.min_ask_size
+        )
+
+        self.__trade_range = target_range
+        self.__bot = BybitBotService(
+            order_bridge=self.order_bridge,
+            client=self.__client,
+            options=BotOptions(
+                category=self.__category,
+                symbol=setting.symbol,
+                trade_range=target_range,
+                allow_range=TradeRange(setting.allow_bottom_price, setting.allow_top_price),
+                overlap_top_price=setting.overlap_sell_price,
+                qty=setting.trade_amount,
+                grid_levels=setting.grid_levels,
+                max_open_orders=setting.max_open_orders
+            ),
+            time_trigger=time_trigger,
+            orderbook_trigger=orderbook_trigger,
+            actor=self.__actor,
+            clock=self.__clock
+        )
+
+    # Сначала мосты: новые события пары не поступают, затем бот снимает триггеры и таймеры
+    def exit(self):
+        self.orderbook_bridge.exit()
+        self.order_bridge.exit()
+        self.ticker_bridge.exit()
+
+        if self.__bot:
+            self.__bot.exit()
+            self.__bot = None
+
+
+class BotRuntime:
+    __client: BybitClient
+    __clock: Clock
+    __category: str
+    __conflate: bool
+    __actor: Actor
+    __symbols: Dict[str, SymbolRuntime]
+
+    # Один actor на все пары: общие баланс и лимиты запросов меняются из одного потока
+    def __init__(
+            self,
+            client: BybitClient,
+            clock: Clock = system_clock,
+            category: str = "spot",
+            conflate: bool = False,
+            actor: Actor = inline_actor
+    ):
+        self.__client = client
+        self.__clock = clock
+        self.__category = category
+        self.__conflate = conflate
+        self.__actor = actor
+        self.__symbols = {}
+
+    @property
+    def symbols(self) -> List[SymbolRuntime]:
+        return list(self.__symbols.values())
+
+    def get(self, symbol: str) -> Optional[SymbolRuntime]:
+        return self.__symbols.get(symbol)
+
+    def add_symbol(self, setting: SymbolSetting) -> SymbolRuntime:
+        if setting.symbol in self.__symbols:
+            raise ValueError(f"Пара {setting.symbol} уже добавлена")
+
+        runtime = SymbolRuntime(setting, self.__client, self.__clock, self.__category, self.__conflate, self.__actor)
+        self.__symbols[setting.symbol] = runtime
+        logger.info(f"(runtime) {setting.symbol} добавлена")
+
+        return runtime
+
+    # Ошибка запуска одной пары не останавливает остальные
+    def start(self):
+        for runtime in self.__symbols.values():
+            if runtime.is_started:
+                continue
+
+            try:
+                runtime.start()
+                logger.info(f"(runtime) {runtime.symbol} запущена, trade_range: {runtime.trade_range}")
+            except Exception as ex:
+                logger.error(f"(runtime) {runtime.symbol} не запущена. {ex}", exc_info=True)
+
+    def remove_symbol(self, symbol: str):
+        runtime = self.__symbols.pop(symbol, None)
+        if runtime:
+            runtime.exit()
+
+    # Actor останавливается первым: ждущие события отбрасываются, и боты не реагируют на отписку сокетов
+    def exit(self):
+        self.__actor.stop()
+        for symbol in list(self.__symbols):
+            self.remove_symbol(symbol)
+
+
+__all__ = ["BotRuntime", "SymbolRuntime", "get_market_trade_range", "ORDERBOOK_READY_TIMEOUT"]
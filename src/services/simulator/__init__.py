@@ -0,0 +1,9 @@
+from .exchange import SimulatedExchange, SimulatorError
+from .latency import Latency
+from .market import MarketSimulator, MarketConfig
+from .matching import MatchingBook, SimOrder
+from .rest import SimulatorRestServer
+from .sockets import SimulatorWebsocketServer
+
+__all__ = ["SimulatedExchange", "SimulatorError", "Latency", "MarketSimulator", "MarketConfig", "MatchingBook",
+           "SimOrder", "SimulatorRestServer", "SimulatorWebsocketServer"]
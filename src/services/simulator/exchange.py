@@ -0,0 +1,467 @@
+import itertools
+import time
+from collections import deque
+from decimal import Decimal
+from threading import RLock
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+
+from api.bybit_client.websockets import ACCOUNT_TYPE, ORDERBOOK_DEPTH
+from core.metrics import registry
+from domain_models import OrderStatus, Side
+from .matching import Fill, MatchingBook, PriceLevel, SimOrder
+
+# Аккаунт бота; ликвидность генератора рынка создается без аккаунта
+ACCOUNT = "account"
+# Сколько закрытых ордеров хранится для order/history: память не растет на долгих прогонах
+DEFAULT_HISTORY_LIMIT = 10_000
+
+SIM_FILLS = registry.counter("simulator_fills_total", "Исполнения ордеров аккаунта в симуляторе", ("symbol",))
+
+
+class SimulatorError(Exception):
+    # Ошибка в формате Bybit: код уходит клиенту в retCode
+    code: int
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class _SymbolStats:
+    __slots__ = ("last_price", "open_price", "high", "low", "volume", "turnover", "trades")
+
+    def __init__(self, price: Decimal):
+        self.last_price = price
+        self.open_price = price
+        self.high = price
+        self.low = price
+        self.volume = Decimal(0)
+        self.turnover = Decimal(0)
+        self.trades = 0
+
+    def trade(self, price: Decimal, qty: Decimal):
+        self.last_price = price
+        self.high = max(self.high, price)
+        self.low = min(self.low, price)
+        self.volume += qty
+        self.turnover += price * qty
+        self.trades += 1
+
+
+class SimulatedExchange:
+    # Состояние биржи симулятора: книги пар, ордера и балансы одного аккаунта.
+    # Все изменения идут под одной блокировкой, кадры публикуются внутри нее - порядок сообщений сохраняется
+    __instruments: Dict[str, dict]
+    __books: Dict[str, MatchingBook]
+    __stats: Dict[str, _SymbolStats]
+    __balances: Dict[str, Decimal]
+    __locked: Dict[str, Decimal]
+    __orders: Dict[str, SimOrder]
+    __history: Deque[SimOrder]
+    __liquidity: Dict[Tuple[str, str, Decimal], SimOrder]
+    __publisher: Callable[[str, dict], None]
+    __lock: RLock
+
+    def __init__(
+            self,
+            instruments: List[dict],
+            prices: Dict[str, Decimal],
+            balances: Dict[str, Decimal],
+            history_limit: int = DEFAULT_HISTORY_LIMIT
+    ):
+        self.__instruments = {instrument["symbol"]: instrument for instrument in instruments}
+        self.__books = {symbol: MatchingBook(symbol) for symbol in self.__instruments}
+        self.__stats = {symbol: _SymbolStats(prices[symbol]) for symbol in self.__instruments}
+        self.__balances = dict(balances)
+        self.__locked = {coin: Decimal(0) for coin in balances}
+        self.__orders = {}
+        self.__history = deque(maxlen=history_limit)
+        self.__liquidity = {}
+        self.__publisher = lambda topic, frame: None
+        self.__lock = RLock()
+        self.__order_ids = itertools.count(1)
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self.__instruments)
+
+    @property
+    def open_order_count(self) -> int:
+        return len(self.__orders)
+
+    # Получатель кадров сокета: вызывается под блокировкой биржи и не должен блокироваться
+    def set_publisher(self, publisher: Callable[[str, dict], None]):
+        self.__publisher = publisher
+
+    def instrument(self, symbol: str) -> dict:
+        return self.__instrument(symbol)
+
+    def last_price(self, symbol: str) -> Decimal:
+        return self.__stats[symbol].last_price
+
+    # REST: торговля
+
+    def place_order(self, symbol: str, side: str, price: str, qty: str) -> dict:
+        with self.__lock:
+            instrument = self.__instrument(symbol)
+            side = self.__side(side)
+            price = self.__price(instrument, price)
+            qty = self.__qty(instrument, qty)
+
+            order = SimOrder(self.__next_order_id(), symbol, side, price, qty, ACCOUNT, self.__now_ms())
+            coin, amount = self.__order_lock(order)
+            if self.__free(coin) < amount:
+                raise SimulatorError(170131, "Insufficient balance.")
+
+            self.__locked[coin] = self.__locked.get(coin, Decimal(0)) + amount
+            self.__orders[order.order_id] = order
+
+            fills = self.__books[symbol].add(order)
+            changed = self.__settle(fills)
+            changed[order.order_id] = order
+            self.__publish_orders(changed.values())
+            return order.to_raw()
+
+    def amend_order(self, symbol: str, order_id: str, price: Optional[str] = None, qty: Optional[str] = None) -> dict:
+        with self.__lock:
+            instrument = self.__instrument(symbol)
+            order = self.__open_order(symbol, order_id)
+            new_price = self.__price(instrument, price) if price else order.price
+            new_qty = self.__qty(instrument, qty) if qty else order.qty
+            if new_qty <= order.filled:
+                raise SimulatorError(170136, "Order quantity is lower than the executed quantity.")
+
+            coin, old_amount = self.__order_lock(order)
+            new_amount = new_qty - order.filled if order.side == Side.Sell else (new_qty - order.filled) * new_price
+            if self.__free(coin) + old_amount < new_amount:
+                raise SimulatorError(170131, "Insufficient balance.")
+
+            self.__locked[coin] += new_amount - old_amount
+            fills = self.__books[symbol].amend(order, new_price, new_qty)
+            order.updated_time = self.__now_ms()
+
+            changed = self.__settle(fills)
+            changed[order.order_id] = order
+            self.__publish_orders(changed.values())
+            return {"orderId": order.order_id, "orderLinkId": ""}
+
+    def cancel_order(self, symbol: str, order_id: str) -> dict:
+        with self.__lock:
+            order = self.__open_order(symbol, order_id)
+            self.__cancel(order)
+            self.__publish_orders([order])
+            return {"orderId": order.order_id, "orderLinkId": ""}
+
+    def cancel_all(self, symbol: Optional[str] = None) -> List[dict]:
+        with self.__lock:
+            orders = [order for order in self.__orders.values() if symbol is None or order.symbol == symbol]
+            for order in orders:
+                self.__cancel(order)
+
+            self.__publish_orders(orders)
+            return [{"orderId": order.order_id, "orderLinkId": ""} for order in orders]
+
+    # REST: запросы состояния
+
+    # Как у Bybit: новые ордера первыми
+    def open_orders(self, symbol: Optional[str] = None) -> List[dict]:
+        with self.__lock:
+            return [order.to_raw() for order in reversed(list(self.__orders.values()))
+                    if symbol is None or order.symbol == symbol]
+
+    def order_history(self, symbol: Optional[str] = None, start_time: Optional[int] = None) -> List[dict]:
+        with self.__lock:
+            orders = [order for order in itertools.chain(self.__history, self.__orders.values())
+                      if (symbol is None or order.symbol == symbol)
+                      and (start_time is None or order.updated_time >= start_time)]
+
+            orders.sort(key=lambda order: order.updated_time, reverse=True)
+            return [order.to_raw() for order in orders]
+
+    def wallet(self) -> List[dict]:
+        with self.__lock:
+            return self.__coins(self.__balances)
+
+    def orderbook(self, symbol: str, depth: int) -> dict:
+        with self.__lock:
+            book = self.__books[self.__instrument(symbol)["symbol"]]
+            bids, asks = book.depth(depth)
+            return {
+                "s": symbol,
+                "b": self.__levels(bids),
+                "a": self.__levels(asks),
+                "ts": self.__now_ms(),
+                "u": book.update_id,
+                "seq": book.sequence
+            }
+
+    # Websocket
+
+    # Снимок для нового подписчика. Номер совпадает с последней разосланной дельтой, уже учтенные в снимке
+    # изменения придут в следующей дельте повторно: дельта задает объем уровня, повтор ничего не меняет
+    def orderbook_snapshot_frame(self, symbol: str) -> dict:
+        now = self.__now_ms()
+        return {
+            "topic": f"orderbook.{ORDERBOOK_DEPTH}.{symbol}",
+            "ts": now,
+            "type": "snapshot",
+            "data": self.orderbook(symbol, ORDERBOOK_DEPTH),
+            "cts": now
+        }
+
+    def publish_orderbook(self, symbol: str):
+        with self.__lock:
+            book = self.__books[symbol]
+            changes = book.take_changes()
+            if changes is None:
+                return
+
+            bids, asks = changes
+            now = self.__now_ms()
+            self.__publisher(f"orderbook.{ORDERBOOK_DEPTH}.{symbol}", {
+                "topic": f"orderbook.{ORDERBOOK_DEPTH}.{symbol}",
+                "ts": now,
+                "type": "delta",
+                "data": {
+                    "s": symbol,
+                    "b": self.__levels(bids),
+                    "a": self.__levels(asks),
+                    "u": book.update_id,
+                    "seq": book.sequence
+                },
+                "cts": now
+            })
+
+    def publish_ticker(self, symbol: str):
+        with self.__lock:
+            stats = self.__stats[symbol]
+            change = (stats.last_price - stats.open_price) / stats.open_price
+            self.__publisher(f"tickers.{symbol}", {
+                "topic": f"tickers.{symbol}",
+                "ts": self.__now_ms(),
+                "type": "snapshot",
+                "cs": stats.trades,
+                "data": {
+                    "symbol": symbol,
+                    "lastPrice": str(stats.last_price),
+                    "highPrice24h": str(stats.high),
+                    "lowPrice24h": str(stats.low),
+                    "prevPrice24h": str(stats.open_price),
+                    "volume24h": str(stats.volume),
+                    "turnover24h": str(stats.turnover),
+                    "price24hPcnt": f"{change:.4f}",
+                    "usdIndexPrice": str(stats.last_price)
+                }
+            })
+
+    # Генератор рынка
+
+    # Синтетическая ликвидность уровня. Уменьшение сохраняет место в очереди, увеличение - в конец очереди
+    def set_liquidity(self, symbol: str, side: str, price: Decimal, size: Decimal):
+        with self.__lock:
+            book = self.__books[symbol]
+            key = (symbol, side, price)
+            order = self.__liquidity.get(key)
+
+            if order is not None and 0 < size <= order.leaves:
+                book.amend(order, price, order.filled + size)
+                return
+            if order is not None:
+                book.remove(order)
+                del self.__liquidity[key]
+            if size <= 0:
+                return
+
+            order = SimOrder(self.__next_order_id(), symbol, side, price, size, None, self.__now_ms())
+            fills = book.add(order)
+            if order.leaves > 0:
+                self.__liquidity[key] = order
+            self.__publish_orders(self.__settle(fills).values())
+
+    def liquidity_prices(self, symbol: str, side: str) -> List[Decimal]:
+        with self.__lock:
+            return [price for item_symbol, item_side, price in self.__liquidity
+                    if item_symbol == symbol and item_side == side]
+
+    # Рыночная сделка стороннего участника: исполняет книгу по приоритету цена-время, включая ордера аккаунта
+    def market_trade(self, symbol: str, side: str, qty: Decimal, limit_price: Optional[Decimal] = None) -> Decimal:
+        with self.__lock:
+            fills = self.__books[symbol].match(side, qty, limit_price)
+            self.__publish_orders(self.__settle(fills).values())
+            return sum((fill.qty for fill in fills), Decimal(0))
+
+    def best_prices(self, symbol: str) -> Tuple[Optional[Decimal], Optional[Decimal]]:
+        with self.__lock:
+            book = self.__books[symbol]
+            return book.best_bid(), book.best_ask()
+
+    def level_size(self, symbol: str, side: str, price: Decimal) -> Decimal:
+        with self.__lock:
+            return self.__books[symbol].side(side).size(price)
+
+    # Внутреннее
+
+    def __settle(self, fills: Iterable[Fill]) -> Dict[str, SimOrder]:
+        changed = {}
+        now = self.__now_ms()
+
+        for fill in fills:
+            self.__stats[fill.maker.symbol].trade(fill.price, fill.qty)
+            if fill.maker.account is None and fill.maker.leaves <= 0:
+                self.__liquidity.pop((fill.maker.symbol, fill.maker.side, fill.maker.price), None)
+
+            for order in (fill.maker, fill.taker):
+                if order is None or order.account is None:
+                    continue
+
+                self.__apply_fill(order, fill.price, fill.qty)
+                order.updated_time = now
+                changed[order.order_id] = order
+                SIM_FILLS.labels(order.symbol).inc()
+
+        for order in changed.values():
+            if order.leaves <= 0:
+                order.status = OrderStatus.Filled.value
+                self.__close(order)
+            else:
+                order.status = OrderStatus.PartiallyFilled.value
+
+        if changed:
+            self.__publish_wallet()
+
+        return changed
+
+    def __apply_fill(self, order: SimOrder, price: Decimal, qty: Decimal):
+        instrument = self.__instruments[order.symbol]
+        base, quote = instrument["baseCoin"], instrument["quoteCoin"]
+        self.__balances.setdefault(base, Decimal(0))
+        self.__balances.setdefault(quote, Decimal(0))
+
+        # Блокировка снимается по цене ордера, списание - по цене сделки
+        if order.side == Side.Buy:
+            self.__locked[quote] -= order.price * qty
+            self.__balances[quote] -= price * qty
+            self.__balances[base] += qty
+        else:
+            self.__locked[base] -= qty
+            self.__balances[base] -= qty
+            self.__balances[quote] += price * qty
+
+    def __cancel(self, order: SimOrder):
+        coin, amount = self.__order_lock(order)
+        self.__locked[coin] -= amount
+        self.__books[order.symbol].remove(order)
+
+        order.status = OrderStatus.PartiallyFilledCanceled.value if order.filled else OrderStatus.Cancelled.value
+        order.updated_time = self.__now_ms()
+        self.__close(order)
+        self.__publish_wallet()
+
+    def __close(self, order: SimOrder):
+        if self.__orders.pop(order.order_id, None) is not None:
+            self.__history.append(order)
+
+    def __publish_orders(self, orders: Iterable[SimOrder]):
+        data = [{"category": "spot", **order.to_raw()} for order in orders]
+        if not data:
+            return
+
+        self.__publisher("order", {
+            "id": str(uuid4()),
+            "topic": "order",
+            "creationTime": self.__now_ms(),
+            "data": data
+        })
+
+    def __publish_wallet(self):
+        self.__publisher("wallet", {
+            "id": str(uuid4()),
+            "topic": "wallet",
+            "creationTime": self.__now_ms(),
+            "data": [{"accountType": ACCOUNT_TYPE, "coin": self.__coins(self.__balances)}]
+        })
+
+    def __coins(self, balances: Dict[str, Decimal]) -> List[dict]:
+        result = []
+        for coin, balance in balances.items():
+            locked = self.__locked.get(coin, Decimal(0))
+            result.append({
+                "coin": coin,
+                "walletBalance": str(balance),
+                "locked": str(locked),
+                "free": str(balance - locked),
+                "availableToWithdraw": str(balance - locked),
+                "equity": str(balance),
+                "usdValue": str(balance),
+                "availableToBorrow": "",
+                "accruedInterest": "",
+                "bonus": "0",
+                "totalOrderIM": "",
+                "totalPositionMM": "",
+                "totalPositionIM": "",
+                "unrealisedPnl": "0",
+                "borrowAmount": "",
+                "cumRealisedPnl": "0"
+            })
+        return result
+
+    # Заблокированная часть остатка ордера: котируемая монета для покупки, базовая - для продажи
+    def __order_lock(self, order: SimOrder) -> Tuple[str, Decimal]:
+        instrument = self.__instruments[order.symbol]
+        if order.side == Side.Buy:
+            return instrument["quoteCoin"], order.leaves * order.price
+        return instrument["baseCoin"], order.leaves
+
+    def __free(self, coin: str) -> Decimal:
+        return self.__balances.get(coin, Decimal(0)) - self.__locked.get(coin, Decimal(0))
+
+    def __open_order(self, symbol: str, order_id: str) -> SimOrder:
+        order = self.__orders.get(order_id)
+        if order is None or order.symbol != symbol:
+            raise SimulatorError(170213, "Order does not exist.")
+        return order
+
+    def __instrument(self, symbol: str) -> dict:
+        instrument = self.__instruments.get(symbol)
+        if instrument is None:
+            raise SimulatorError(170121, "Invalid symbol.")
+        return instrument
+
+    @staticmethod
+    def __side(side: str) -> str:
+        if side not in (Side.Buy.value, Side.Sell.value):
+            raise SimulatorError(10001, f"Invalid side: {side}")
+        return side
+
+    @staticmethod
+    def __price(instrument: dict, value: str) -> Decimal:
+        price = Decimal(str(value))
+        tick_size = Decimal(instrument["priceFilter"]["tickSize"])
+        if price <= 0 or price % tick_size != 0:
+            raise SimulatorError(170134, "Order price has too many decimals.")
+        return price
+
+    @staticmethod
+    def __qty(instrument: dict, value: str) -> Decimal:
+        qty = Decimal(str(value))
+        lot_size = instrument["lotSizeFilter"]
+        if qty % Decimal(lot_size["basePrecision"]) != 0:
+            raise SimulatorError(170137, "Order quantity has too many decimals.")
+        if qty < Decimal(lot_size["minOrderQty"]) or qty > Decimal(lot_size["maxOrderQty"]):
+            raise SimulatorError(170136, "Order quantity exceeded lower or upper limit.")
+        return qty
+
+    @staticmethod
+    def __levels(levels: List[PriceLevel]) -> List[List[str]]:
+        return [[str(price), str(size)] for price, size in levels]
+
+    def __next_order_id(self) -> str:
+        return f"sim-{next(self.__order_ids)}"
+
+    @staticmethod
+    def __now_ms() -> int:
+        return int(time.time() * 1000)
+
+
+__all__ = ["SimulatedExchange", "SimulatorError", "ACCOUNT", "DEFAULT_HISTORY_LIMIT"]
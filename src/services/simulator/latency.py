@@ -0,0 +1,17 @@
+import random
+from dataclasses import dataclass
+
+
+@dataclass
+class Latency:
+    # Задержка ответа или доставки сообщения, мс: base + равномерный разброс [0, jitter)
+    base_ms: float = 0.0
+    jitter_ms: float = 0.0
+
+    def sample(self) -> float:
+        if not self.base_ms and not self.jitter_ms:
+            return 0.0
+        return (self.base_ms + random.random() * self.jitter_ms) / 1000
+
+
+__all__ = ["Latency"]
@@ -0,0 +1,194 @@
+import heapq
+import random
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from threading import Event as ThreadingEvent, Thread
+from typing import Dict, List, Optional, Tuple
+
+from core.log import logger
+from domain_models import Side
+from .exchange import SimulatedExchange
+
+# Отставание, после которого расписание событий сдвигается к текущему времени вместо пачки догоняющих событий
+MAX_LAG = 1.0
+
+
+@dataclass
+class MarketConfig:
+    # Частоты событий в секунду при speed=1. Ticker и orderbook.50 spot Bybit публикуются раз в 50 и 20 мс
+    ticker_rate: float = 20
+    orderbook_rate: float = 50
+    # Изменения объема синтетической ликвидности на случайном уровне
+    quote_rate: float = 100
+    # Рыночные сделки сторонних участников по лучшей цене
+    trade_rate: float = 10
+    # Сдвиги цены на один тик: сделка забирает весь лучший уровень
+    price_move_rate: float = 0.05
+    # Множитель всех частот: 10 - нагрузка в 10 раз выше обычной
+    speed: float = 1.0
+    levels: int = 25
+    min_size: Decimal = Decimal(1_000)
+    max_size: Decimal = Decimal(50_000)
+    # Наибольшая доля объема лучшего уровня в одной сделке
+    max_trade_fraction: float = 0.3
+    seed: Optional[int] = None
+
+
+class _SymbolMarket:
+    __slots__ = ("symbol", "tick_size", "base_precision", "center")
+
+    def __init__(self, symbol: str, tick_size: Decimal, base_precision: Decimal, center: int):
+        self.symbol = symbol
+        self.tick_size = tick_size
+        self.base_precision = base_precision
+        # Лучший bid в тиках; лучший ask - на тик выше
+        self.center = center
+
+    def price(self, ticks: int) -> Decimal:
+        return (self.tick_size * ticks).quantize(self.tick_size)
+
+
+class MarketSimulator:
+    # Генератор рынка в собственном потоке: ликвидность, сделки, сдвиги цены и публикация ticker/orderbook
+    # с заданными частотами. Ордера аккаунта исполняются этими сделками по приоритету цена-время
+    __exchange: SimulatedExchange
+    __config: MarketConfig
+    __markets: Dict[str, _SymbolMarket]
+    __random: random.Random
+    __counts: Dict[str, int]
+    __stop: ThreadingEvent
+    __thread: Thread
+
+    def __init__(self, exchange: SimulatedExchange, config: MarketConfig):
+        self.__exchange = exchange
+        self.__config = config
+        self.__random = random.Random(config.seed)
+        self.__counts = {}
+        self.__stop = ThreadingEvent()
+        self.__thread = Thread(target=self.__run, name="MarketSimulator", daemon=True)
+        self.__markets = {}
+
+        for symbol in exchange.symbols:
+            instrument = exchange.instrument(symbol)
+            tick_size = Decimal(instrument["priceFilter"]["tickSize"])
+            center = int(exchange.last_price(symbol) / tick_size)
+            self.__markets[symbol] = _SymbolMarket(
+                symbol, tick_size, Decimal(instrument["lotSizeFilter"]["basePrecision"]), center
+            )
+
+    # Количество обработанных событий по типам с момента запуска
+    @property
+    def counts(self) -> Dict[str, int]:
+        return dict(self.__counts)
+
+    def start(self):
+        for market in self.__markets.values():
+            for level in range(self.__config.levels):
+                self.__exchange.set_liquidity(market.symbol, Side.Buy, market.price(market.center - level),
+                                              self.__size(market))
+                self.__exchange.set_liquidity(market.symbol, Side.Sell, market.price(market.center + 1 + level),
+                                              self.__size(market))
+            self.__exchange.publish_orderbook(market.symbol)
+
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        self.__thread.join(timeout=5)
+
+    def __run(self):
+        config = self.__config
+        rates = {
+            "ticker": config.ticker_rate,
+            "orderbook": config.orderbook_rate,
+            "quote": config.quote_rate,
+            "trade": config.trade_rate,
+            "move": config.price_move_rate
+        }
+        handlers = {
+            "ticker": lambda market: self.__exchange.publish_ticker(market.symbol),
+            "orderbook": lambda market: self.__exchange.publish_orderbook(market.symbol),
+            "quote": self.__quote,
+            "trade": self.__trade,
+            "move": self.__move
+        }
+
+        now = time.perf_counter()
+        schedule: List[Tuple[float, str, str]] = []
+        for symbol in self.__markets:
+            for kind, rate in rates.items():
+                if rate > 0:
+                    heapq.heappush(schedule, (now + self.__random.random() / (rate * config.speed), kind, symbol))
+
+        while schedule and not self.__stop.is_set():
+            due, kind, symbol = schedule[0]
+            delay = due - time.perf_counter()
+            if delay > 0 and self.__stop.wait(delay):
+                break
+
+            try:
+                handlers[kind](self.__markets[symbol])
+            except Exception as ex:
+                logger.critical(ex, exc_info=True)
+            self.__counts[kind] = self.__counts.get(kind, 0) + 1
+
+            interval = 1 / (rates[kind] * config.speed)
+            next_due = due + interval
+            now = time.perf_counter()
+            if now - next_due > MAX_LAG:
+                next_due = now + interval
+            heapq.heapreplace(schedule, (next_due, kind, symbol))
+
+    def __quote(self, market: _SymbolMarket):
+        level = self.__random.randrange(self.__config.levels)
+        if self.__random.random() < 0.5:
+            self.__exchange.set_liquidity(market.symbol, Side.Buy, market.price(market.center - level),
+                                          self.__size(market))
+        else:
+            self.__exchange.set_liquidity(market.symbol, Side.Sell, market.price(market.center + 1 + level),
+                                          self.__size(market))
+
+    # Сделка по лучшему уровню; исполненный объем генератор сразу возвращает в конец очереди уровня
+    def __trade(self, market: _SymbolMarket):
+        side = Side.Buy if self.__random.random() < 0.5 else Side.Sell
+        maker_side, price = (Side.Sell, market.price(market.center + 1)) if side == Side.Buy \
+            else (Side.Buy, market.price(market.center))
+
+        level_size = self.__exchange.level_size(market.symbol, maker_side, price)
+        qty = (level_size * Decimal(self.__random.random() * self.__config.max_trade_fraction)) \
+            .quantize(market.base_precision)
+        if qty <= 0:
+            return
+
+        self.__exchange.market_trade(market.symbol, side, qty, price)
+        self.__exchange.set_liquidity(market.symbol, maker_side, price, self.__size(market))
+
+    # Сдвиг на тик: лучший уровень в сторону движения исполняется целиком, окно ликвидности смещается
+    def __move(self, market: _SymbolMarket):
+        levels = self.__config.levels
+        exchange = self.__exchange
+
+        if self.__random.random() < 0.5:
+            price = market.price(market.center + 1)
+            exchange.market_trade(market.symbol, Side.Buy, exchange.level_size(market.symbol, Side.Sell, price), price)
+            market.center += 1
+            exchange.set_liquidity(market.symbol, Side.Buy, price, self.__size(market))
+            exchange.set_liquidity(market.symbol, Side.Sell, market.price(market.center + levels), self.__size(market))
+            exchange.set_liquidity(market.symbol, Side.Buy, market.price(market.center - levels), Decimal(0))
+        else:
+            price = market.price(market.center)
+            exchange.market_trade(market.symbol, Side.Sell, exchange.level_size(market.symbol, Side.Buy, price), price)
+            market.center -= 1
+            exchange.set_liquidity(market.symbol, Side.Sell, price, self.__size(market))
+            exchange.set_liquidity(market.symbol, Side.Buy, market.price(market.center - levels + 1),
+                                   self.__size(market))
+            exchange.set_liquidity(market.symbol, Side.Sell, market.price(market.center + 1 + levels), Decimal(0))
+
+    def __size(self, market: _SymbolMarket) -> Decimal:
+        config = self.__config
+        size = config.min_size + (config.max_size - config.min_size) * Decimal(self.__random.random())
+        return max(size.quantize(market.base_precision), market.base_precision)
+
+
+__all__ = ["MarketSimulator", "MarketConfig"]
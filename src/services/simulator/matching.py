@@ -0,0 +1,270 @@
+from bisect import bisect_left
+from collections import deque
+from decimal import Decimal
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from domain_models import OrderStatus, Side
+
+PriceLevel = Tuple[Decimal, Decimal]
+
+
+class SimOrder:
+    # Ордер в книге симулятора. account=None - синтетическая ликвидность генератора рынка
+    __slots__ = ("order_id", "symbol", "side", "price", "qty", "filled", "status", "account",
+                 "created_time", "updated_time")
+
+    order_id: str
+    symbol: str
+    side: str
+    price: Decimal
+    qty: Decimal
+    filled: Decimal
+    status: str
+    account: Optional[str]
+    created_time: int
+    updated_time: int
+
+    def __init__(self, order_id: str, symbol: str, side: str, price: Decimal, qty: Decimal,
+                 account: Optional[str], timestamp: int):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.side = side
+        self.price = price
+        self.qty = qty
+        self.filled = Decimal(0)
+        self.status = OrderStatus.New.value
+        self.account = account
+        self.created_time = timestamp
+        self.updated_time = timestamp
+
+    @property
+    def leaves(self) -> Decimal:
+        return self.qty - self.filled
+
+    def to_raw(self) -> dict:
+        return {
+            "orderId": self.order_id,
+            "orderLinkId": "",
+            "symbol": self.symbol,
+            "side": self.side,
+            "orderType": "Limit",
+            "timeInForce": "GTC",
+            "price": str(self.price),
+            "qty": str(self.qty),
+            "cumExecQty": str(self.filled),
+            "leavesQty": str(self.leaves),
+            "orderStatus": self.status,
+            "cancelType": "UNKNOWN",
+            "orderIv": "",
+            "createdTime": str(self.created_time),
+            "updatedTime": str(self.updated_time)
+        }
+
+    def __repr__(self):
+        return (f"SimOrder(order_id={self.order_id}, side={self.side}, price={self.price}, "
+                f"qty={self.qty}, filled={self.filled}, status={self.status})")
+
+
+class Fill:
+    __slots__ = ("maker", "taker", "price", "qty")
+
+    maker: SimOrder
+    taker: Optional[SimOrder]
+    price: Decimal
+    qty: Decimal
+
+    def __init__(self, maker: SimOrder, taker: Optional[SimOrder], price: Decimal, qty: Decimal):
+        self.maker = maker
+        self.taker = taker
+        self.price = price
+        self.qty = qty
+
+
+class _BookSide:
+    __slots__ = ("__prices", "__levels", "__sizes", "__is_bid", "changed")
+
+    __prices: List[Decimal]
+    __levels: Dict[Decimal, Deque[SimOrder]]
+    __sizes: Dict[Decimal, Decimal]
+    __is_bid: bool
+    changed: Set[Decimal]
+
+    # Цены по возрастанию для обеих сторон, как в services.orderbook: лучший bid в конце, лучший ask в начале
+    def __init__(self, is_bid: bool):
+        self.__prices = []
+        self.__levels = {}
+        self.__sizes = {}
+        self.__is_bid = is_bid
+        self.changed = set()
+
+    def best(self) -> Optional[Decimal]:
+        if not self.__prices:
+            return None
+        return self.__prices[-1] if self.__is_bid else self.__prices[0]
+
+    def size(self, price: Decimal) -> Decimal:
+        return self.__sizes.get(price, Decimal(0))
+
+    def queue(self, price: Decimal) -> Deque[SimOrder]:
+        return self.__levels.get(price) or deque()
+
+    # Уровни от лучшего к худшему
+    def levels(self, depth: int) -> List[PriceLevel]:
+        prices = self.__prices[-depth:][::-1] if self.__is_bid else self.__prices[:depth]
+        return [(price, self.__sizes[price]) for price in prices]
+
+    def prices(self) -> List[Decimal]:
+        return list(self.__prices)
+
+    def append(self, order: SimOrder):
+        level = self.__levels.get(order.price)
+        if level is None:
+            level = self.__levels[order.price] = deque()
+            self.__prices.insert(bisect_left(self.__prices, order.price), order.price)
+            self.__sizes[order.price] = Decimal(0)
+
+        level.append(order)
+        self.__sizes[order.price] += order.leaves
+        self.changed.add(order.price)
+
+    def remove(self, order: SimOrder):
+        level = self.__levels.get(order.price)
+        if level is None:
+            return
+
+        try:
+            level.remove(order)
+        except ValueError:
+            return
+
+        self.__sizes[order.price] -= order.leaves
+        self.changed.add(order.price)
+        if not level:
+            self.__drop_level(order.price)
+
+    # Исполнение головы очереди уровня: объем уровня уменьшается вместе с ордером
+    def fill_head(self, price: Decimal, qty: Decimal):
+        level = self.__levels[price]
+        order = level[0]
+        order.filled += qty
+        self.__sizes[price] -= qty
+        self.changed.add(price)
+
+        if order.leaves <= 0:
+            level.popleft()
+            if not level:
+                self.__drop_level(price)
+
+    def reduce(self, order: SimOrder, qty: Decimal):
+        self.__sizes[order.price] -= qty
+        self.changed.add(order.price)
+
+    def __drop_level(self, price: Decimal):
+        del self.__levels[price]
+        del self.__sizes[price]
+        index = bisect_left(self.__prices, price)
+        del self.__prices[index]
+
+
+class MatchingBook:
+    # Книга одной пары с приоритетом цена-время: внутри уровня ордера исполняются в порядке постановки
+    __symbol: str
+    __bids: _BookSide
+    __asks: _BookSide
+    __update_id: int
+    __sequence: int
+
+    def __init__(self, symbol: str):
+        self.__symbol = symbol
+        self.__bids = _BookSide(True)
+        self.__asks = _BookSide(False)
+        self.__update_id = 0
+        self.__sequence = 0
+
+    @property
+    def symbol(self) -> str:
+        return self.__symbol
+
+    @property
+    def update_id(self) -> int:
+        return self.__update_id
+
+    @property
+    def sequence(self) -> int:
+        return self.__sequence
+
+    def best_bid(self) -> Optional[Decimal]:
+        return self.__bids.best()
+
+    def best_ask(self) -> Optional[Decimal]:
+        return self.__asks.best()
+
+    def side(self, side: str) -> _BookSide:
+        return self.__bids if side == Side.Buy else self.__asks
+
+    def depth(self, depth: int) -> Tuple[List[PriceLevel], List[PriceLevel]]:
+        return self.__bids.levels(depth), self.__asks.levels(depth)
+
+    # Лимитный ордер: пересекающая часть исполняется сразу, остаток встает в очередь своего уровня
+    def add(self, order: SimOrder) -> List[Fill]:
+        fills = self.match(order.side, order.leaves, order.price, order)
+        if order.leaves > 0:
+            self.side(order.side).append(order)
+        return fills
+
+    # Встречное исполнение от лучшей цены; limit_price=None - рыночный ордер
+    def match(self, side: str, qty: Decimal, limit_price: Optional[Decimal] = None,
+              taker: Optional[SimOrder] = None) -> List[Fill]:
+        fills = []
+        opposite = self.__asks if side == Side.Buy else self.__bids
+
+        while qty > 0:
+            price = opposite.best()
+            if price is None:
+                break
+            if limit_price is not None and (price > limit_price if side == Side.Buy else price < limit_price):
+                break
+
+            maker = opposite.queue(price)[0]
+            fill_qty = min(qty, maker.leaves)
+            opposite.fill_head(price, fill_qty)
+            if taker is not None:
+                taker.filled += fill_qty
+
+            qty -= fill_qty
+            fills.append(Fill(maker, taker, price, fill_qty))
+
+        return fills
+
+    def remove(self, order: SimOrder):
+        self.side(order.side).remove(order)
+
+    # Изменение цены или увеличение объема ставит ордер в конец очереди, уменьшение сохраняет приоритет
+    def amend(self, order: SimOrder, price: Decimal, qty: Decimal) -> List[Fill]:
+        book_side = self.side(order.side)
+
+        if price == order.price and qty <= order.qty:
+            book_side.reduce(order, order.qty - qty)
+            order.qty = qty
+            return []
+
+        book_side.remove(order)
+        order.price = price
+        order.qty = qty
+        return self.add(order)
+
+    # Изменившиеся с прошлого вызова уровни для delta-сообщения; None - изменений не было
+    def take_changes(self) -> Optional[Tuple[List[PriceLevel], List[PriceLevel]]]:
+        if not self.__bids.changed and not self.__asks.changed:
+            return None
+
+        bids = [(price, self.__bids.size(price)) for price in sorted(self.__bids.changed, reverse=True)]
+        asks = [(price, self.__asks.size(price)) for price in sorted(self.__asks.changed)]
+        self.__bids.changed.clear()
+        self.__asks.changed.clear()
+        self.__update_id += 1
+        self.__sequence += 1
+        return bids, asks
+
+
+__all__ = ["MatchingBook", "SimOrder", "Fill", "PriceLevel"]
@@ -0,0 +1,285 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from api.bybit_client.scheduler import LIMIT_STATUS_HEADER, LIMIT_RESET_HEADER
+from core.log import logger
+from core.metrics import registry
+from .exchange import SimulatedExchange, SimulatorError
+from .latency import Latency
+
+LIMIT_HEADER = "X-Bapi-Limit"
+# Размер страницы списков ордеров по умолчанию и наибольший, как у Bybit
+DEFAULT_PAGE_LIMIT = 20
+MAX_PAGE_LIMIT = 50
+
+SIM_REST_REQUESTS = registry.counter("simulator_rest_requests_total", "REST-запросы к симулятору", ("path",))
+
+Route = Callable[[Dict[str, Any]], Tuple[Any, Optional[dict]]]
+
+
+class _RateWindow:
+    # Лимит запросов эндпоинта в секунду: фиксированное окно, как в заголовках X-Bapi-Limit-*
+    __slots__ = ("limit", "started", "count")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.started = 0.0
+        self.count = 0
+
+    def acquire(self, now: float) -> Tuple[bool, int, int]:
+        if now - self.started >= 1:
+            self.started = now
+            self.count = 0
+
+        self.count += 1
+        reset_ms = int((self.started + 1) * 1000)
+        return self.count <= self.limit, max(self.limit - self.count, 0), reset_ms
+
+
+class SimulatorRestServer:
+    # Подмножество REST API Bybit v5, которое использует BybitClient; ответы в формате pybit
+    __exchange: SimulatedExchange
+    __latency: Latency
+    __rate_limit: int
+    __windows: Dict[str, _RateWindow]
+    __windows_lock: Lock
+    __routes: Dict[Tuple[str, str], Route]
+    __server: ThreadingHTTPServer
+    __thread: Thread
+
+    # rate_limit: запросов в секунду на эндпоинт, 0 - без ограничения
+    def __init__(
+            self,
+            exchange: SimulatedExchange,
+            port: int = 0,
+            host: str = "127.0.0.1",
+            latency: Optional[Latency] = None,
+            rate_limit: int = 0
+    ):
+        self.__exchange = exchange
+        self.__latency = latency or Latency()
+        self.__rate_limit = rate_limit
+        self.__windows = {}
+        self.__windows_lock = Lock()
+        self.__routes = {
+            ("POST", "/v5/order/create"): self.__create,
+            ("POST", "/v5/order/create-batch"): self.__create_batch,
+            ("POST", "/v5/order/amend"): self.__amend,
+            ("POST", "/v5/order/amend-batch"): self.__amend_batch,
+            ("POST", "/v5/order/cancel"): self.__cancel,
+            ("POST", "/v5/order/cancel-batch"): self.__cancel_batch,
+            ("POST", "/v5/order/cancel-all"): self.__cancel_all,
+            ("GET", "/v5/order/realtime"): self.__open_orders,
+            ("GET", "/v5/order/history"): self.__order_history,
+            ("GET", "/v5/account/wallet-balance"): self.__wallet_balance,
+            ("GET", "/v5/market/instruments-info"): self.__instruments_info,
+            ("GET", "/v5/market/orderbook"): self.__orderbook
+        }
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                self.__respond(*server.handle("GET", url.path, dict(parse_qsl(url.query))))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                try:
+                    params = json.loads(body) if body else {}
+                except ValueError:
+                    params = None
+                self.__respond(*server.handle("POST", urlsplit(self.path).path, params))
+
+            def __respond(self, status: int, payload: dict, headers: Dict[str, str]):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer((host, port), Handler)
+        self.__server.daemon_threads = True
+        self.__thread = Thread(target=self.__server.serve_forever, name="SimulatorRest", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.__server.server_address[1]
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.__thread.start()
+        logger.info("(simulator) REST %s", self.endpoint)
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    # Возвращает HTTP-статус, тело ответа и заголовки лимита
+    def handle(self, method: str, path: str, params: Optional[Dict[str, Any]]) -> Tuple[int, dict, Dict[str, str]]:
+        route = self.__routes.get((method, path))
+        if route is None:
+            return 404, self.__response(10404, "Not found"), {}
+        if params is None:
+            return 200, self.__response(10001, "Invalid JSON body"), {}
+
+        SIM_REST_REQUESTS.labels(path).inc()
+
+        delay = self.__latency.sample()
+        if delay:
+            time.sleep(delay)
+
+        headers = {}
+        if self.__rate_limit:
+            with self.__windows_lock:
+                window = self.__windows.setdefault(path, _RateWindow(self.__rate_limit))
+                allowed, remaining, reset_ms = window.acquire(time.time())
+
+            headers = {
+                LIMIT_HEADER: str(self.__rate_limit),
+                LIMIT_STATUS_HEADER: str(remaining),
+                LIMIT_RESET_HEADER: str(reset_ms)
+            }
+            if not allowed:
+                return 200, self.__response(10006, "Too many visits!"), headers
+
+        try:
+            result, ext_info = route(params)
+        except SimulatorError as ex:
+            return 200, self.__response(ex.code, str(ex)), headers
+        except (KeyError, ValueError, ArithmeticError) as ex:
+            return 200, self.__response(10001, f"Params error: {ex!r}"), headers
+
+        return 200, self.__response(0, "OK", result, ext_info), headers
+
+    @staticmethod
+    def __response(code: int, message: str, result: Any = None, ext_info: Optional[dict] = None) -> dict:
+        return {
+            "retCode": code,
+            "retMsg": message,
+            "result": result if result is not None else {},
+            "retExtInfo": ext_info or {},
+            "time": int(time.time() * 1000)
+        }
+
+    # Маршруты
+
+    def __create(self, params: dict):
+        order = self.__place(params)
+        return {"orderId": order["orderId"], "orderLinkId": ""}, None
+
+    def __create_batch(self, params: dict):
+        return self.__batch(params, lambda item: {
+            "category": params.get("category", "spot"),
+            "symbol": item["symbol"],
+            "orderId": self.__place(item)["orderId"],
+            "orderLinkId": "",
+            "createAt": str(int(time.time() * 1000))
+        }, {"category": "", "symbol": "", "orderId": "", "orderLinkId": "", "createAt": ""})
+
+    def __amend(self, params: dict):
+        return self.__exchange.amend_order(
+            params["symbol"], params["orderId"], params.get("price"), params.get("qty")
+        ), None
+
+    def __amend_batch(self, params: dict):
+        return self.__batch(params, lambda item: {
+            "category": params.get("category", "spot"),
+            "symbol": item["symbol"],
+            **self.__exchange.amend_order(item["symbol"], item["orderId"], item.get("price"), item.get("qty"))
+        }, {"category": "", "symbol": "", "orderId": "", "orderLinkId": ""})
+
+    def __cancel(self, params: dict):
+        return self.__exchange.cancel_order(params["symbol"], params["orderId"]), None
+
+    def __cancel_batch(self, params: dict):
+        return self.__batch(params, lambda item: {
+            "category": params.get("category", "spot"),
+            "symbol": item["symbol"],
+            **self.__exchange.cancel_order(item["symbol"], item["orderId"])
+        }, {"category": "", "symbol": "", "orderId": "", "orderLinkId": ""})
+
+    def __cancel_all(self, params: dict):
+        return {"list": self.__exchange.cancel_all(params.get("symbol")), "success": "1"}, None
+
+    def __open_orders(self, params: dict):
+        return self.__page(params, self.__exchange.open_orders(params.get("symbol"))), None
+
+    def __order_history(self, params: dict):
+        start_time = int(params["startTime"]) if params.get("startTime") else None
+        return self.__page(params, self.__exchange.order_history(params.get("symbol"), start_time)), None
+
+    def __wallet_balance(self, params: dict):
+        coins = self.__exchange.wallet()
+        return {"list": [{
+            "accountType": params.get("accountType", "SPOT"),
+            "totalEquity": "",
+            "accountIMRate": "",
+            "accountMMRate": "",
+            "totalPerpUPL": "0",
+            "accountLTV": "",
+            "totalMaintenanceMargin": "",
+            "coin": coins
+        }]}, None
+
+    def __instruments_info(self, params: dict):
+        symbols = [params["symbol"]] if params.get("symbol") else self.__exchange.symbols
+        return {
+            "category": params.get("category", "spot"),
+            "list": [self.__exchange.instrument(symbol) for symbol in symbols],
+            "nextPageCursor": ""
+        }, None
+
+    def __orderbook(self, params: dict):
+        return self.__exchange.orderbook(params["symbol"], int(params.get("limit") or 1)), None
+
+    def __place(self, params: dict) -> dict:
+        if params.get("orderType", "Limit") != "Limit":
+            raise SimulatorError(10001, "Only limit orders are supported")
+        return self.__exchange.place_order(params["symbol"], params["side"], params["price"], params["qty"])
+
+    # Ошибка одного ордера пачки не отменяет остальные: код и сообщение - в retExtInfo.list
+    @staticmethod
+    def __batch(params: dict, execute: Callable[[dict], dict], empty: dict):
+        items = []
+        statuses = []
+
+        for item in params["request"]:
+            try:
+                items.append(execute(item))
+                statuses.append({"code": 0, "msg": "OK"})
+            except SimulatorError as ex:
+                items.append(dict(empty))
+                statuses.append({"code": ex.code, "msg": str(ex)})
+
+        return {"list": items}, {"list": statuses}
+
+    @staticmethod
+    def __page(params: dict, items: List[dict]) -> dict:
+        limit = min(int(params.get("limit") or DEFAULT_PAGE_LIMIT), MAX_PAGE_LIMIT)
+        offset = int(params.get("cursor") or 0)
+        end = offset + limit
+        return {
+            "category": params.get("category", "spot"),
+            "list": items[offset:end],
+            "nextPageCursor": str(end) if end < len(items) else ""
+        }
+
+
+__all__ = ["SimulatorRestServer"]
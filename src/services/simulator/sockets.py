@@ -0,0 +1,263 @@
+import asyncio
+import itertools
+import json
+import time
+from threading import Event as ThreadingEvent, Thread
+from typing import Dict, Optional, Set
+
+from websockets.asyncio.server import ServerConnection, serve
+from websockets.exceptions import ConnectionClosed
+
+from api.bybit_client.websockets import ORDERBOOK_DEPTH
+from core.log import logger
+from core.metrics import registry
+from .exchange import SimulatedExchange
+from .latency import Latency
+
+PUBLIC_PATH = "/v5/public/spot"
+PRIVATE_PATH = "/v5/private"
+PRIVATE_TOPICS = ("order", "wallet")
+# Очередь неотправленных сообщений соединения: медленный клиент отключается, как на бирже
+DEFAULT_MAX_QUEUE = 10_000
+
+SIM_WS_FRAMES = registry.counter("simulator_ws_frames_total", "Сообщения, отправленные клиентам симулятора",
+                                 ("topic",))
+SIM_WS_CONNECTIONS = registry.gauge("simulator_ws_connections", "Открытые соединения websocket симулятора")
+SIM_WS_DROPPED = registry.counter("simulator_ws_dropped_total", "Соединения, отключенные из-за переполнения очереди")
+
+
+class _Connection:
+    __slots__ = ("socket", "conn_id", "is_private", "is_authorized", "topics", "queue", "last_due")
+
+    socket: ServerConnection
+    conn_id: str
+    is_private: bool
+    is_authorized: bool
+    topics: Set[str]
+    queue: asyncio.Queue
+    last_due: float
+
+    def __init__(self, socket: ServerConnection, conn_id: str, is_private: bool, max_queue: int):
+        self.socket = socket
+        self.conn_id = conn_id
+        self.is_private = is_private
+        self.is_authorized = False
+        self.topics = set()
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.last_due = 0.0
+
+
+class SimulatorWebsocketServer:
+    # Публичный (tickers, orderbook.50) и приватный (order, wallet) websocket Bybit v5 в собственном потоке
+    # с event loop. Кадры биржи поступают из любых потоков через publish и доставляются с заданной задержкой,
+    # порядок сообщений соединения сохраняется
+    __exchange: SimulatedExchange
+    __host: str
+    __port: int
+    __latency: Latency
+    __max_queue: int
+    __subscribers: Dict[str, Set[_Connection]]
+    __loop: Optional[asyncio.AbstractEventLoop]
+    __stopped: Optional[asyncio.Future]
+    __ready: ThreadingEvent
+    __thread: Thread
+
+    def __init__(
+            self,
+            exchange: SimulatedExchange,
+            port: int = 0,
+            host: str = "127.0.0.1",
+            latency: Optional[Latency] = None,
+            max_queue: int = DEFAULT_MAX_QUEUE
+    ):
+        self.__exchange = exchange
+        self.__host = host
+        self.__port = port
+        self.__latency = latency or Latency()
+        self.__max_queue = max_queue
+        self.__subscribers = {}
+        self.__loop = None
+        self.__stopped = None
+        self.__ready = ThreadingEvent()
+        self.__thread = Thread(target=self.__run, name="SimulatorWebsocket", daemon=True)
+        self.__conn_ids = itertools.count(1)
+
+    @property
+    def port(self) -> int:
+        return self.__port
+
+    @property
+    def endpoint(self) -> str:
+        return f"ws://{self.__host}:{self.__port}"
+
+    def start(self):
+        self.__thread.start()
+        if not self.__ready.wait(timeout=10):
+            raise Exception("[simulator] websocket-сервер не запустился")
+
+        self.__exchange.set_publisher(self.publish)
+        logger.info("(simulator) websocket %s", self.endpoint)
+
+    def stop(self):
+        self.__exchange.set_publisher(lambda topic, frame: None)
+        if self.__loop and self.__stopped:
+            self.__loop.call_soon_threadsafe(self.__stopped.set_result, None)
+        self.__thread.join(timeout=5)
+
+    # Вызывается биржей под ее блокировкой: только передает кадр в event loop
+    def publish(self, topic: str, frame: dict):
+        loop = self.__loop
+        if loop is not None and topic in self.__subscribers:
+            loop.call_soon_threadsafe(self.__dispatch, topic, frame)
+
+    def __run(self):
+        self.__loop = asyncio.new_event_loop()
+        try:
+            self.__loop.run_until_complete(self.__serve())
+        finally:
+            self.__loop.close()
+
+    async def __serve(self):
+        self.__stopped = self.__loop.create_future()
+        async with serve(self.__handle, self.__host, self.__port) as server:
+            self.__port = server.sockets[0].getsockname()[1]
+            self.__ready.set()
+            await self.__stopped
+
+    def __dispatch(self, topic: str, frame: dict):
+        connections = self.__subscribers.get(topic)
+        if not connections:
+            return
+
+        data = json.dumps(frame)
+        for connection in list(connections):
+            self.__enqueue(connection, data)
+        SIM_WS_FRAMES.labels(topic).inc(len(connections))
+
+    def __enqueue(self, connection: _Connection, data: str):
+        due = max(self.__loop.time() + self.__latency.sample(), connection.last_due)
+        connection.last_due = due
+
+        try:
+            connection.queue.put_nowait((due, data))
+        except asyncio.QueueFull:
+            logger.warning("(simulator) соединение %s не успевает читать, отключаем", connection.conn_id)
+            SIM_WS_DROPPED.labels().inc()
+            self.__detach(connection)
+            self.__loop.create_task(connection.socket.close(code=1013, reason="queue overflow"))
+
+    async def __handle(self, socket: ServerConnection):
+        path = socket.request.path.split("?")[0]
+        if path not in (PUBLIC_PATH, PRIVATE_PATH):
+            await socket.close(code=1008, reason=f"unknown path {path}")
+            return
+
+        connection = _Connection(socket, str(next(self.__conn_ids)), path == PRIVATE_PATH, self.__max_queue)
+        sender = asyncio.create_task(self.__send_loop(connection))
+        SIM_WS_CONNECTIONS.labels().inc()
+
+        try:
+            async for message in socket:
+                self.__on_message(connection, message)
+        except ConnectionClosed:
+            pass
+        finally:
+            self.__detach(connection)
+            sender.cancel()
+            SIM_WS_CONNECTIONS.labels().inc(-1)
+
+    async def __send_loop(self, connection: _Connection):
+        try:
+            while True:
+                due, data = await connection.queue.get()
+                delay = due - self.__loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await connection.socket.send(data)
+        except ConnectionClosed:
+            pass
+
+    def __on_message(self, connection: _Connection, message):
+        try:
+            request = json.loads(message)
+        except ValueError:
+            self.__reply(connection, {"success": False, "ret_msg": "invalid json", "conn_id": connection.conn_id})
+            return
+
+        op = request.get("op")
+        req_id = request.get("req_id")
+        args = request.get("args") or []
+
+        if op == "ping":
+            if connection.is_private:
+                self.__reply(connection, {"req_id": req_id, "op": "pong", "args": [str(int(time.time() * 1000))],
+                                          "conn_id": connection.conn_id})
+            else:
+                self.__reply(connection, {"success": True, "ret_msg": "pong", "conn_id": connection.conn_id,
+                                          "req_id": req_id, "op": "ping"})
+        elif op == "auth":
+            # Подпись не проверяется: у симулятора один аккаунт
+            connection.is_authorized = connection.is_private
+            self.__reply(connection, {"success": connection.is_authorized,
+                                      "ret_msg": "" if connection.is_authorized else "auth on public channel",
+                                      "op": "auth", "conn_id": connection.conn_id})
+        elif op == "subscribe":
+            errors = [error for error in (self.__validate(connection, topic) for topic in args) if error]
+            error = errors[0] if errors else None
+            self.__reply(connection, {"success": error is None, "ret_msg": error or "", "conn_id": connection.conn_id,
+                                      "req_id": req_id, "op": "subscribe"})
+            if error is None:
+                for topic in args:
+                    self.__subscribe(connection, topic)
+        elif op == "unsubscribe":
+            for topic in args:
+                connection.topics.discard(topic)
+                self.__remove_subscriber(topic, connection)
+            self.__reply(connection, {"success": True, "ret_msg": "", "conn_id": connection.conn_id,
+                                      "req_id": req_id, "op": "unsubscribe"})
+        else:
+            self.__reply(connection, {"success": False, "ret_msg": f"unknown op {op}", "conn_id": connection.conn_id,
+                                      "req_id": req_id, "op": op})
+
+    def __validate(self, connection: _Connection, topic: str) -> Optional[str]:
+        if connection.is_private:
+            if topic not in PRIVATE_TOPICS:
+                return f"unsupported private topic {topic}"
+            if not connection.is_authorized:
+                return "request not authorized"
+            return None
+
+        kind, _, symbol = topic.rpartition(".")
+        if kind not in ("tickers", f"orderbook.{ORDERBOOK_DEPTH}"):
+            return f"unsupported public topic {topic}"
+        if symbol not in self.__exchange.symbols:
+            return f"unknown symbol {symbol}"
+        return None
+
+    def __subscribe(self, connection: _Connection, topic: str):
+        connection.topics.add(topic)
+        self.__subscribers.setdefault(topic, set()).add(connection)
+
+        # Снимок стакана сразу после подписки, как у Bybit; следующие сообщения - дельты
+        if topic.startswith("orderbook."):
+            self.__enqueue(connection, json.dumps(self.__exchange.orderbook_snapshot_frame(topic.rpartition(".")[2])))
+
+    def __reply(self, connection: _Connection, payload: dict):
+        self.__enqueue(connection, json.dumps(payload))
+
+    def __detach(self, connection: _Connection):
+        for topic in list(connection.topics):
+            self.__remove_subscriber(topic, connection)
+        connection.topics.clear()
+
+    def __remove_subscriber(self, topic: str, connection: _Connection):
+        connections = self.__subscribers.get(topic)
+        if connections is None:
+            return
+
+        connections.discard(connection)
+        if not connections:
+            del self.__subscribers[topic]
+
+
+__all__ = ["SimulatorWebsocketServer", "PUBLIC_PATH", "PRIVATE_PATH"]
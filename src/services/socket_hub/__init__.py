@@ -0,0 +1,258 @@
+from threading import RLock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from pybit.unified_trading import WebSocket
+
+from api.bybit_client.websockets import WebsocketBase
+from core.log import logger
+from core.metrics import registry, MetricValue
+from schemas import SocketOperation
+
+Handler = Callable[[Any], None]
+OperationHandler = Callable[[SocketOperation], None]
+
+WS_MESSAGES = registry.counter("bybit_ws_messages_total", "Сообщения сокета по топикам", ("channel", "topic"))
+
+
+# Ключ маршрутизации топика: orderbook.50.USDCUSDT -> orderbook.USDCUSDT. Глубина в топике сообщения может
+# отличаться от подписки, например в записи другой глубины при воспроизведении
+def route_key(topic: str) -> str:
+    if topic.startswith("orderbook."):
+        return f"orderbook.{topic.rsplit('.', 1)[-1]}"
+    return topic
+
+
+class _TopicEntry:
+    __slots__ = ("stream", "handlers", "messages")
+
+    stream: WebsocketBase
+    handlers: Dict[str, Tuple[Handler, ...]]
+    messages: MetricValue
+
+    def __init__(self, stream: WebsocketBase, messages: MetricValue):
+        self.stream = stream
+        self.handlers = {}
+        self.messages = messages
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.handlers
+
+    def fire(self, data):
+        parts = self.stream.split(data)
+
+        if parts is None:
+            for handlers in self.handlers.values():
+                _call_handlers(handlers, data)
+            return
+
+        for symbol, part in parts.items():
+            handlers = self.handlers.get(symbol)
+            if handlers:
+                _call_handlers(handlers, part)
+
+
+def _call_handlers(handlers: Tuple[Callable, ...], arg):
+    # Ошибка одного подписчика не должна лишать данных остальных
+    for handler in handlers:
+        try:
+            handler(arg)
+        except Exception as ex:
+            logger.critical(ex, exc_info=True)
+
+
+class SocketConnection:
+    # Одно соединение pybit на тип канала; сообщения раздаются по топику через словарь
+    __channel_type: str
+    __stream: WebsocketBase
+    __socket: WebSocket
+    __topics: Dict[str, _TopicEntry]
+    __operation_handlers: Tuple[OperationHandler, ...]
+
+    def __init__(self, stream: WebsocketBase, channel_type: str):
+        self.__channel_type = channel_type
+        self.__stream = stream
+        self.__topics = {}
+        self.__operation_handlers = ()
+
+        self.__socket = stream.connect(channel_type)
+        stream.attach(self.__socket, self.__on_message)
+
+    @property
+    def channel_type(self) -> str:
+        return self.__channel_type
+
+    @property
+    def socket(self) -> WebSocket:
+        return self.__socket
+
+    @property
+    def topics(self) -> List[str]:
+        return list(self.__topics)
+
+    def subscribe(self, stream: WebsocketBase, symbol: str, handler: Handler):
+        topic = stream.topic(symbol)
+        entry = self.__topics.get(route_key(topic))
+
+        if entry is None:
+            entry = _TopicEntry(stream, WS_MESSAGES.labels(self.__channel_type, topic))
+            # Словарь заменяется целиком: поток сокета читает его без блокировки
+            self.__topics = {**self.__topics, route_key(topic): entry}
+            stream.subscribe(self.__socket, symbol, entry.fire)
+            logger.info(f"(socket hub) [{self.__channel_type}] подписка {topic}")
+
+        entry.handlers = {**entry.handlers, symbol: entry.handlers.get(symbol, ()) + (handler,)}
+
+    def unsubscribe(self, stream: WebsocketBase, symbol: str, handler: Handler):
+        topic = stream.topic(symbol)
+        entry = self.__topics.get(route_key(topic))
+
+        if entry is None:
+            return
+
+        handlers = tuple(item for item in entry.handlers.get(symbol, ()) if item != handler)
+        symbol_handlers = {key: value for key, value in entry.handlers.items() if key != symbol}
+        if handlers:
+            symbol_handlers[symbol] = handlers
+        entry.handlers = symbol_handlers
+
+        if entry.is_empty:
+            self.__topics = {key: value for key, value in self.__topics.items() if key != route_key(topic)}
+            try:
+                stream.unsubscribe(self.__socket, symbol)
+            except Exception as ex:
+                logger.warning(f"(socket hub) [{self.__channel_type}] Ошибка отписки {topic}. {ex}")
+            logger.info(f"(socket hub) [{self.__channel_type}] отписка {topic}")
+
+    # Повторная подписка на топик: биржа отвечает на нее свежим снимком
+    def resubscribe(self, stream: WebsocketBase, symbol: str):
+        topic = stream.topic(symbol)
+        entry = self.__topics.get(route_key(topic))
+
+        if entry is None:
+            return
+
+        try:
+            stream.unsubscribe(self.__socket, symbol)
+            stream.subscribe(self.__socket, symbol, entry.fire)
+        except Exception as ex:
+            logger.warning(f"(socket hub) [{self.__channel_type}] Ошибка переподписки {topic}. {ex}")
+            return
+        logger.info(f"(socket hub) [{self.__channel_type}] переподписка {topic}")
+
+    def add_operation_handler(self, handler: OperationHandler):
+        self.__operation_handlers = self.__operation_handlers + (handler,)
+
+    def remove_operation_handler(self, handler: OperationHandler):
+        self.__operation_handlers = tuple(item for item in self.__operation_handlers if item != handler)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.__topics and not self.__operation_handlers
+
+    def exit(self):
+        self.__topics = {}
+        self.__operation_handlers = ()
+        self.__socket.exit()
+
+    def __on_message(self, data: dict):
+        topic = data.get("topic")
+
+        if topic is None:
+            if self.__operation_handlers:
+                self.__stream.forward(data, None, self.__fire_operation)
+            return
+
+        entry = self.__topics.get(route_key(topic))
+        if entry is not None:
+            entry.messages.inc()
+            entry.stream.forward(data, entry.fire)
+
+    def __fire_operation(self, operation: SocketOperation):
+        _call_handlers(self.__operation_handlers, operation)
+
+
+class SocketHub:
+    __connections: Dict[str, SocketConnection]
+    __lock: RLock
+
+    def __init__(self):
+        self.__connections = {}
+        self.__lock = RLock()
+
+    @property
+    def connections(self) -> List[SocketConnection]:
+        return list(self.__connections.values())
+
+    # Новый топик подписывается на уже открытом соединении канала; соединение создается по первой подписке
+    def subscribe(
+            self,
+            stream: WebsocketBase,
+            channel_type: str,
+            symbol: str,
+            handler: Handler,
+            operation_handler: Optional[OperationHandler] = None
+    ) -> WebSocket:
+        with self.__lock:
+            connection = self.__connections.get(channel_type)
+            if connection is None:
+                connection = SocketConnection(stream, channel_type)
+                self.__connections[channel_type] = connection
+
+            if operation_handler:
+                connection.add_operation_handler(operation_handler)
+            connection.subscribe(stream, symbol, handler)
+
+            return connection.socket
+
+    def unsubscribe(
+            self,
+            stream: WebsocketBase,
+            channel_type: str,
+            symbol: str,
+            handler: Handler,
+            operation_handler: Optional[OperationHandler] = None
+    ):
+        with self.__lock:
+            connection = self.__connections.get(channel_type)
+            if connection is None:
+                return
+
+            if operation_handler:
+                connection.remove_operation_handler(operation_handler)
+            connection.unsubscribe(stream, symbol, handler)
+
+            if connection.is_empty:
+                connection.exit()
+                del self.__connections[channel_type]
+
+    def resubscribe(self, stream: WebsocketBase, channel_type: str, symbol: str):
+        with self.__lock:
+            connection = self.__connections.get(channel_type)
+            if connection is not None:
+                connection.resubscribe(stream, symbol)
+
+    def exit(self):
+        with self.__lock:
+            for connection in self.__connections.values():
+                connection.exit()
+            self.__connections.clear()
+
+
+_hubs: 'WeakKeyDictionary[Any, SocketHub]' = WeakKeyDictionary()
+_hubs_lock = RLock()
+
+
+# Один хаб на клиента: все мосты одного клиента делят соединения
+def get_socket_hub(client) -> SocketHub:
+    with _hubs_lock:
+        hub = _hubs.get(client)
+        if hub is None:
+            hub = SocketHub()
+            _hubs[client] = hub
+
+        return hub
+
+
+__all__ = ["SocketHub", "SocketConnection", "get_socket_hub", "route_key"]
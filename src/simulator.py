@@ -0,0 +1,102 @@
+import argparse
+import resource
+import time
+from decimal import Decimal
+
+from core.log import logger
+from core.metrics import MetricsServer
+from services.instruments import build_instrument, split_symbol
+from services.simulator import (
+    Latency, MarketConfig, MarketSimulator, SimulatedExchange, SimulatorRestServer, SimulatorWebsocketServer
+)
+
+# Локальная биржа для нагрузочных и длительных прогонов бота:
+# python simulator.py --symbol USDCUSDT=1.0000 --balance USDT=100000 --balance USDC=100000 --speed 10
+# В settings.json бота: "restEndpoint": "http://127.0.0.1:8080", "wsEndpoint": "ws://127.0.0.1:8081"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Симулятор REST и websocket API Bybit v5 (spot)")
+    parser.add_argument("--symbol", action="append", default=[], help="SYMBOL=PRICE, по умолчанию USDCUSDT=1.0000")
+    parser.add_argument("--balance", action="append", default=[], help="COIN=AMOUNT")
+    parser.add_argument("--tick-size", default="0.0001")
+    parser.add_argument("--base-precision", default="0.01")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--rest-port", type=int, default=8080)
+    parser.add_argument("--ws-port", type=int, default=8081)
+    parser.add_argument("--metrics-port", type=int, help="Экспорт метрик симулятора в формате Prometheus")
+    parser.add_argument("--rest-latency-ms", type=float, default=0.0)
+    parser.add_argument("--ws-latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Равномерный разброс задержек")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Запросов в секунду на эндпоинт, 0 - без лимита")
+    parser.add_argument("--speed", type=float, default=1.0, help="Множитель частот рыночных событий")
+    parser.add_argument("--ticker-rate", type=float, default=MarketConfig.ticker_rate)
+    parser.add_argument("--orderbook-rate", type=float, default=MarketConfig.orderbook_rate)
+    parser.add_argument("--quote-rate", type=float, default=MarketConfig.quote_rate)
+    parser.add_argument("--trade-rate", type=float, default=MarketConfig.trade_rate)
+    parser.add_argument("--price-move-rate", type=float, default=MarketConfig.price_move_rate)
+    parser.add_argument("--levels", type=int, default=MarketConfig.levels)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--stats-interval", type=float, default=60.0, help="Период вывода статистики, сек")
+    return parser.parse_args()
+
+
+args = parse_args()
+
+instruments = []
+prices = {}
+balances = {}
+for item in args.symbol or ["USDCUSDT=1.0000"]:
+    symbol, price = item.split("=")
+    base_coin, quote_coin = split_symbol(symbol)
+    instruments.append(build_instrument(symbol, base_coin, quote_coin, args.tick_size, args.base_precision))
+    prices[symbol] = Decimal(price)
+    balances.setdefault(base_coin, Decimal(0))
+    balances.setdefault(quote_coin, Decimal(0))
+
+for item in args.balance:
+    coin, amount = item.split("=")
+    balances[coin] = Decimal(amount)
+
+exchange = SimulatedExchange(instruments=instruments, prices=prices, balances=balances)
+websocket_server = SimulatorWebsocketServer(
+    exchange, port=args.ws_port, host=args.host, latency=Latency(args.ws_latency_ms, args.jitter_ms)
+)
+rest_server = SimulatorRestServer(
+    exchange, port=args.rest_port, host=args.host, latency=Latency(args.rest_latency_ms, args.jitter_ms),
+    rate_limit=args.rate_limit
+)
+market = MarketSimulator(exchange, MarketConfig(
+    ticker_rate=args.ticker_rate,
+    orderbook_rate=args.orderbook_rate,
+    quote_rate=args.quote_rate,
+    trade_rate=args.trade_rate,
+    price_move_rate=args.price_move_rate,
+    speed=args.speed,
+    levels=args.levels,
+    seed=args.seed
+))
+
+if args.metrics_port:
+    MetricsServer(args.metrics_port).start()
+
+websocket_server.start()
+rest_server.start()
+market.start()
+
+started = time.time()
+
+try:
+    while True:
+        time.sleep(args.stats_interval)
+        # Пиковая память процесса симулятора: рост на длительном прогоне - утечка в симуляторе, а не в боте
+        logger.info("(simulator) %.0fs events:%s open_orders:%s balances:%s max_rss:%.1fMB",
+                    time.time() - started, market.counts, exchange.open_order_count,
+                    {coin["coin"]: coin["walletBalance"] for coin in exchange.wallet()},
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+except KeyboardInterrupt:
+    pass
+finally:
+    market.stop()
+    rest_server.stop()
+    websocket_server.stop()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Модули бота импортируются от src, как при запуске main.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
@@ -0,0 +1,181 @@
+import threading
+import time
+
+import pytest
+
+from core.actor import ActorClock, EventLoopActor, InlineActor
+from core.clock import VirtualClock
+
+
+def test_inline_post_runs_immediately():
+    actor = InlineActor()
+    calls = []
+
+    actor.post("event", calls.append, 1)
+    actor.post("event", calls.append, 2, key="sync")
+
+    assert calls == [1, 2]
+
+
+def test_inline_keyed_post_from_event_runs_once_after_it():
+    actor = InlineActor()
+    calls = []
+
+    def on_frame(fills):
+        for fill in fills:
+            calls.append(("fill", fill))
+            actor.post("sync", lambda last: calls.append(("sync", last)), fill, key="sync")
+
+    actor.post("frame", on_frame, [1, 2, 3])
+
+    assert calls == [("fill", 1), ("fill", 2), ("fill", 3), ("sync", 3)]
+
+
+def test_inline_deferred_event_can_defer_another():
+    actor = InlineActor()
+    calls = []
+
+    def first():
+        calls.append("first")
+        actor.post("second", lambda: calls.append("second"), key="second")
+
+    actor.post("outer", lambda: actor.post("first", first, key="first"))
+
+    assert calls == ["first", "second"]
+
+
+def test_inline_keeps_deferred_event_after_error():
+    actor = InlineActor()
+    calls = []
+
+    def failing():
+        actor.post("sync", calls.append, "sync", key="sync")
+        raise RuntimeError("frame error")
+
+    try:
+        actor.post("frame", failing)
+    except RuntimeError:
+        pass
+    actor.post("frame", calls.append, "next")
+
+    assert calls == ["next", "sync"]
+
+
+def block_loop(actor: EventLoopActor) -> threading.Event:
+    # Занимает поток actor, пока не будет выставлено событие
+    started, release = threading.Event(), threading.Event()
+
+    def blocker():
+        started.set()
+        release.wait(2)
+
+    actor.post("block", blocker)
+    assert started.wait(2)
+    return release
+
+
+def test_loop_runs_events_in_order_on_its_thread():
+    actor = EventLoopActor("TestLoop")
+    calls = []
+
+    for value in range(5):
+        actor.post("event", lambda item: calls.append((item, actor.is_current)), value)
+
+    assert actor.run(lambda: "done") == "done"
+    assert calls == [(value, True) for value in range(5)]
+    actor.stop()
+
+
+def test_loop_conflates_keyed_events_waiting_in_queue():
+    actor = EventLoopActor("TestLoop")
+    calls = []
+    release = block_loop(actor)
+
+    actor.post("event", calls.append, "plain")
+    for value in range(3):
+        actor.post("sync", calls.append, value, key="sync")
+
+    assert actor.pending == 2
+    release.set()
+    actor.run(lambda: None)
+
+    assert calls == ["plain", 2]
+    actor.stop()
+
+
+def test_loop_run_propagates_errors_and_survives_them():
+    actor = EventLoopActor("TestLoop")
+
+    def failing():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        actor.run(failing)
+
+    actor.post("event", failing)
+    assert actor.run(lambda: 42) == 42
+    actor.stop()
+
+
+def test_loop_full_queue_blocks_only_blocking_posts():
+    actor = EventLoopActor("TestLoop", max_queue=1)
+    calls = []
+    release = block_loop(actor)
+
+    actor.post("event", calls.append, 1)
+    actor.post("timer", calls.append, 2, block=False)
+    assert actor.pending == 2
+
+    producer = threading.Thread(target=actor.post, args=("event", calls.append, 3))
+    producer.start()
+    time.sleep(0.05)
+    assert producer.is_alive()
+
+    release.set()
+    producer.join(2)
+    actor.run(lambda: None)
+
+    assert calls == [1, 2, 3]
+    actor.stop()
+
+
+def test_loop_stop_drops_pending_events():
+    actor = EventLoopActor("TestLoop")
+    calls = []
+    release = block_loop(actor)
+
+    actor.post("event", calls.append, 1)
+    threading.Timer(0.05, release.set).start()
+    actor.stop()
+    actor.post("event", calls.append, 2)
+
+    assert calls == []
+    with pytest.raises(Exception):
+        actor.run(lambda: None)
+
+
+def test_actor_clock_cancel_skips_queued_timer():
+    actor = EventLoopActor("TestLoop")
+    clock = VirtualClock(0)
+    actor_clock = ActorClock(clock, actor)
+    calls = []
+    started, release = threading.Event(), threading.Event()
+
+    handle = actor_clock.call_later(1, lambda: calls.append("fired"))
+    actor_clock.call_later(1, lambda: calls.append("kept"))
+
+    def cancel_when_queued():
+        started.set()
+        release.wait(2)
+        handle.cancel()
+
+    actor.post("cancel", cancel_when_queued)
+    assert started.wait(2)
+    clock.advance(1)
+    assert actor.pending == 2
+
+    release.set()
+    actor.run(lambda: None)
+
+    assert calls == ["kept"]
+    actor.stop()
@@ -0,0 +1,116 @@
+import threading
+import time
+
+from core.event import Event
+
+
+class ValueEvent(Event[int]):
+    pass
+
+
+def wait_for(predicate, timeout: float = 2.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "condition not reached"
+        time.sleep(0.001)
+
+
+def test_fire_calls_handlers_in_subscription_order():
+    event = ValueEvent()
+    calls = []
+
+    event.subscribe(lambda value: calls.append(("first", value)))
+    event.subscribe(lambda value: calls.append(("second", value)))
+    event._fire(1)
+
+    assert calls == [("first", 1), ("second", 1)]
+
+
+def test_subscription_changes_during_fire_apply_to_next_fire():
+    event = ValueEvent()
+    calls = []
+
+    def late(value):
+        calls.append(("late", value))
+
+    def first(value):
+        calls.append(("first", value))
+        event.unsubscribe(first)
+        event.subscribe(late)
+
+    event.subscribe(first)
+    event.subscribe(lambda value: calls.append(("second", value)))
+
+    event._fire(1)
+    event._fire(2)
+
+    assert calls == [("first", 1), ("second", 1), ("second", 2), ("late", 2)]
+
+
+def test_unsubscribe_removes_one_subscription():
+    event = ValueEvent()
+    calls = []
+
+    event.subscribe(calls.append)
+    event.subscribe(calls.append)
+    event.unsubscribe(calls.append)
+    event._fire(1)
+
+    assert calls == [1]
+
+    event.clear_subscribers()
+    event._fire(2)
+    assert calls == [1]
+
+
+def test_conflating_handler_skips_intermediate_values():
+    event = ValueEvent(conflate=True)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        release.wait(2)
+
+    event.subscribe(slow)
+    event._fire(1)
+    assert started.wait(2)
+
+    for value in range(2, 6):
+        event._fire(value)
+
+    release.set()
+    wait_for(lambda: calls[-1] == 5)
+
+    assert calls == [1, 5]
+    assert event.dropped == 3
+
+
+def test_conflating_fire_does_not_wait_for_handler():
+    event = ValueEvent(conflate=True)
+    release = threading.Event()
+    event.subscribe(lambda value: release.wait(2))
+
+    started = time.time()
+    for value in range(100):
+        event._fire(value)
+
+    assert time.time() - started < 1
+    release.set()
+    event.clear_subscribers()
+
+
+def test_clear_subscribers_stops_conflating_workers():
+    event = ValueEvent(conflate=True)
+    calls = []
+
+    event.subscribe(calls.append)
+    event._fire(1)
+    wait_for(lambda: calls == [1])
+
+    event.clear_subscribers()
+    event._fire(2)
+    time.sleep(0.05)
+
+    assert calls == [1]
@@ -0,0 +1,142 @@
+from decimal import Decimal
+
+import pytest
+
+from domain_models import PriceScale, Side, TradeRange
+from schemas.account_coin import CoinBalance
+from services.bot.ladder import GridLadder, LadderActionKind
+from services.bot.order_store import OrderRecord
+
+SCALE = PriceScale(Decimal("0.0001"))
+TRADE_RANGE = TradeRange(Decimal("1.0000"), Decimal("1.0001"), SCALE)
+
+
+def make_ladder(levels: int = 3, max_orders: int = 500, allow_sell: str = "1.1") -> GridLadder:
+    return GridLadder(
+        levels=levels,
+        allow_range=TradeRange(Decimal("0.9"), Decimal(allow_sell)),
+        order_qty=Decimal("10"),
+        overlap_sell_price=Decimal("1.2"),
+        scale=SCALE,
+        max_orders=max_orders
+    )
+
+
+def make_order(order_id: str, side: str, price: str) -> OrderRecord:
+    return OrderRecord(order_id, "USDCUSDT", side, Decimal(price), Decimal("10"), "New")
+
+
+def test_level_prices_step_by_range_height():
+    ladder = make_ladder()
+
+    assert ladder.level_prices(TRADE_RANGE, Side.Buy) == [10000, 9999, 9998]
+    assert ladder.level_prices(TRADE_RANGE, Side.Sell) == [10001, 10002, 10003]
+
+
+def test_level_prices_sell_above_allow_range_moves_to_overlap():
+    ladder = make_ladder(allow_sell="1.0001")
+
+    assert ladder.level_prices(TRADE_RANGE, Side.Sell) == [12000]
+
+
+def test_levels_must_be_positive():
+    with pytest.raises(ValueError):
+        make_ladder(levels=0)
+
+
+def test_targets_fill_whole_rounds_then_nearest_levels():
+    ladder = make_ladder()
+
+    targets = ladder.targets(TRADE_RANGE, {"Buy": Decimal("65"), "Sell": Decimal("20")})
+
+    assert targets == {
+        ("Buy", 10000): 2, ("Buy", 9999): 2, ("Buy", 9998): 2,
+        ("Sell", 10001): 1, ("Sell", 10002): 1, ("Sell", 10003): 0
+    }
+
+
+def test_targets_split_max_orders_between_sides():
+    ladder = make_ladder(max_orders=4)
+
+    targets = ladder.targets(TRADE_RANGE, {"Buy": Decimal("1000"), "Sell": Decimal("1000")})
+
+    assert sum(count for (side, _), count in targets.items() if side == Side.Buy) == 2
+    assert sum(count for (side, _), count in targets.items() if side == Side.Sell) == 2
+
+
+def test_targets_unused_half_goes_to_other_side():
+    ladder = make_ladder(max_orders=4)
+
+    targets = ladder.targets(TRADE_RANGE, {"Buy": Decimal("15"), "Sell": Decimal("1000")})
+
+    assert sum(count for (side, _), count in targets.items() if side == Side.Buy) == 1
+    assert sum(count for (side, _), count in targets.items() if side == Side.Sell) == 3
+
+
+def test_targets_without_budget_place_nothing():
+    ladder = make_ladder()
+
+    targets = ladder.targets(TRADE_RANGE, {})
+
+    assert set(targets.values()) == {0}
+
+
+def test_diff_keeps_orders_on_target_levels():
+    ladder = make_ladder()
+    targets = {("Buy", 10000): 1, ("Sell", 10001): 1}
+    orders = [make_order("1", "Buy", "1.0000"), make_order("2", "Sell", "1.0001")]
+
+    assert ladder.diff(targets, orders) == []
+
+
+def test_diff_amends_surplus_to_missing_levels_nearest_first():
+    ladder = make_ladder()
+    targets = {("Buy", 10000): 1, ("Buy", 9999): 1, ("Buy", 9998): 1}
+    orders = [make_order("1", "Buy", "0.9990"), make_order("2", "Buy", "0.9998")]
+
+    actions = ladder.diff(targets, orders)
+
+    assert [(action.kind, action.side, action.price, action.order_id) for action in actions] == [
+        (LadderActionKind.Amend, "Buy", 10000, "1"),
+        (LadderActionKind.Place, "Buy", 9999, None)
+    ]
+
+
+def test_diff_cancels_newest_surplus_of_level():
+    ladder = make_ladder()
+    targets = {("Sell", 10001): 1}
+    orders = [make_order("1", "Sell", "1.0001"), make_order("2", "Sell", "1.0001")]
+
+    actions = ladder.diff(targets, orders)
+
+    assert [(action.kind, action.order_id) for action in actions] == [(LadderActionKind.Cancel, "2")]
+
+
+def test_diff_does_not_move_orders_between_sides():
+    ladder = make_ladder()
+    targets = {("Buy", 10000): 1}
+    orders = [make_order("1", "Sell", "1.0001")]
+
+    actions = ladder.diff(targets, orders)
+
+    assert sorted((action.kind.value, action.side) for action in actions) == [("cancel", "Sell"), ("place", "Buy")]
+
+
+def test_budget_excludes_funds_locked_by_other_orders():
+    balance = CoinBalance("USDT", wallet_balance=Decimal("100"), locked=Decimal("30"))
+
+    assert GridLadder.budget(balance, own_locked=Decimal("20")) == Decimal("90")
+
+
+def test_budget_with_stale_locked_counts_own_orders_once():
+    balance = CoinBalance("USDT", wallet_balance=Decimal("100"), locked=Decimal("0"))
+
+    assert GridLadder.budget(balance, own_locked=Decimal("20")) == Decimal("100")
+    assert GridLadder.budget(None, own_locked=Decimal("20")) == Decimal(0)
+
+
+def test_locked_by_side():
+    orders = [make_order("1", "Buy", "0.9999"), make_order("2", "Buy", "1.0000")]
+
+    assert GridLadder.locked(Side.Buy, orders) == Decimal("19.9990")
+    assert GridLadder.locked(Side.Sell, orders) == Decimal("20")
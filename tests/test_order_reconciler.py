@@ -0,0 +1,107 @@
+from decimal import Decimal
+from typing import List, Optional
+
+from core.clock import VirtualClock
+from schemas.order import Order
+from services.bot.order_reconciler import HISTORY_WINDOW_MS, RECONCILE_MARGIN_MS, OrderReconciler
+from services.bot.order_store import OrderStore
+
+SYMBOL = "USDCUSDT"
+START_MS = 1_700_000_000_000
+
+
+def make_order(order_id: str, status: str, updated_time: int, price: str = "1.0000") -> Order:
+    return Order(orderId=order_id, symbol=SYMBOL, side="Buy", price=Decimal(price), qty=Decimal("10"),
+                 orderStatus=status, updatedTime=updated_time)
+
+
+class FakeClient:
+    def __init__(self, history: Optional[List[Order]] = None, open_orders: Optional[List[Order]] = None):
+        self.history = history or []
+        self.open_orders = open_orders or []
+        self.history_requests = []
+        self.open_order_requests = 0
+
+    def get_order_history(self, symbol: str, category: str, start_time: int) -> List[Order]:
+        self.history_requests.append(start_time)
+        return list(self.history)
+
+    def get_open_orders(self, symbol: str, category: str) -> List[Order]:
+        self.open_order_requests += 1
+        return list(self.open_orders)
+
+
+def make_reconciler(client: FakeClient, store: OrderStore, now_ms: int = START_MS) -> OrderReconciler:
+    return OrderReconciler(client, store, "spot", SYMBOL, clock=VirtualClock(now_ms / 1000))
+
+
+def test_watermark_defaults_to_clock_time():
+    reconciler = make_reconciler(FakeClient(), OrderStore())
+
+    assert reconciler.watermark == START_MS
+
+
+def test_observe_drops_stale_updates():
+    reconciler = make_reconciler(FakeClient(), OrderStore())
+
+    assert len(reconciler.observe([make_order("1", "New", START_MS + 2)])) == 1
+    assert reconciler.observe([make_order("1", "New", START_MS + 1)]) == []
+    assert len(reconciler.observe([make_order("1", "PartiallyFilled", START_MS + 2)])) == 1
+
+
+def test_observe_drops_updates_after_close():
+    reconciler = make_reconciler(FakeClient(), OrderStore())
+
+    reconciler.observe([make_order("1", "Filled", START_MS + 5)])
+
+    assert reconciler.observe([make_order("1", "Filled", START_MS + 5)]) == []
+    assert reconciler.observe([make_order("1", "New", START_MS + 9)]) == []
+
+
+def test_observe_advances_watermark():
+    reconciler = make_reconciler(FakeClient(), OrderStore())
+
+    reconciler.observe([make_order("1", "New", START_MS + 7), make_order("2", "New", START_MS + 3)])
+
+    assert reconciler.watermark == START_MS + 7
+
+
+def test_reconcile_requests_history_since_watermark():
+    client = FakeClient()
+    reconciler = make_reconciler(client, OrderStore())
+
+    reconciler.reconcile()
+
+    assert client.history_requests == [START_MS - RECONCILE_MARGIN_MS]
+
+
+def test_reconcile_returns_only_missed_updates():
+    store = OrderStore()
+    store.add(make_order("open", "New", START_MS - 10))
+    store.add(make_order("moved", "New", START_MS - 10))
+    client = FakeClient(history=[
+        make_order("filled", "Filled", START_MS + 3),
+        make_order("open", "New", START_MS - 10),
+        make_order("moved", "New", START_MS + 1, price="1.0001"),
+        make_order("new", "New", START_MS + 2)
+    ])
+    reconciler = make_reconciler(client, store)
+
+    missed = reconciler.reconcile()
+
+    # Исполненного ордера нет в хранилище: он уже обработан или чужой
+    assert [order.order_id for order in missed] == ["moved", "new"]
+    assert reconciler.watermark == START_MS + 2
+
+
+def test_reconcile_reloads_open_orders_after_long_gap():
+    store = OrderStore()
+    store.add(make_order("gone", "New", START_MS))
+    client = FakeClient(open_orders=[make_order("live", "New", START_MS)])
+    reconciler = OrderReconciler(client, store, "spot", SYMBOL, watermark=START_MS,
+                                 clock=VirtualClock((START_MS + HISTORY_WINDOW_MS) / 1000))
+
+    assert reconciler.reconcile() == []
+    assert client.history_requests == []
+    assert client.open_order_requests == 1
+    assert [record.order_id for record in store.orders] == ["live"]
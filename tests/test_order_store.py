@@ -0,0 +1,86 @@
+from decimal import Decimal
+
+from schemas.order import Order
+from services.bot.order_store import OrderStore
+
+SYMBOL = "USDCUSDT"
+
+
+def make_order(order_id: str, side: str = "Buy", price: str = "0.9999", status: str = "New",
+               qty: str = "10") -> Order:
+    return Order(orderId=order_id, symbol=SYMBOL, side=side, price=Decimal(price), qty=Decimal(qty),
+                 orderStatus=status)
+
+
+def test_apply_upserts_open_orders():
+    store = OrderStore()
+
+    filled = store.apply([make_order("1"), make_order("2", side="Sell", price="1.0001")])
+
+    assert filled == []
+    assert len(store) == 2
+    assert [record.order_id for record in store.by_side("Buy")] == ["1"]
+    assert [record.order_id for record in store.by_side("Sell")] == ["2"]
+
+    store.apply([make_order("1", status="PartiallyFilled", qty="4")])
+
+    record = store.get("1")
+    assert (record.status, record.qty) == ("PartiallyFilled", Decimal("4"))
+    assert len(store) == 2
+
+
+def test_apply_removes_closed_orders_and_returns_filled():
+    store = OrderStore()
+    store.apply([make_order("1"), make_order("2"), make_order("3")])
+
+    filled = store.apply([make_order("1", status="Filled"), make_order("2", status="Cancelled")])
+
+    assert [order.order_id for order in filled] == ["1"]
+    assert "1" not in store and "2" not in store
+    assert [record.order_id for record in store.at_price("Buy", Decimal("0.9999"))] == ["3"]
+
+
+def test_apply_closed_unknown_order_is_ignored():
+    store = OrderStore()
+
+    filled = store.apply([make_order("1", status="Filled")])
+
+    assert [order.order_id for order in filled] == ["1"]
+    assert len(store) == 0
+
+
+def test_apply_reindexes_amended_price():
+    store = OrderStore()
+    store.apply([make_order("1"), make_order("2")])
+
+    store.apply([make_order("1", price="0.9998")])
+
+    assert [record.order_id for record in store.at_price("Buy", Decimal("0.9999"))] == ["2"]
+    assert [record.order_id for record in store.at_price("Buy", Decimal("0.9998"))] == ["1"]
+
+
+def test_set_price_moves_price_index():
+    store = OrderStore()
+    store.add(make_order("1"))
+
+    store.set_price("1", Decimal("0.9997"))
+    store.set_price("unknown", Decimal("0.9997"))
+
+    assert store.at_price("Buy", Decimal("0.9999")) == []
+    assert [record.order_id for record in store.at_price("Buy", Decimal("0.9997"))] == ["1"]
+
+
+def test_last_follows_insertion_order():
+    store = OrderStore()
+    assert store.last("Buy") is None
+
+    store.add_many([make_order("1"), make_order("2"), make_order("3", side="Sell")])
+    assert store.last("Buy").order_id == "2"
+    assert store.count("Buy") == 2
+
+    store.remove("2")
+    assert store.last("Buy").order_id == "1"
+
+    store.replace_all([make_order("4", side="Sell")])
+    assert store.last("Buy") is None
+    assert store.last("Sell").order_id == "4"
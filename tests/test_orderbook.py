@@ -0,0 +1,161 @@
+from decimal import Decimal
+from typing import Callable, List
+
+from core.clock import VirtualClock
+from schemas.orderbook import OrderbookUpdate
+from services.bot.socket_bridges import RESYNC_DELAY, OrderbookBridge
+from services.orderbook import LocalOrderbook, OrderbookSide
+from services.replay.sockets import ReplayHub, ReplayOrderbookWebsocket, ReplayWebsocketClient
+
+SYMBOL = "USDCUSDT"
+
+
+def make_update(update_id: int, bids: List[tuple] = (), asks: List[tuple] = (), is_snapshot: bool = False):
+    return OrderbookUpdate(
+        is_snapshot=is_snapshot,
+        symbol=SYMBOL,
+        bids=[(Decimal(price), Decimal(size)) for price, size in bids],
+        asks=[(Decimal(price), Decimal(size)) for price, size in asks],
+        update_id=update_id,
+        sequence=update_id
+    )
+
+
+def make_frame(update_id: int, is_snapshot: bool = False) -> dict:
+    return {
+        "topic": f"orderbook.50.{SYMBOL}",
+        "type": "snapshot" if is_snapshot else "delta",
+        "ts": 0,
+        "data": {"s": SYMBOL, "b": [["0.9997", "100"]], "a": [["0.9998", "200"]], "u": update_id, "seq": update_id}
+    }
+
+
+def test_side_keeps_levels_sorted():
+    side = OrderbookSide(is_bid=True)
+    side.reset([(Decimal("2"), Decimal("1")), (Decimal("1"), Decimal("5")), (Decimal("3"), Decimal("0"))])
+
+    side.update(Decimal("4"), Decimal("2"))
+    side.update(Decimal("1"), Decimal("0"))
+    side.update(Decimal("2"), Decimal("7"))
+
+    assert side.best() == (Decimal("4"), Decimal("2"))
+    assert side.top(5) == [(Decimal("4"), Decimal("2")), (Decimal("2"), Decimal("7"))]
+
+
+def test_ask_side_best_is_lowest():
+    side = OrderbookSide(is_bid=False)
+    side.reset([(Decimal("5"), Decimal("1")), (Decimal("4"), Decimal("1"))])
+
+    assert side.best() == (Decimal("4"), Decimal("1"))
+    assert side.top(1) == [(Decimal("4"), Decimal("1"))]
+
+
+def test_delta_before_snapshot_is_dropped():
+    book = LocalOrderbook(SYMBOL)
+
+    assert not book.apply(make_update(1, bids=[("1", "1")]))
+    assert book.best() == (None, None)
+
+
+def test_snapshot_then_deltas():
+    book = LocalOrderbook(SYMBOL)
+    book.apply(make_update(1, bids=[("0.9997", "100")], asks=[("0.9998", "200")], is_snapshot=True))
+
+    assert book.apply(make_update(2, bids=[("0.9997", "0"), ("0.9996", "50")]))
+    assert book.best() == ((Decimal("0.9996"), Decimal("50")), (Decimal("0.9998"), Decimal("200")))
+    assert book.update_id == 2
+
+
+def test_stale_delta_is_ignored():
+    book = LocalOrderbook(SYMBOL)
+    book.apply(make_update(5, bids=[("1", "1")], is_snapshot=True))
+
+    assert not book.apply(make_update(5, bids=[("1", "9")]))
+    assert book.is_synced
+    assert book.best_bid() == (Decimal("1"), Decimal("1"))
+
+
+def test_gap_drops_deltas_until_snapshot():
+    book = LocalOrderbook(SYMBOL)
+    book.apply(make_update(1, bids=[("1", "1")], is_snapshot=True))
+
+    assert not book.apply(make_update(3, bids=[("1", "2")]))
+    assert not book.is_synced
+    assert book.gap_count == 1
+    assert not book.apply(make_update(4, bids=[("1", "3")]))
+    assert book.best_bid() == (Decimal("1"), Decimal("1"))
+
+    assert book.apply(make_update(10, bids=[("2", "1")], is_snapshot=True))
+    assert book.is_synced
+    assert book.apply(make_update(11, asks=[("3", "1")]))
+    assert book.best() == ((Decimal("2"), Decimal("1")), (Decimal("3"), Decimal("1")))
+
+
+class FlakyOrderbookWebsocket(ReplayOrderbookWebsocket):
+    # Считает подписки топика; failures - сколько следующих подписок завершатся ошибкой
+    def __init__(self, hub: ReplayHub):
+        super().__init__(hub, fast_decode=True)
+        self.subscriptions = 0
+        self.failures = 0
+
+    def _stream_impl(self, socket, symbol: str, callback: Callable):
+        self.subscriptions += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("socket closed")
+        super()._stream_impl(socket, symbol, callback)
+
+
+class FakeClient:
+    def __init__(self):
+        self.hub = ReplayHub()
+        self.websocket = ReplayWebsocketClient(self.hub, fast_decode=True)
+        self.websocket.orderbook = FlakyOrderbookWebsocket(self.hub)
+
+
+def test_bridge_retries_resubscribe_until_snapshot():
+    client = FakeClient()
+    stream = client.websocket.orderbook
+    clock = VirtualClock()
+    bridge = OrderbookBridge(symbol=SYMBOL, category="spot", client=client, clock=clock)
+    books = []
+    bridge.message_event.subscribe(books.append)
+
+    client.hub.dispatch(make_frame(1, is_snapshot=True))
+    client.hub.dispatch(make_frame(2))
+    assert len(books) == 2 and stream.subscriptions == 1
+
+    # Первая переподписка после пропуска не удалась: книга ждет снимка, попытки повторяются
+    stream.failures = 1
+    client.hub.dispatch(make_frame(5))
+    assert not bridge.book.is_synced and stream.subscriptions == 2
+
+    clock.advance(RESYNC_DELAY)
+    assert stream.subscriptions == 3
+    client.hub.dispatch(make_frame(6))
+    assert len(books) == 2
+
+    clock.advance(RESYNC_DELAY * 2)
+    assert stream.subscriptions == 4
+
+    client.hub.dispatch(make_frame(10, is_snapshot=True))
+    assert bridge.book.is_synced and len(books) == 3
+
+    clock.advance(RESYNC_DELAY * 100)
+    assert stream.subscriptions == 4
+    bridge.exit()
+
+
+def test_bridge_exit_stops_resubscribing():
+    client = FakeClient()
+    stream = client.websocket.orderbook
+    clock = VirtualClock()
+    bridge = OrderbookBridge(symbol=SYMBOL, category="spot", client=client, clock=clock)
+
+    client.hub.dispatch(make_frame(1, is_snapshot=True))
+    client.hub.dispatch(make_frame(3))
+    subscriptions = stream.subscriptions
+    bridge.exit()
+
+    clock.advance(RESYNC_DELAY * 100)
+    assert stream.subscriptions == subscriptions
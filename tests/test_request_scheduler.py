@@ -0,0 +1,130 @@
+import threading
+import time
+
+import pytest
+
+from api.bybit_client.scheduler import (RateLimit, RequestPriority, RequestScheduler, RequestShedException,
+                                        TokenBucket)
+
+GROUP = "order/create"
+
+
+def wait_for(predicate, timeout: float = 2.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "condition not reached"
+        time.sleep(0.001)
+
+
+def hold_slot(scheduler: RequestScheduler) -> threading.Event:
+    # Занимает единственный слот конкурентности, пока не будет выставлено событие
+    release = threading.Event()
+    thread = threading.Thread(target=scheduler.execute, args=(GROUP, RequestPriority.QUERY,
+                                                              lambda: (release.wait(2), None)))
+    thread.start()
+    wait_for(lambda: scheduler.stats.in_flight == 1)
+    return release
+
+
+def start_request(scheduler: RequestScheduler, priority: RequestPriority, log: list) -> threading.Thread:
+    thread = threading.Thread(target=scheduler.execute, args=(GROUP, priority, lambda: (log.append(priority), None)))
+    thread.start()
+    return thread
+
+
+def test_token_bucket_refills_and_blocks_until_reset():
+    bucket = TokenBucket(RateLimit(rate=10, burst=2), now=100.0)
+
+    bucket.take(100.0)
+    bucket.take(100.0)
+    assert bucket.wait_time(100.0) == pytest.approx(0.1)
+    assert bucket.wait_time(100.2) == 0
+
+    bucket.update(remaining=0, reset_time=105.0, now=100.2)
+    assert bucket.wait_time(101.0) == pytest.approx(4.0)
+    assert bucket.wait_time(105.0) == 0
+
+
+def test_execute_returns_response_and_records_stats():
+    scheduler = RequestScheduler()
+
+    assert scheduler.execute(GROUP, RequestPriority.PLACE, lambda: ("ok", None)) == "ok"
+
+    stats = scheduler.stats
+    assert (stats.in_flight, stats.queue_depth) == (0, 0)
+    assert stats.groups[GROUP].executed == 1
+
+
+def test_failed_request_releases_slot():
+    scheduler = RequestScheduler(max_concurrency=1)
+
+    def request():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        scheduler.execute(GROUP, RequestPriority.PLACE, request)
+
+    assert scheduler.stats.in_flight == 0
+    assert scheduler.execute(GROUP, RequestPriority.PLACE, lambda: ("ok", None)) == "ok"
+
+
+def test_full_queue_sheds_everything_but_cancels():
+    scheduler = RequestScheduler(max_queue_size=1, max_concurrency=1)
+    release = hold_slot(scheduler)
+    log = []
+
+    waiting = start_request(scheduler, RequestPriority.PLACE, log)
+    wait_for(lambda: scheduler.stats.queue_depth == 1)
+
+    with pytest.raises(RequestShedException):
+        scheduler.execute(GROUP, RequestPriority.AMEND, lambda: ("amend", None))
+
+    cancel = start_request(scheduler, RequestPriority.CANCEL, log)
+    wait_for(lambda: scheduler.stats.queue_depth == 2)
+
+    release.set()
+    waiting.join(2)
+    cancel.join(2)
+
+    assert log == [RequestPriority.CANCEL, RequestPriority.PLACE]
+    assert scheduler.stats.groups[GROUP].shed == 1
+
+
+def test_request_shed_after_max_wait():
+    scheduler = RequestScheduler(limits={GROUP: RateLimit(rate=0.01, burst=1)}, max_wait=0.05)
+    scheduler.execute(GROUP, RequestPriority.PLACE, lambda: ("first", None))
+
+    started = time.time()
+    with pytest.raises(RequestShedException):
+        scheduler.execute(GROUP, RequestPriority.PLACE, lambda: ("second", None))
+
+    assert time.time() - started >= 0.05
+    assert scheduler.stats.queue_depth == 0
+
+
+def test_waiting_requests_dispatch_by_priority():
+    scheduler = RequestScheduler(max_concurrency=1)
+    release = hold_slot(scheduler)
+    log = []
+
+    threads = []
+    for priority in (RequestPriority.QUERY, RequestPriority.PLACE, RequestPriority.AMEND, RequestPriority.CANCEL):
+        threads.append(start_request(scheduler, priority, log))
+        wait_for(lambda: scheduler.stats.queue_depth == len(threads))
+
+    release.set()
+    for thread in threads:
+        thread.join(2)
+
+    assert log == [RequestPriority.CANCEL, RequestPriority.AMEND, RequestPriority.PLACE, RequestPriority.QUERY]
+
+
+def test_limit_headers_throttle_next_request():
+    scheduler = RequestScheduler(limits={GROUP: RateLimit(rate=100, burst=100)}, max_wait=0.02)
+    reset = int((time.time() + 1) * 1000)
+
+    scheduler.execute(GROUP, RequestPriority.PLACE, lambda: (None, {"X-Bapi-Limit-Status": "0",
+                                                                    "X-Bapi-Limit-Reset-Timestamp": str(reset)}))
+
+    with pytest.raises(RequestShedException):
+        scheduler.execute(GROUP, RequestPriority.PLACE, lambda: ("blocked", None))
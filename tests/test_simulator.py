@@ -0,0 +1,195 @@
+from decimal import Decimal
+from typing import Optional
+
+import pytest
+
+from domain_models import OrderStatus, PriceScale
+from schemas.orderbook import OrderbookUpdate
+from services.instruments import build_instrument
+from services.orderbook import LocalOrderbook
+from services.simulator.exchange import SimulatedExchange, SimulatorError
+from services.simulator.matching import MatchingBook, SimOrder
+
+SYMBOL = "USDCUSDT"
+
+
+def make_order(order_id: str, side: str, price: str, qty: str, account: Optional[str] = None) -> SimOrder:
+    return SimOrder(order_id, SYMBOL, side, Decimal(price), Decimal(qty), account, 0)
+
+
+def make_exchange(usdt: str = "100", usdc: str = "100") -> SimulatedExchange:
+    return SimulatedExchange(
+        instruments=[build_instrument(SYMBOL, "USDC", "USDT", "0.0001", "0.01")],
+        prices={SYMBOL: Decimal("1")},
+        balances={"USDT": Decimal(usdt), "USDC": Decimal(usdc)}
+    )
+
+
+def test_market_order_sweeps_best_price_first():
+    book = MatchingBook(SYMBOL)
+    book.add(make_order("a2", "Sell", "1.0002", "5"))
+    book.add(make_order("a1", "Sell", "1.0001", "5"))
+
+    fills = book.match("Buy", Decimal("7"))
+
+    assert [(fill.maker.order_id, fill.price, fill.qty) for fill in fills] == [
+        ("a1", Decimal("1.0001"), Decimal("5")),
+        ("a2", Decimal("1.0002"), Decimal("2"))
+    ]
+    assert book.best_ask() == Decimal("1.0002")
+    assert book.side("Sell").size(Decimal("1.0002")) == Decimal("3")
+
+
+def test_orders_of_level_fill_in_time_order():
+    book = MatchingBook(SYMBOL)
+    first = make_order("b1", "Buy", "0.9999", "3")
+    second = make_order("b2", "Buy", "0.9999", "3")
+    book.add(first)
+    book.add(second)
+
+    fills = book.match("Sell", Decimal("4"))
+
+    assert [(fill.maker.order_id, fill.qty) for fill in fills] == [("b1", Decimal("3")), ("b2", Decimal("1"))]
+    assert first.leaves == 0
+    assert second.leaves == Decimal("2")
+    assert list(book.side("Buy").queue(Decimal("0.9999"))) == [second]
+
+
+def test_market_order_respects_limit_price():
+    book = MatchingBook(SYMBOL)
+    book.add(make_order("a1", "Sell", "1.0001", "1"))
+    book.add(make_order("a2", "Sell", "1.0003", "1"))
+
+    fills = book.match("Buy", Decimal("5"), limit_price=Decimal("1.0002"))
+
+    assert [fill.maker.order_id for fill in fills] == ["a1"]
+
+
+def test_crossing_limit_order_rests_remainder():
+    book = MatchingBook(SYMBOL)
+    book.add(make_order("a1", "Sell", "1.0001", "2"))
+    taker = make_order("b1", "Buy", "1.0002", "5")
+
+    fills = book.add(taker)
+
+    assert [(fill.price, fill.qty) for fill in fills] == [(Decimal("1.0001"), Decimal("2"))]
+    assert taker.filled == Decimal("2")
+    assert book.best_ask() is None
+    assert book.best_bid() == Decimal("1.0002")
+    assert book.side("Buy").size(Decimal("1.0002")) == Decimal("3")
+
+
+def test_amend_down_keeps_queue_position():
+    book = MatchingBook(SYMBOL)
+    first = make_order("b1", "Buy", "0.9999", "5")
+    second = make_order("b2", "Buy", "0.9999", "5")
+    book.add(first)
+    book.add(second)
+
+    book.amend(first, first.price, Decimal("2"))
+
+    assert list(book.side("Buy").queue(Decimal("0.9999"))) == [first, second]
+    assert book.side("Buy").size(Decimal("0.9999")) == Decimal("7")
+
+
+def test_amend_up_moves_to_queue_tail():
+    book = MatchingBook(SYMBOL)
+    first = make_order("b1", "Buy", "0.9999", "5")
+    second = make_order("b2", "Buy", "0.9999", "5")
+    book.add(first)
+    book.add(second)
+
+    book.amend(first, first.price, Decimal("6"))
+
+    assert list(book.side("Buy").queue(Decimal("0.9999"))) == [second, first]
+
+
+def test_take_changes_reports_touched_levels_once():
+    book = MatchingBook(SYMBOL)
+    book.add(make_order("b1", "Buy", "0.9999", "5"))
+    book.add(make_order("a1", "Sell", "1.0001", "5"))
+
+    assert book.take_changes() == ([(Decimal("0.9999"), Decimal("5"))], [(Decimal("1.0001"), Decimal("5"))])
+    assert book.take_changes() is None
+    assert book.update_id == 1
+
+
+def test_exchange_fill_settles_balances_at_trade_price():
+    exchange = make_exchange()
+    order = exchange.place_order(SYMBOL, "Buy", "0.9999", "10")
+
+    traded = exchange.market_trade(SYMBOL, "Sell", Decimal("4"))
+
+    assert traded == Decimal("4")
+    coins = {coin["coin"]: coin for coin in exchange.wallet()}
+    assert Decimal(coins["USDT"]["walletBalance"]) == Decimal("100") - Decimal("0.9999") * 4
+    assert Decimal(coins["USDT"]["locked"]) == Decimal("0.9999") * 6
+    assert Decimal(coins["USDC"]["walletBalance"]) == Decimal("104")
+    assert exchange.open_orders(SYMBOL)[0]["orderId"] == order["orderId"]
+    assert exchange.open_orders(SYMBOL)[0]["orderStatus"] == OrderStatus.PartiallyFilled.value
+
+
+def test_exchange_account_order_queues_behind_liquidity():
+    exchange = make_exchange()
+    exchange.set_liquidity(SYMBOL, "Buy", Decimal("0.9999"), Decimal("5"))
+    exchange.place_order(SYMBOL, "Buy", "0.9999", "10")
+
+    exchange.market_trade(SYMBOL, "Sell", Decimal("5"))
+
+    assert exchange.open_orders(SYMBOL)[0]["cumExecQty"] == "0"
+    assert exchange.liquidity_prices(SYMBOL, "Buy") == []
+
+
+def test_exchange_rejects_order_above_free_balance():
+    exchange = make_exchange(usdt="5")
+
+    with pytest.raises(SimulatorError):
+        exchange.place_order(SYMBOL, "Buy", "1.0000", "10")
+    assert exchange.open_order_count == 0
+
+
+def test_exchange_cancel_releases_locked_balance():
+    exchange = make_exchange()
+    order = exchange.place_order(SYMBOL, "Buy", "0.9999", "10")
+
+    exchange.cancel_order(SYMBOL, order["orderId"])
+
+    coins = {coin["coin"]: coin for coin in exchange.wallet()}
+    assert Decimal(coins["USDT"]["locked"]) == 0
+    assert exchange.open_order_count == 0
+    assert exchange.order_history(SYMBOL)[0]["orderStatus"] == OrderStatus.Cancelled.value
+    with pytest.raises(SimulatorError):
+        exchange.cancel_order(SYMBOL, order["orderId"])
+
+
+def test_exchange_amend_across_spread_fills():
+    exchange = make_exchange()
+    exchange.set_liquidity(SYMBOL, "Sell", Decimal("1.0001"), Decimal("4"))
+    order = exchange.place_order(SYMBOL, "Buy", "0.9999", "10")
+
+    exchange.amend_order(SYMBOL, order["orderId"], price="1.0001")
+
+    raw = exchange.open_orders(SYMBOL)[0]
+    assert (raw["price"], raw["cumExecQty"], raw["leavesQty"]) == ("1.0001", "4", "6")
+    assert exchange.best_prices(SYMBOL) == (Decimal("1.0001"), None)
+
+
+def test_published_deltas_keep_local_book_in_sync():
+    exchange = make_exchange()
+    frames = []
+    exchange.set_publisher(lambda topic, frame: frames.append(frame) if topic.startswith("orderbook") else None)
+    scale = PriceScale(Decimal("0.0001"))
+    book = LocalOrderbook(SYMBOL)
+
+    exchange.set_liquidity(SYMBOL, "Buy", Decimal("0.9999"), Decimal("50"))
+    exchange.set_liquidity(SYMBOL, "Sell", Decimal("1.0001"), Decimal("30"))
+    exchange.publish_orderbook(SYMBOL)
+    assert book.apply(OrderbookUpdate.from_raw(exchange.orderbook_snapshot_frame(SYMBOL), scale))
+
+    exchange.market_trade(SYMBOL, "Buy", Decimal("30"))
+    exchange.set_liquidity(SYMBOL, "Sell", Decimal("1.0002"), Decimal("5"))
+    exchange.set_liquidity(SYMBOL, "Buy", Decimal("0.9999"), Decimal("20"))
+    exchange.publish_orderbook(SYMBOL)
+
+    assert book.apply(OrderbookUpdate.from_raw(frames[-1], scale))
+    assert book.best() == ((9999, Decimal("20")), (10002, Decimal("5")))
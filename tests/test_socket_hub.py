@@ -0,0 +1,108 @@
+from decimal import Decimal
+
+from services.replay.sockets import ReplayHub, ReplayWebsocketClient
+from services.socket_hub import SocketHub, route_key
+
+
+def make_orderbook_frame(symbol: str, depth: int = 50) -> dict:
+    return {
+        "topic": f"orderbook.{depth}.{symbol}",
+        "type": "snapshot",
+        "ts": 0,
+        "data": {"s": symbol, "b": [["0.9997", "100"]], "a": [["0.9998", "200"]], "u": 1, "seq": 1}
+    }
+
+
+def make_order_frame(*symbols: str) -> dict:
+    return {
+        "id": "1",
+        "topic": "order",
+        "creationTime": 0,
+        "data": [{"orderId": str(index), "symbol": symbol, "side": "Buy", "price": "1", "qty": "1",
+                  "orderStatus": "New"} for index, symbol in enumerate(symbols)]
+    }
+
+
+def make_hub():
+    replay_hub = ReplayHub()
+    return replay_hub, ReplayWebsocketClient(replay_hub, fast_decode=True), SocketHub()
+
+
+def test_route_key_drops_orderbook_depth():
+    assert route_key("orderbook.50.USDCUSDT") == "orderbook.USDCUSDT"
+    assert route_key("orderbook.200.USDCUSDT") == route_key("orderbook.1.USDCUSDT")
+    assert route_key("tickers.USDCUSDT") == "tickers.USDCUSDT"
+    assert route_key("order") == "order"
+
+
+def test_orderbook_frames_reach_only_their_symbol():
+    replay_hub, client, hub = make_hub()
+    received = {"USDCUSDT": [], "BTCUSDT": []}
+
+    for symbol, updates in received.items():
+        hub.subscribe(client.orderbook, "spot", symbol, updates.append)
+
+    replay_hub.dispatch(make_orderbook_frame("USDCUSDT"))
+    replay_hub.dispatch(make_orderbook_frame("BTCUSDT", depth=200))
+
+    assert len(hub.connections) == 1
+    assert [update.symbol for update in received["USDCUSDT"]] == ["USDCUSDT"]
+    assert [update.symbol for update in received["BTCUSDT"]] == ["BTCUSDT"]
+    assert received["USDCUSDT"][0].asks[0][1] == Decimal("200")
+
+
+def test_order_topic_is_split_by_symbol():
+    replay_hub, client, hub = make_hub()
+    received = {"USDCUSDT": [], "BTCUSDT": []}
+
+    for symbol, orders in received.items():
+        hub.subscribe(client.order, "private", symbol, orders.append)
+
+    replay_hub.dispatch(make_order_frame("USDCUSDT", "BTCUSDT", "USDCUSDT"))
+    replay_hub.dispatch(make_order_frame("ETHUSDT"))
+
+    assert [[order.order_id for order in batch] for batch in received["USDCUSDT"]] == [["0", "2"]]
+    assert [[order.order_id for order in batch] for batch in received["BTCUSDT"]] == [["1"]]
+
+
+def test_failing_handler_does_not_starve_others():
+    replay_hub, client, hub = make_hub()
+    received = []
+
+    def failing(update):
+        raise RuntimeError("boom")
+
+    hub.subscribe(client.orderbook, "spot", "USDCUSDT", failing)
+    hub.subscribe(client.orderbook, "spot", "USDCUSDT", received.append)
+    replay_hub.dispatch(make_orderbook_frame("USDCUSDT"))
+
+    assert len(received) == 1
+
+
+def test_unsubscribe_closes_empty_connection():
+    replay_hub, client, hub = make_hub()
+    first, second = [], []
+
+    hub.subscribe(client.orderbook, "spot", "USDCUSDT", first.append)
+    hub.subscribe(client.orderbook, "spot", "BTCUSDT", second.append)
+
+    hub.unsubscribe(client.orderbook, "spot", "USDCUSDT", first.append)
+    replay_hub.dispatch(make_orderbook_frame("USDCUSDT"))
+    replay_hub.dispatch(make_orderbook_frame("BTCUSDT"))
+
+    assert first == [] and len(second) == 1
+    assert hub.connections[0].topics == ["orderbook.BTCUSDT"]
+
+    hub.unsubscribe(client.orderbook, "spot", "BTCUSDT", second.append)
+    assert hub.connections == []
+
+
+def test_operation_messages_reach_operation_handlers():
+    _, client, hub = make_hub()
+    operations, orders = [], []
+
+    socket = hub.subscribe(client.order, "private", "USDCUSDT", orders.append, operations.append)
+    socket.callback({"success": True, "ret_msg": "", "op": "auth", "conn_id": "1"})
+
+    assert [operation.op for operation in operations] == ["auth"]
+    assert orders == []
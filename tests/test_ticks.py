@@ -0,0 +1,125 @@
+from decimal import Decimal
+
+import pytest
+
+from api.bybit_client.websockets import OrderbookWebsocket, TickerWebsocket
+from domain_models import PRICE_CACHE_LIMIT, PriceScale, TradeRange
+
+
+@pytest.mark.parametrize("tick_size", ["0.0001", "0.01", "1", "0.5", "0.0025"])
+def test_ticks_round_trip(tick_size: str):
+    scale = PriceScale(Decimal(tick_size))
+
+    for ticks in (0, 1, 7, 9998, 10001, 123456):
+        price = scale.to_price(ticks)
+        assert scale.to_ticks(price) == ticks
+        assert scale.parse(str(price)) == ticks
+
+
+def test_parse_matches_decimal_path():
+    scale = PriceScale(Decimal("0.0001"))
+
+    assert scale.parse("0.9998") == 9998
+    assert scale.parse("1.0001") == 10001
+    # Меньше знаков, чем у шага, и экспоненциальная запись разбираются через Decimal
+    assert scale.parse("1") == 10000
+    assert scale.parse("1.5") == 15000
+    assert scale.parse("1E-4") == 1
+
+
+def test_parse_non_decimal_tick():
+    scale = PriceScale(Decimal("0.5"))
+
+    assert scale.parse("2.5") == 5
+    assert scale.to_price(5) == Decimal("2.5")
+
+
+def test_to_ticks_rounds_half_even():
+    scale = PriceScale(Decimal("0.0001"))
+
+    assert scale.to_ticks(Decimal("0.00005")) == 0
+    assert scale.to_ticks(Decimal("0.00015")) == 2
+    assert scale.to_ticks(Decimal("0.99986")) == 9999
+
+
+def test_parse_levels():
+    scale = PriceScale(Decimal("0.0001"))
+
+    assert scale.parse_levels([["0.9999", "120.5"], ["0.9998", "0"]]) == [
+        (9999, Decimal("120.5")), (9998, Decimal("0"))
+    ]
+
+
+def test_parse_cache_overflow_keeps_results():
+    scale = PriceScale(Decimal("0.0001"))
+
+    for ticks in range(PRICE_CACHE_LIMIT + 10):
+        assert scale.parse(str(scale.to_price(ticks))) == ticks
+    assert scale.parse("0.0000") == 0
+
+
+def test_of_picks_finest_step():
+    assert PriceScale.of(Decimal("1.05"), Decimal("2")) == PriceScale(Decimal("0.01"))
+    assert PriceScale.of(Decimal("3"), Decimal("40")) == PriceScale(Decimal("1"))
+
+
+def test_tick_size_must_be_positive():
+    with pytest.raises(ValueError):
+        PriceScale(Decimal("0"))
+
+
+def test_trade_range_from_ticks_round_trip():
+    scale = PriceScale(Decimal("0.0001"))
+    trade_range = TradeRange(Decimal("0.9999"), Decimal("1.0001"), scale)
+
+    assert (trade_range.buy_ticks, trade_range.sell_ticks) == (9999, 10001)
+    assert TradeRange.from_ticks(9999, 10001, scale).buy == Decimal("0.9999")
+    assert TradeRange.from_ticks(9999, 10001, scale).sell == Decimal("1.0001")
+
+
+def test_trade_range_offset_moves_by_height():
+    scale = PriceScale(Decimal("0.0001"))
+    trade_range = TradeRange(Decimal("0.9999"), Decimal("1.0001"), scale)
+
+    trade_range.offset(1)
+    assert (trade_range.buy, trade_range.sell) == (Decimal("1.0001"), Decimal("1.0003"))
+
+    trade_range.offset(-2)
+    assert (trade_range.buy_ticks, trade_range.sell_ticks) == (9997, 9999)
+
+
+def test_trade_range_without_scale_uses_finest_step():
+    trade_range = TradeRange(Decimal("1.05"), Decimal("1.1"))
+
+    assert trade_range.scale == PriceScale(Decimal("0.01"))
+    assert trade_range.height_ticks == 5
+
+
+@pytest.mark.parametrize("fast_decode", [True, False])
+def test_orderbook_decode_in_ticks(fast_decode: bool):
+    stream = OrderbookWebsocket(False, fast_decode=fast_decode)
+    stream.set_price_scale("USDCUSDT", PriceScale(Decimal("0.0001")))
+
+    update = stream.decode({
+        "topic": "orderbook.50.USDCUSDT", "type": "snapshot", "ts": 0,
+        "data": {"s": "USDCUSDT", "b": [["0.9997", "100"]], "a": [["0.9998", "2.5"]], "u": 7, "seq": 9}
+    })
+
+    assert update.is_snapshot
+    assert update.bids == [(9997, Decimal("100"))]
+    assert update.asks == [(9998, Decimal("2.5"))]
+    assert (update.update_id, update.sequence) == (7, 9)
+
+
+@pytest.mark.parametrize("fast_decode", [True, False])
+def test_ticker_decode_in_ticks(fast_decode: bool):
+    stream = TickerWebsocket(False, fast_decode=fast_decode)
+    stream.set_price_scale("USDCUSDT", PriceScale(Decimal("0.0001")))
+
+    ticker = stream.decode({
+        "topic": "tickers.USDCUSDT", "type": "snapshot", "ts": 0,
+        "data": {"symbol": "USDCUSDT", "lastPrice": "1.0002", "highPrice24h": "1", "lowPrice24h": "1",
+                 "prevPrice24h": "1", "volume24h": "1", "turnover24h": "1", "price24hPcnt": "0"}
+    })
+
+    assert (ticker.symbol, ticker.last_price) == ("USDCUSDT", 10002)
@@ -0,0 +1,95 @@
+import threading
+
+from core.clock import VirtualClock
+from core.scheduler import COMPACT_MIN_CANCELLED, TimerQueue, TimerScheduler
+
+
+def drain(queue: TimerQueue, now: float) -> list:
+    fired = []
+    while True:
+        timer = queue.pop_due(now)
+        if timer is None:
+            return fired
+        fired.append(timer.callback())
+
+
+def test_queue_pops_due_timers_in_deadline_order():
+    queue = TimerQueue()
+    for deadline, name in ((3, "c"), (1, "a"), (2, "b"), (1, "a2")):
+        queue.push(deadline, lambda name=name: name)
+
+    assert queue.next_deadline() == 1
+    assert drain(queue, 2) == ["a", "a2", "b"]
+    assert queue.next_deadline() == 3
+    assert len(queue) == 1
+
+
+def test_cancelled_timers_are_skipped():
+    queue = TimerQueue()
+    first = queue.push(1, lambda: "first")
+    queue.push(2, lambda: "second")
+
+    first.cancel()
+    first.cancel()
+
+    assert len(queue) == 1
+    assert queue.next_deadline() == 2
+    assert drain(queue, 5) == ["second"]
+    assert len(queue) == 0
+
+
+def test_cancel_after_fire_keeps_count():
+    queue = TimerQueue()
+    timer = queue.push(1, lambda: None)
+    queue.push(2, lambda: None)
+
+    assert queue.pop_due(1) is timer
+    timer.cancel()
+
+    assert len(queue) == 1
+
+
+def test_queue_compacts_when_most_timers_are_cancelled():
+    queue = TimerQueue()
+    timers = [queue.push(deadline, lambda deadline=deadline: deadline)
+              for deadline in range(COMPACT_MIN_CANCELLED * 2)]
+
+    # Отменяются поздние таймеры: ленивое удаление с вершины кучи их бы не убрало
+    for timer in timers[-(COMPACT_MIN_CANCELLED + 1):]:
+        timer.cancel()
+
+    assert len(queue._TimerQueue__heap) == COMPACT_MIN_CANCELLED - 1
+    assert len(queue) == COMPACT_MIN_CANCELLED - 1
+    assert drain(queue, len(timers)) == list(range(COMPACT_MIN_CANCELLED - 1))
+
+
+def test_virtual_clock_runs_timers_scheduled_from_timers():
+    clock = VirtualClock(0)
+    calls = []
+
+    def tick():
+        calls.append(clock.time())
+        if len(calls) < 3:
+            clock.call_later(1, tick)
+
+    clock.call_later(1, tick)
+    clock.call_later(2.5, lambda: calls.append("cancelled")).cancel()
+    clock.advance(10)
+
+    assert calls == [1, 2, 3]
+    assert clock.time() == 10
+
+
+def test_scheduler_thread_fires_and_cancels():
+    scheduler = TimerScheduler(name="TestTimers")
+    fired = threading.Event()
+    calls = []
+
+    scheduler.call_later(0.01, lambda: calls.append("cancelled")).cancel()
+    scheduler.call_later(0.05, lambda: (calls.append("fired"), fired.set()))
+
+    assert fired.wait(2)
+    scheduler.stop()
+
+    assert calls == ["fired"]
+    assert scheduler.pending == 0
@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+from services.bot.triggers import PriceWindow
+
+
+def make_window(*points) -> PriceWindow:
+    window = PriceWindow()
+    for price, timestamp in points:
+        window.push(price, timestamp)
+    return window
+
+
+def test_window_tracks_aggregates():
+    window = make_window((10002, 0.0), (9999, 1.0), (10005, 2.0), (10001, 3.0))
+
+    assert (window.count, window.total) == (4, 40007)
+    assert (window.low, window.high, window.last) == (9999, 10005, 10001)
+    assert window.average() == Decimal("10001.75")
+
+
+def test_time_weighted_average_weights_by_duration():
+    window = make_window((10000, 0.0), (10010, 1.0))
+
+    # 10000 держится 1 сек, 10010 - 3 сек
+    assert window.time_weighted_average(4.0) == Decimal("10007.5")
+    assert window.average() == Decimal("10005")
+
+
+def test_time_weighted_average_without_duration_is_last_price():
+    window = make_window((10003, 5.0))
+
+    assert window.time_weighted_average(5.0) == Decimal(10003)
+    assert window.time_weighted_average(4.0) == Decimal(10003)
+
+
+def test_out_of_order_timestamp_adds_no_weight():
+    window = make_window((10000, 0.0), (10010, 2.0), (10020, 1.0))
+
+    # Цена с опоздавшей меткой времени действует только с момента последней известной метки
+    assert window.time_weighted_average(3.0) == (Decimal(10000) * 2 + Decimal(10020)) / 3
+
+
+def test_clear_resets_window():
+    window = make_window((10000, 0.0), (10010, 1.0))
+
+    window.clear()
+    assert (window.count, window.total, window.low, window.high, window.last) == (0, 0, None, None, None)
+
+    window.push(10004, 10.0)
+    assert (window.low, window.high) == (10004, 10004)
+    assert window.time_weighted_average(12.0) == Decimal(10004)